@@ -0,0 +1,94 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m app.cli migrate [--check]
+    python -m app.cli search-rebuild
+    python -m app.cli retention [--days N]
+    python -m app.cli compact
+"""
+
+import argparse
+import asyncio
+import sys
+
+from .database import engine, init_db
+from .migrations import pending_migrations, upgrade
+from .services.retention import compact, run_retention
+from .services.search import rebuild_search
+
+
+async def _migrate(check: bool) -> int:
+    async with engine.begin() as conn:
+        if check:
+            pending = await pending_migrations(conn)
+            for migration in pending:
+                print(f"pending {migration.VERSION:04d} {migration.DESCRIPTION}")
+            if not pending:
+                print("Schema is up to date")
+        else:
+            pending = []
+            applied = await upgrade(conn)
+            print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+    await engine.dispose()
+    return 1 if pending else 0
+
+
+async def _search_rebuild() -> None:
+    await init_db()
+    async with engine.begin() as conn:
+        await rebuild_search(conn)
+    await engine.dispose()
+    print("Search index rebuilt")
+
+
+async def _retention(days) -> None:
+    await init_db()
+    report = await run_retention(days)
+    await engine.dispose()
+    if report is None:
+        print("Retention is disabled (RETENTION_DAYS=0), nothing deleted")
+        return
+    print(f"Archived {report.archived} requests older than {report.cutoff:%Y-%m-%d %H:%M} UTC")
+    for table, rows in report.deleted.items():
+        print(f"deleted {rows} rows from {table}")
+    print(f"Reclaimed {report.reclaimed_bytes} bytes")
+
+
+async def _compact() -> None:
+    await init_db()
+    reclaimed = await compact(full=True)
+    await engine.dispose()
+    print(f"Reclaimed {reclaimed} bytes")
+
+
+def _days(value: str) -> int:
+    days = int(value)
+    if days < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return days
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Apply pending schema migrations")
+    migrate.add_argument("--check", action="store_true", help="Only list pending migrations (exit 1 if any)")
+    commands.add_parser("search-rebuild", help="Rebuild the full-text search index")
+    retention = commands.add_parser("retention", help="Archive and delete old history once")
+    retention.add_argument("--days", type=_days, default=None, help="Keep this many days (default RETENTION_DAYS)")
+    commands.add_parser("compact", help="Rewrite the database to give free space back (blocks writers)")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        sys.exit(asyncio.run(_migrate(args.check)))
+    elif args.command == "search-rebuild":
+        asyncio.run(_search_rebuild())
+    elif args.command == "retention":
+        asyncio.run(_retention(args.days))
+    elif args.command == "compact":
+        asyncio.run(_compact())
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,32 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str = "sqlite+aiosqlite:///./data/prompting.db"
+    # Apply pending schema migrations at startup (otherwise only check them)
+    auto_migrate: bool = True
+
+    # SQLite profile (ignored for other databases)
+    sqlite_wal: bool = True
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size: int = 268435456
+
+    # Connection pool for server databases (SQLite keeps SQLAlchemy's
+    # defaults). Each worker process has its own pool, so
+    # WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must fit max_connections.
+    # Size the pool for sustained concurrency: overflow connections are
+    # closed as soon as they are returned, so steady load above the pool
+    # size reconnects on nearly every checkout
+    db_pool_size: int = 20
+    db_max_overflow: int = 5
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # Test connections on checkout (a round trip each); for proxies or
+    # firewalls that drop idle connections
+    db_pool_pre_ping: bool = False
+    # Prepared statements cached per asyncpg connection; 0 behind PgBouncer
+    # in transaction pooling mode
+    db_statement_cache_size: int = 500
 
     # AI Providers API Keys
     openai_api_key: str = ""
@@ -23,9 +49,127 @@ class Settings(BaseSettings):
     # Default model provider
     default_provider: str = "openai"
 
+    # Persistence: "sync" writes before responding, "write_behind" queues
+    persistence_mode: str = "sync"
+    write_behind_batch_size: int = 200
+    write_behind_flush_interval: float = 0.5
+    write_behind_max_queue: int = 10000
+    # Failed flushes are retried this many times, waiting
+    # write_behind_retry_delay seconds and doubling it each time
+    write_behind_retries: int = 3
+    write_behind_retry_delay: float = 0.5
+
+    # Send every provider call to this server instead (benchmark stub)
+    upstream_base_url: str = ""
+
+    # Outbound HTTP connection pools
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = True
+    sdk_client_cache_size: int = 64
+
+    # Upstream rate limiting (per provider and API key)
+    rate_limit_requests_per_second: float = 5.0
+    rate_limit_burst: int = 10
+    rate_limit_max_concurrency: int = 8
+    rate_limit_max_retries: int = 4
+    rate_limit_backoff_base: float = 0.5
+    rate_limit_backoff_max: float = 30.0
+
+    # Response cache
+    response_cache_enabled: bool = True
+    response_cache_ttl_seconds: int = 3600
+    response_cache_max_entries: int = 1024
+    response_cache_persistent: bool = False
+
+    # /api/test-api result cache (seconds; 0 disables caching of that outcome).
+    # The failure TTL applies to rejected keys (401/403) only
+    key_check_success_ttl: int = 600
+    key_check_failure_ttl: int = 30
+    key_check_cache_size: int = 1024
+    # HMAC salt for API key fingerprints (key check cache, rate limiter and
+    # single-flight keys); random per process when empty, shared by the
+    # workers of `python -m app.serve`. Set it when hosts share Redis
+    key_check_salt: str = ""
+
+    # Prometheus /metrics endpoint and Server-Timing headers
+    metrics_enabled: bool = True
+
+    # Output budget: MAX_TOKENS is the cap; with ADAPTIVE_MAX_TOKENS the
+    # budget per (provider, model) is learned from recent completions
+    max_tokens: int = 2000
+    adaptive_max_tokens: bool = True
+    output_budget_percentile: float = 0.95
+    output_budget_margin: float = 1.25
+    output_budget_floor: int = 256
+    output_budget_window: int = 200
+    output_budget_min_samples: int = 20
+    # (provider, model) pairs tracked; the least recently used go first
+    output_budget_max_models: int = 256
+
+    # Read completions as streams and close them once enough prompts are parsed;
+    # ask for an end marker and use it as a stop sequence where supported
+    stream_generation: bool = True
+    stop_sequences: bool = True
+
+    # Mark the static part of the system prompt as cacheable (Anthropic
+    # cache_control); other providers cache repeated prefixes on their own
+    prompt_caching: bool = True
+
+    # Stored system prompt templates: in-memory cache of compiled versions
+    template_cache_ttl_seconds: int = 60
+    template_cache_max_entries: int = 256
+
+    # Asynchronous jobs (/api/jobs): background workers per process; POST
+    # /api/jobs answers 503 once job_max_queued jobs are waiting
+    job_workers: int = 4
+    job_max_queued: int = 1000
+    job_poll_interval: float = 1.0
+    # A running job not finished within the lease is considered lost and rerun
+    job_lease_seconds: int = 300
+    job_max_attempts: int = 3
+    job_webhook_timeout: float = 10.0
+    job_webhook_retries: int = 3
+    # Comma-separated hosts webhooks may be sent to. Empty allows any host
+    # that resolves to public addresses only
+    job_webhook_allowed_hosts: str = ""
+    # Encrypts the API keys of jobs until they finish; random per process
+    # when empty (shared by the workers of `python -m app.serve`), which
+    # fails jobs still queued at a restart
+    job_key_secret: str = ""
+
+    # Retention: requests older than retention_days (0 keeps everything) are
+    # archived as daily gzip NDJSON files under retention_archive_dir (empty
+    # deletes without archiving) and deleted in batches, then the database is
+    # compacted
+    retention_days: int = 0
+    retention_archive_dir: str = "./data/archive"
+    retention_interval_seconds: int = 3600
+    retention_batch_size: int = 500
+    retention_batch_pause: float = 0.05
+
+    # Batch generation
+    batch_concurrency_per_provider: int = 4
+
+    # Worker processes started by `python -m app.serve`
+    workers: int = 1
+    # State shared between workers (rate limits, response cache, single-flight):
+    # "memory" (single worker only), "sqlite" (one host) or "redis"
+    shared_state_backend: str = "memory"
+    shared_state_path: str = "./data/shared_state.db"
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Browser/proxy cache lifetime of /api/providers responses (seconds)
+    providers_cache_max_age: int = 300
+
     # CORS
     cors_origins: str = "http://localhost:3000,http://localhost:5173"
 
+    @property
+    def job_webhook_allowed_hosts_list(self) -> list[str]:
+        return [host.strip().lower() for host in self.job_webhook_allowed_hosts.split(",") if host.strip()]
+
     @property
     def cors_origins_list(self) -> list[str]:
         return [origin.strip() for origin in self.cors_origins.split(",")]
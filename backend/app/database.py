@@ -1,14 +1,40 @@
-from sqlmodel import SQLModel
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from .config import get_settings
 
 settings = get_settings()
 
+
+def _engine_options(database_url: str) -> dict:
+    """Pool and driver options for server databases; SQLite keeps the defaults."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            # SQLAlchemy prepares every statement through its own cache;
+            # asyncpg's own covers queries on the raw connection
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+            "server_settings": {"application_name": "prompt-generator"},
+        }
+    return options
+
+
 engine = create_async_engine(
     settings.database_url,
     echo=False,
     future=True,
+    **_engine_options(settings.database_url),
 )
 
 async_session = sessionmaker(
@@ -18,10 +44,43 @@ async_session = sessionmaker(
 )
 
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Apply the SQLite production profile to every new connection."""
+        cursor = dbapi_connection.cursor()
+        # Lets retention give deleted pages back. Only takes effect before the
+        # file is initialized (so ahead of journal_mode); existing databases
+        # need `python -m app.cli compact` once
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if settings.sqlite_wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
 async def init_db():
-    """Create all tables in the database."""
+    """
+    Check the schema version and apply pending migrations.
+
+    With AUTO_MIGRATE=false startup fails instead if migrations are pending
+    (run `python -m app.cli migrate` as a release step).
+    """
+    from .migrations import pending_migrations, upgrade
+
     async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+        if settings.auto_migrate:
+            await upgrade(conn)
+            return
+        pending = await pending_migrations(conn)
+        if pending:
+            versions = ", ".join(str(m.VERSION) for m in pending)
+            raise RuntimeError(f"Database schema is out of date, pending migrations: {versions}")
 
 
 async def get_session() -> AsyncSession:
@@ -1,10 +1,20 @@
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 
 from .config import get_settings
 from .database import init_db
-from .routers import generate_router
+from .routers import generate_router, history_router, jobs_router, templates_router
+from .services.catalog import refresh_catalog
+from .services.http_clients import init_client_registry, close_client_registry
+from .services.jobs import start_job_workers, stop_job_workers
+from .services.metrics import MetricsMiddleware
+from .services.output_budget import load_output_budget
+from .services.persistence import start_write_behind, stop_write_behind
+from .services.retention import start_retention, stop_retention
+from .services.shared_state import close_shared_state, get_shared_state
 
 settings = get_settings()
 
@@ -12,10 +22,24 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
-    # Startup: initialize database
+    # Startup: initialize database, output budget statistics, provider
+    # catalog, outbound client pools, shared state, write-behind queue, job
+    # workers and the retention task
     await init_db()
+    await load_output_budget()
+    refresh_catalog()
+    init_client_registry()
+    get_shared_state()
+    start_write_behind()
+    start_job_workers()
+    start_retention()
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: requeue running jobs, drain queued writes, close pooled connections
+    await stop_retention()
+    await stop_job_workers()
+    await stop_write_behind()
+    await close_client_registry()
+    await close_shared_state()
 
 
 app = FastAPI(
@@ -32,10 +56,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Cache"],
 )
 
+# Request timing and Server-Timing headers
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(generate_router)
+app.include_router(history_router)
+app.include_router(jobs_router)
+app.include_router(templates_router)
 
 
 @app.get("/")
@@ -46,3 +78,14 @@ async def root():
         "docs": "/docs",
         "health": "/api/health",
     }
+
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics (aggregated over all workers under app.serve)."""
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,72 @@
+"""
+Versioned schema migrations.
+
+Each migration module defines VERSION, DESCRIPTION and an async
+upgrade(conn). Applied versions are recorded in the schema_version table;
+startup only checks that table and applies what is missing instead of
+re-running create_all on every boot.
+
+Migrations are frozen: they must not import the current models, so that
+later model changes are only ever expressed by new migrations.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import (
+    m0001_initial,
+    m0002_search,
+    m0003_generation_source,
+    m0004_templates,
+    m0005_jobs,
+    m0006_job_credentials,
+)
+
+
+MIGRATIONS = [
+    m0001_initial,
+    m0002_search,
+    m0003_generation_source,
+    m0004_templates,
+    m0005_jobs,
+    m0006_job_credentials,
+]
+
+_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+async def applied_versions(conn: AsyncConnection) -> set[int]:
+    """Versions already recorded in the database."""
+    await conn.run_sync(_metadata.create_all)
+    result = await conn.execute(select(schema_version.c.version))
+    return {row.version for row in result}
+
+
+async def pending_migrations(conn: AsyncConnection) -> list:
+    """Migrations not yet applied, in order."""
+    applied = await applied_versions(conn)
+    return [m for m in MIGRATIONS if m.VERSION not in applied]
+
+
+async def upgrade(conn: AsyncConnection) -> list[int]:
+    """Apply all pending migrations. Returns the versions applied."""
+    applied = []
+    for migration in await pending_migrations(conn):
+        await migration.upgrade(conn)
+        await conn.execute(schema_version.insert().values(
+            version=migration.VERSION,
+            description=migration.DESCRIPTION,
+            applied_at=datetime.utcnow(),
+        ))
+        applied.append(migration.VERSION)
+    return applied
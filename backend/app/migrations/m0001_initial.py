@@ -0,0 +1,56 @@
+"""
+Initial schema: prompt_requests, generated_prompts, generation_cache.
+
+Uses checkfirst so databases created by the old create_all boot path are
+adopted as-is and only gain the indexes they are missing.
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, MetaData, Table
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.sql.sqltypes import AutoString, GUID
+
+VERSION = 1
+DESCRIPTION = "initial schema"
+
+metadata = MetaData()
+
+Table(
+    "prompt_requests",
+    metadata,
+    Column("id", GUID(), primary_key=True),
+    Column("business_description", AutoString(), nullable=False),
+    Column("role", AutoString(50), nullable=False),
+    Column("created_at", DateTime(), nullable=False),
+    Index("ix_prompt_requests_created_at_id", "created_at", "id"),
+)
+
+Table(
+    "generated_prompts",
+    metadata,
+    Column("id", GUID(), primary_key=True),
+    Column("request_id", GUID(), ForeignKey("prompt_requests.id"), index=True),
+    Column("content", AutoString(), nullable=False),
+    Column("created_at", DateTime(), nullable=False),
+)
+
+Table(
+    "generation_cache",
+    metadata,
+    Column("key", AutoString(64), primary_key=True),
+    Column("provider", AutoString(50), nullable=False),
+    Column("model", AutoString(), nullable=False),
+    Column("prompts", AutoString(), nullable=False),
+    Column("created_at", DateTime(), nullable=False),
+    Column("expires_at", DateTime(), nullable=False, index=True),
+)
+
+
+def _create(sync_conn) -> None:
+    metadata.create_all(sync_conn, checkfirst=True)
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(_create)
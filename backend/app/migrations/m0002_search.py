@@ -0,0 +1,76 @@
+"""
+Full-text search index (FTS5 on SQLite, tsvector + GIN on PostgreSQL).
+
+SQLite gets an FTS5 table kept in sync by triggers on generated_prompts
+and backfilled from existing rows; PostgreSQL gets generated tsvector
+columns with GIN indexes.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 2
+DESCRIPTION = "full-text search index"
+
+_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS generated_prompts_fts "
+    "USING fts5(content, business, tokenize = 'unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_prompts_fts_insert AFTER INSERT ON generated_prompts BEGIN
+        INSERT INTO generated_prompts_fts(rowid, content, business)
+        VALUES (
+            new.rowid,
+            new.content,
+            (SELECT business_description FROM prompt_requests WHERE id = new.request_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_prompts_fts_delete AFTER DELETE ON generated_prompts BEGIN
+        DELETE FROM generated_prompts_fts WHERE rowid = old.rowid;
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = [
+    """
+    INSERT INTO generated_prompts_fts(rowid, content, business)
+    SELECT gp.rowid, gp.content, pr.business_description
+    FROM generated_prompts gp
+    LEFT JOIN prompt_requests pr ON pr.id = gp.request_id
+    """,
+    "INSERT INTO generated_prompts_fts(generated_prompts_fts) VALUES ('optimize')",
+]
+
+_POSTGRES = [
+    """
+    ALTER TABLE generated_prompts ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
+    """,
+    """
+    ALTER TABLE prompt_requests ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(business_description, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_generated_prompts_search ON generated_prompts USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_prompt_requests_search ON prompt_requests USING GIN (search_vector)",
+]
+
+
+def _upgrade_sqlite(sync_conn: Connection) -> None:
+    exists = sync_conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'generated_prompts_fts'")
+    ).first()
+    for statement in _SQLITE:
+        sync_conn.execute(text(statement))
+    if not exists:
+        for statement in _SQLITE_BACKFILL:
+            sync_conn.execute(text(statement))
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    if conn.dialect.name == "sqlite":
+        await conn.run_sync(_upgrade_sqlite)
+    elif conn.dialect.name == "postgresql":
+        for statement in _POSTGRES:
+            await conn.execute(text(statement))
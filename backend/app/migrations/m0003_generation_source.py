@@ -0,0 +1,41 @@
+"""
+Record which provider and model produced each request.
+
+Adds nullable prompt_requests.provider / .model (older rows stay NULL) and
+an index used to load per-model output statistics at startup.
+"""
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.sql.sqltypes import AutoString
+
+VERSION = 3
+DESCRIPTION = "provider and model of prompt requests"
+
+metadata = MetaData()
+
+prompt_requests = Table(
+    "prompt_requests",
+    metadata,
+    Column("provider", AutoString(50), nullable=True),
+    Column("model", AutoString(200), nullable=True),
+)
+
+INDEX = Index("ix_prompt_requests_provider_model", prompt_requests.c.provider, prompt_requests.c.model)
+
+
+def _upgrade(sync_conn) -> None:
+    existing = {column["name"] for column in inspect(sync_conn).get_columns("prompt_requests")}
+    preparer = sync_conn.dialect.identifier_preparer
+    for column in (prompt_requests.c.provider, prompt_requests.c.model):
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=sync_conn.dialect)
+        sync_conn.exec_driver_sql(
+            f"ALTER TABLE prompt_requests ADD COLUMN {preparer.quote(column.name)} {column_type}"
+        )
+    INDEX.create(sync_conn, checkfirst=True)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(_upgrade)
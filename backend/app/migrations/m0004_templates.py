@@ -0,0 +1,33 @@
+"""
+Stored system prompt templates.
+
+One row per (id, version); a template keeps its id across versions and
+existing versions are never modified.
+"""
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.sql.sqltypes import AutoString, GUID
+
+VERSION = 4
+DESCRIPTION = "prompt templates"
+
+metadata = MetaData()
+
+Table(
+    "prompt_templates",
+    metadata,
+    Column("id", GUID(), primary_key=True),
+    Column("version", Integer(), primary_key=True),
+    Column("name", AutoString(200), nullable=False),
+    Column("content", AutoString(), nullable=False),
+    Column("created_at", DateTime(), nullable=False),
+)
+
+
+def _create(sync_conn) -> None:
+    metadata.create_all(sync_conn, checkfirst=True)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(_create)
@@ -0,0 +1,42 @@
+"""
+Asynchronous generation jobs.
+
+One row per job submitted to POST /api/jobs. `request` holds the
+GenerateRequest JSON until the job finishes; the index serves the workers'
+"oldest claimable job" query and queue-depth checks.
+"""
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.sql.sqltypes import AutoString, GUID
+
+VERSION = 5
+DESCRIPTION = "generation jobs"
+
+metadata = MetaData()
+
+Table(
+    "generation_jobs",
+    metadata,
+    Column("id", GUID(), primary_key=True),
+    Column("status", AutoString(20), nullable=False),
+    Column("request", AutoString(), nullable=False),
+    Column("webhook_url", AutoString(2000), nullable=True),
+    Column("result", AutoString(), nullable=True),
+    Column("error", AutoString(), nullable=True),
+    Column("attempts", Integer(), nullable=False),
+    Column("webhook_status", AutoString(20), nullable=True),
+    Column("created_at", DateTime(), nullable=False),
+    Column("started_at", DateTime(), nullable=True),
+    Column("finished_at", DateTime(), nullable=True),
+    Column("lease_expires_at", DateTime(), nullable=True),
+    Index("ix_generation_jobs_status_created_at", "status", "created_at"),
+)
+
+
+def _create(sync_conn) -> None:
+    metadata.create_all(sync_conn, checkfirst=True)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(_create)
@@ -0,0 +1,36 @@
+"""
+Keep job API keys out of generation_jobs.request.
+
+Adds nullable generation_jobs.credentials, the job's API keys encrypted by
+services.credentials. Jobs queued before this migration keep their keys in
+`request` until they finish.
+"""
+
+from sqlalchemy import Column, MetaData, Table, inspect
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.sql.sqltypes import AutoString
+
+VERSION = 6
+DESCRIPTION = "encrypted job credentials"
+
+metadata = MetaData()
+
+generation_jobs = Table(
+    "generation_jobs",
+    metadata,
+    Column("credentials", AutoString(), nullable=True),
+)
+
+
+def _upgrade(sync_conn) -> None:
+    existing = {column["name"] for column in inspect(sync_conn).get_columns("generation_jobs")}
+    if "credentials" in existing:
+        return
+    column = generation_jobs.c.credentials
+    column_type = column.type.compile(dialect=sync_conn.dialect)
+    preparer = sync_conn.dialect.identifier_preparer
+    sync_conn.exec_driver_sql(f"ALTER TABLE generation_jobs ADD COLUMN {preparer.quote(column.name)} {column_type}")
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(_upgrade)
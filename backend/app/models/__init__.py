@@ -1,3 +1,6 @@
 from .prompt import PromptRequest, GeneratedPrompt
+from .cache import CachedGeneration
+from .template import PromptTemplate
+from .job import GenerationJob
 
-__all__ = ["PromptRequest", "GeneratedPrompt"]
+__all__ = ["PromptRequest", "GeneratedPrompt", "CachedGeneration", "PromptTemplate", "GenerationJob"]
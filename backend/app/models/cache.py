@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class CachedGeneration(SQLModel, table=True):
+    """Model for the persistent tier of the generation response cache."""
+
+    __tablename__ = "generation_cache"
+
+    key: str = Field(primary_key=True, max_length=64)
+    provider: str = Field(max_length=50, nullable=False)
+    model: str = Field(nullable=False)
+    prompts: str = Field(nullable=False)  # JSON-encoded list of prompts
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(nullable=False, index=True)
@@ -0,0 +1,30 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from datetime import datetime
+from uuid import UUID, uuid4
+from typing import Optional
+
+
+class GenerationJob(SQLModel, table=True):
+    """Model for an asynchronous generation job."""
+
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        # Workers claim the oldest queued job; POST /api/jobs counts queued jobs
+        Index("ix_generation_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    status: str = Field(default="queued", max_length=20, nullable=False)
+    request: str = Field(nullable=False)  # JSON-encoded GenerateRequest without its API keys
+    credentials: Optional[str] = Field(default=None)  # The API keys, encrypted; cleared when done
+    webhook_url: Optional[str] = Field(default=None, max_length=2000)
+    result: Optional[str] = Field(default=None)  # JSON-encoded GenerateResponse
+    error: Optional[str] = Field(default=None)
+    attempts: int = Field(default=0, nullable=False)
+    webhook_status: Optional[str] = Field(default=None, max_length=20)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+    # A running job whose lease expired (its worker died) is claimed again
+    lease_expires_at: Optional[datetime] = Field(default=None)
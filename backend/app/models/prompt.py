@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime
 from uuid import UUID, uuid4
 from typing import Optional
@@ -8,14 +9,25 @@ class PromptRequest(SQLModel, table=True):
     """Model for storing prompt generation requests."""
 
     __tablename__ = "prompt_requests"
+    __table_args__ = (
+        # Keyset pagination of history on (created_at, id)
+        Index("ix_prompt_requests_created_at_id", "created_at", "id"),
+        # Per-model output statistics (see services.output_budget)
+        Index("ix_prompt_requests_provider_model", "provider", "model"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     business_description: str = Field(nullable=False)
     role: str = Field(max_length=50, nullable=False)
+    provider: Optional[str] = Field(default=None, max_length=50)
+    model: Optional[str] = Field(default=None, max_length=200)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    # Relationship to generated prompts
-    generated_prompts: list["GeneratedPrompt"] = Relationship(back_populates="request")
+    # Relationship to generated prompts, in generation order
+    generated_prompts: list["GeneratedPrompt"] = Relationship(
+        back_populates="request",
+        sa_relationship_kwargs={"order_by": "[GeneratedPrompt.created_at, GeneratedPrompt.id]"},
+    )
 
 
 class GeneratedPrompt(SQLModel, table=True):
@@ -24,7 +36,7 @@ class GeneratedPrompt(SQLModel, table=True):
     __tablename__ = "generated_prompts"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    request_id: Optional[UUID] = Field(default=None, foreign_key="prompt_requests.id")
+    request_id: Optional[UUID] = Field(default=None, foreign_key="prompt_requests.id", index=True)
     content: str = Field(nullable=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
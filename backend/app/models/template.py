@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from uuid import UUID, uuid4
+
+
+class PromptTemplate(SQLModel, table=True):
+    """Model for a version of a stored system prompt template."""
+
+    __tablename__ = "prompt_templates"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    version: int = Field(default=1, primary_key=True)
+    name: str = Field(max_length=200, nullable=False)
+    content: str = Field(nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,3 +1,6 @@
 from .generate import router as generate_router
+from .history import router as history_router
+from .jobs import router as jobs_router
+from .templates import router as templates_router
 
-__all__ = ["generate_router"]
+__all__ = ["generate_router", "history_router", "jobs_router", "templates_router"]
@@ -1,26 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import get_settings
 from ..database import get_session
 from ..schemas.prompt import (
     GenerateRequest,
     GenerateResponse,
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
+    CacheMode,
+    CacheStats,
     ProviderInfo,
-    ModelInfo,
     ProviderEnum,
     TestApiRequest,
     TestApiResponse,
     PROVIDER_LABELS,
-    PROVIDER_MODELS,
 )
-from ..services.ai_service import generate_prompts, test_api_key
-from ..models.prompt import PromptRequest, GeneratedPrompt
+from ..services.ai_service import (
+    stream_completion,
+    resolve_model,
+    PromptStreamParser,
+    USAGE_DRAIN_CHARS,
+)
+from ..services.batch import run_batch
+from ..services.cache import get_response_cache
+from ..services.catalog import CatalogEntry, get_catalog, etag_matches
+from ..services.key_validation import check_api_key
+from ..services.rate_limit import rate_limit_snapshot
+from ..services.generation import (
+    run_generation_request,
+    build_response,
+    generation_cache_key,
+    cache_lookup,
+    cache_store,
+    resolve_template,
+)
+from ..services.output_budget import get_output_budget
+from ..services.persistence import PendingGeneration, record_generation, record_generations
+from ..services.templates import TemplateNotFound
 
 router = APIRouter(prefix="/api", tags=["generate"])
 
 
+def _catalog_response(entry: CatalogEntry, if_none_match: Optional[str]) -> Response:
+    """Serve a precomputed catalog entry with ETag revalidation."""
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={get_settings().providers_cache_max_age}",
+    }
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("/providers", response_model=list[ProviderInfo])
-async def list_providers():
+async def list_providers(if_none_match: Optional[str] = Header(default=None)):
     """
     Get list of all AI providers with their available models.
 
@@ -28,15 +67,17 @@ async def list_providers():
     - value: provider ID for API calls
     - label: human-readable name
     - models: list of available models
+
+    The response is precomputed and carries a strong `ETag`; send it back in
+    `If-None-Match` to get `304 Not Modified`.
     """
-    return [
-        ProviderInfo(
-            value=provider.value,
-            label=PROVIDER_LABELS[provider],
-            models=[ModelInfo(**m) for m in PROVIDER_MODELS.get(provider, [])],
-        )
-        for provider in ProviderEnum
-    ]
+    return _catalog_response(get_catalog().all(), if_none_match)
+
+
+@router.get("/providers/{provider}", response_model=ProviderInfo)
+async def get_provider(provider: ProviderEnum, if_none_match: Optional[str] = Header(default=None)):
+    """Get a single provider with its available models (ETag-cached like /providers)."""
+    return _catalog_response(get_catalog().provider(provider), if_none_match)
 
 
 @router.post("/test-api", response_model=TestApiResponse)
@@ -45,15 +86,30 @@ async def test_api(request: TestApiRequest):
     Test if an API key is valid for the specified provider.
 
     Use this to verify API keys before generating prompts.
+
+    Results are cached for a short time (`cached: true`); send
+    `"force": true` to re-check the key upstream.
     """
-    result = await test_api_key(request.provider, request.api_key)
-    return TestApiResponse(**result)
+    result, cached = await check_api_key(request.provider, request.api_key, force=request.force)
+    return TestApiResponse(**result, cached=cached)
+
+
+def _resolve_cache_mode(request: GenerateRequest, cache_control: Optional[str]) -> CacheMode:
+    """`Cache-Control: no-store` bypasses the cache, `no-cache` refreshes it."""
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    if "no-store" in directives:
+        return CacheMode.bypass
+    if "no-cache" in directives:
+        return CacheMode.refresh
+    return request.cache
 
 
 @router.post("/generate", response_model=GenerateResponse)
 async def generate(
     request: GenerateRequest,
+    response: Response,
     session: AsyncSession = Depends(get_session),
+    cache_control: Optional[str] = Header(default=None),
 ):
     """
     Generate prompts for a business role using AI.
@@ -71,56 +127,267 @@ async def generate(
     }
     ```
 
-    **Providers:** openai, anthropic, openrouter, xai, zai
+    **Providers:** openai, anthropic, google, openrouter, groq, deepseek,
+    mistral, cohere, perplexity, together
 
     **Returns:** List of 5 AI-generated prompts for the specified role.
+
+    **Fallback:** `fallbacks` is an ordered list of `{provider, model, api_key}`.
+    `"fallback_mode": "failover"` tries the next entry on error or after
+    `attempt_timeout_ms`; `"hedge"` also starts the next entry if the current
+    one hasn't answered within `hedge_delay_ms`. `served_by` reports the
+    provider that actually answered.
+
+    **Templates:** instead of sending `system_prompt`, store it once with
+    `POST /api/templates` and pass `"template_id"` (optionally
+    `"template_version"`); an unknown template or version returns `404`.
+
+    **Caching:** identical requests are served from the response cache
+    (`"cached": true`, `X-Cache: HIT`). Send `"cache": "refresh"` or
+    `Cache-Control: no-cache` to regenerate, `"cache": "bypass"` or
+    `Cache-Control: no-store` to skip the cache entirely.
     """
     try:
-        # Generate prompts using selected provider
-        prompts, model_used = await generate_prompts(
+        # Generate prompts using selected provider (or the response cache)
+        generation = await run_generation_request(request, _resolve_cache_mode(request, cache_control))
+
+        # Save request and generated prompts to database
+        await record_generation(
+            session,
+            request.business,
+            request.role,
+            generation.prompts,
+            generation.provider.value,
+            generation.model,
+        )
+
+        response.headers["X-Cache"] = "HIT" if generation.cached else "MISS"
+        return build_response(request, generation)
+
+    except TemplateNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка генерации: {str(e)}"
+        )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(request: GenerateRequest, cache_mode: CacheMode) -> AsyncIterator[str]:
+    model = resolve_model(request.provider, request.model)
+    parser = PromptStreamParser()
+    system_prompt = request.system_prompt
+    try:
+        template = await resolve_template(request)
+    except TemplateNotFound as e:
+        yield _sse("error", {"status": 404, "detail": str(e)})
+        return
+    if template is not None:
+        system_prompt = template.compiled.source
+    key = generation_cache_key(request.provider, model, request.business, request.role, system_prompt, template)
+
+    hit = await cache_lookup(key, cache_mode)
+
+    if hit is not None:
+        async for event in _finish_stream(request, hit.prompts, hit.model, cached=True):
+            yield event
+        return
+
+    try:
+        chunks = stream_completion(
             provider=request.provider,
             api_key=request.api_key,
-            model=request.model,
+            model=model,
             business=request.business,
             role=request.role,
-            system_prompt=request.system_prompt,
+            system_prompt=system_prompt,
         )
+        trailing = 0
+        try:
+            async for chunk in chunks:
+                # Read on for the usage sent last, unless the model keeps writing
+                if parser.done:
+                    trailing += len(chunk)
+                    if trailing > USAGE_DRAIN_CHARS:
+                        break
+                    continue
+                for index, prompt in parser.feed(chunk):
+                    yield _sse("prompt", {"index": index, "prompt": prompt})
+        finally:
+            await chunks.aclose()
 
-        # Save request to database
-        db_request = PromptRequest(
-            business_description=request.business,
-            role=request.role,
-        )
-        session.add(db_request)
-        await session.flush()
+        for index, prompt in parser.close():
+            yield _sse("prompt", {"index": index, "prompt": prompt})
+    except ValueError as e:
+        yield _sse("error", {"status": 400, "detail": str(e)})
+        return
+    except Exception as e:
+        yield _sse("error", {"status": 500, "detail": f"Ошибка генерации: {str(e)}"})
+        return
 
-        # Save generated prompts
-        for prompt_content in prompts:
-            db_prompt = GeneratedPrompt(
-                request_id=db_request.id,
-                content=prompt_content,
-            )
-            session.add(db_prompt)
+    prompts = parser.result()
+    await cache_store(key, request.provider, prompts, model, cache_mode)
 
-        await session.commit()
+    async for event in _finish_stream(request, prompts, model, cached=False):
+        yield event
 
-        return GenerateResponse(
-            prompts=prompts,
-            role=request.role,
-            business=request.business,
-            provider=PROVIDER_LABELS[request.provider],
-            model=model_used,
+
+async def _finish_stream(
+    request: GenerateRequest,
+    prompts: list[str],
+    model: str,
+    cached: bool,
+) -> AsyncIterator[str]:
+    if cached:
+        for index, prompt in enumerate(prompts):
+            yield _sse("prompt", {"index": index, "prompt": prompt})
+
+    # The request-scoped session is closed before a streaming body runs,
+    # so the row is written with a session owned by the stream itself.
+    try:
+        await record_generation(None, request.business, request.role, prompts, request.provider.value, model)
+    except Exception as e:
+        yield _sse("error", {"status": 500, "detail": f"Ошибка сохранения: {str(e)}"})
+        return
+
+    response = GenerateResponse(
+        prompts=prompts,
+        role=request.role,
+        business=request.business,
+        provider=PROVIDER_LABELS[request.provider],
+        model=model,
+        cached=cached,
+        served_by=request.provider.value,
+    )
+    yield _sse("done", response.model_dump())
+
+
+@router.post("/generate/stream")
+async def generate_stream(
+    request: GenerateRequest,
+    cache_control: Optional[str] = Header(default=None),
+):
+    """
+    Generate prompts with Server-Sent Events.
+
+    Emits a `prompt` event (`{"index": 0, "prompt": "..."}`) as soon as each
+    prompt line is complete, then a single `done` event carrying the same body
+    as `POST /api/generate`. Failures are reported as an `error` event.
+    The fallback chain is not used here; only the primary provider streams.
+    """
+    return StreamingResponse(
+        _stream_events(request, _resolve_cache_mode(request, cache_control)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def _save_batch(items: list[GenerateRequest], results: list[BatchItemResult]) -> int:
+    """Persist all successful batch results in one transaction."""
+    rows = [
+        PendingGeneration(
+            items[result.index].business,
+            items[result.index].role,
+            result.result.prompts,
+            result.result.served_by,
+            result.result.model,
         )
+        for result in sorted(results, key=lambda r: r.index)
+        if result.success
+    ]
+    if rows:
+        await record_generations(rows)
+    return len(rows)
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+
+async def _batch_ndjson(items: list[GenerateRequest]) -> AsyncIterator[str]:
+    results = []
+    async for result in run_batch(items, get_settings().batch_concurrency_per_provider):
+        results.append(result)
+        yield result.model_dump_json() + "\n"
+
+    try:
+        saved = await _save_batch(items, results)
     except Exception as e:
-        await session.rollback()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка генерации: {str(e)}"
+        yield json.dumps({"done": True, "error": f"Ошибка сохранения: {str(e)}"}, ensure_ascii=False) + "\n"
+        return
+    yield json.dumps({"done": True, "saved": saved}) + "\n"
+
+
+@router.post("/generate/batch", response_model=BatchGenerateResponse)
+async def generate_batch(request: BatchGenerateRequest):
+    """
+    Generate prompts for many (business, role) pairs in one call.
+
+    Items run concurrently, with at most `BATCH_CONCURRENCY_PER_PROVIDER`
+    in flight per provider. A failing item is reported in its own result
+    and does not fail the batch. All successful results are saved in a
+    single transaction at the end (or queued, in write-behind mode).
+
+    With `"stream": true` the response is NDJSON: one `BatchItemResult`
+    line per item as it finishes, then a `{"done": true, "saved": N}` line.
+    """
+    if request.stream:
+        return StreamingResponse(
+            _batch_ndjson(request.items),
+            media_type="application/x-ndjson",
+            headers={"X-Accel-Buffering": "no"},
         )
 
+    results = [
+        result
+        async for result in run_batch(request.items, get_settings().batch_concurrency_per_provider)
+    ]
+    results.sort(key=lambda r: r.index)
+
+    try:
+        await _save_batch(request.items, results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка сохранения: {str(e)}")
+
+    return BatchGenerateResponse(results=results)
+
+
+@router.get("/cache/stats", response_model=CacheStats)
+async def cache_stats():
+    """Response cache hit/miss counters."""
+    return CacheStats(**get_response_cache().stats())
+
+
+@router.get("/rate-limits")
+async def rate_limits():
+    """
+    Live state of the upstream rate limiters.
+
+    One entry per provider and API key (shown as `key_id`, a prefix of its
+    salted fingerprint): current adaptive rate, tokens, in-flight and waiting
+    requests, remaining pause (`blocked_for`, seconds) and limits learned
+    from provider headers.
+    """
+    return rate_limit_snapshot()
+
+
+@router.get("/output-budgets")
+async def output_budgets():
+    """
+    Learned output budgets per provider and model.
+
+    `p50`/`p95` are the completion tokens needed for five prompts in recent
+    generations; `max_tokens` is what the next call will request.
+    """
+    return get_output_budget().snapshot()
+
 
 @router.get("/health")
 async def health_check():
@@ -0,0 +1,134 @@
+import base64
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from ..database import get_session
+from ..models.prompt import PromptRequest
+from ..schemas.history import ExportFormat, HistoryItem, HistoryPage, SearchResult, SearchPage
+from ..services.export import MEDIA_TYPES, export_history, gzipped
+from ..services.search import search_prompts
+
+router = APIRouter(prefix="/api", tags=["history"])
+
+
+def encode_cursor(created_at: datetime, request_id: UUID) -> str:
+    """Opaque keyset cursor for (created_at, id)."""
+    raw = f"{created_at.isoformat()}|{request_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Parse a cursor produced by encode_cursor. Raises ValueError if invalid."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, request_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+    return datetime.fromisoformat(created_at), UUID(request_id)
+
+
+@router.get("/history", response_model=HistoryPage)
+async def get_history(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get generation history, newest first.
+
+    Uses keyset pagination on (created_at, id): pass `next_cursor` from the
+    response as `cursor` to get the next page. Prompts for the whole page
+    are loaded in one extra query.
+    """
+    query = (
+        select(PromptRequest)
+        .options(selectinload(PromptRequest.generated_prompts))
+        .order_by(PromptRequest.created_at.desc(), PromptRequest.id.desc())
+        .limit(limit + 1)
+    )
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        query = query.where(
+            or_(
+                PromptRequest.created_at < cursor_created_at,
+                and_(PromptRequest.created_at == cursor_created_at, PromptRequest.id < cursor_id),
+            )
+        )
+
+    rows = (await session.execute(query)).scalars().all()
+    page, has_more = rows[:limit], len(rows) > limit
+
+    return HistoryPage(
+        items=[
+            HistoryItem(
+                id=row.id,
+                business=row.business_description,
+                role=row.role,
+                created_at=row.created_at,
+                prompts=[prompt.content for prompt in row.generated_prompts],
+            )
+            for row in page
+        ],
+        next_cursor=encode_cursor(page[-1].created_at, page[-1].id) if has_more else None,
+    )
+
+
+@router.get("/search", response_model=SearchPage)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0, le=10000),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Full-text search over generated prompts and business descriptions.
+
+    Results are ranked best match first and include a highlighted snippet.
+    Every word of `q` must match (as a word prefix on SQLite).
+    """
+    try:
+        hits = await search_prompts(session, q, limit + 1, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return SearchPage(
+        items=[SearchResult(**vars(hit)) for hit in hits[:limit]],
+        next_offset=offset + limit if len(hits) > limit else None,
+    )
+
+
+@router.get("/export")
+async def export(
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format"),
+    since: Optional[datetime] = Query(
+        default=None,
+        description="Only requests created at or after this time (UTC if no offset)",
+    ),
+    compress: bool = Query(default=False, alias="gzip", description="Send a .gz file"),
+):
+    """
+    Download the whole generation history, oldest first.
+
+    `ndjson`: one line per request with its `prompts`; `csv`: one row per
+    prompt (`request_id`, `created_at`, `business`, `role`, `provider`,
+    `model`, `prompt_index`, `prompt`). The body is streamed from a database
+    cursor as it is read, so exports of any size use constant memory.
+    """
+    body = export_history(export_format, since)
+    filename = f"prompt-history.{export_format.value}"
+    media_type = MEDIA_TYPES[export_format]
+    if compress:
+        body, filename, media_type = gzipped(body), filename + ".gz", "application/gzip"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
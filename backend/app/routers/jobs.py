@@ -0,0 +1,48 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_session
+from ..schemas.job import JobCreate, JobInfo
+from ..services.jobs import QueueFull, WebhookNotAllowed, fetch_job, job_info, submit_job
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202)
+async def create_job(request: JobCreate, response: Response, session: AsyncSession = Depends(get_session)):
+    """
+    Queue a generation and return its job at once.
+
+    Takes the same body as `POST /api/generate`, plus an optional
+    `webhook_url`. Poll `GET /api/jobs/{id}` (the `Location` header) until
+    `status` is `succeeded` or `failed`, or wait for the webhook: the
+    finished job is POSTed there with the same body.
+
+    Queued jobs are stored in the database and survive a restart (their API
+    keys only with JOB_KEY_SECRET set). When the queue is full the request is
+    rejected with `503`; a webhook on a private address, or on a host outside
+    JOB_WEBHOOK_ALLOWED_HOSTS when that is set, with `400`.
+    """
+    try:
+        job = await submit_job(session, request)
+    except WebhookNotAllowed as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Очередь заданий переполнена, повторите запрос позже",
+            headers={"Retry-After": "5"},
+        )
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job_info(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: UUID, session: AsyncSession = Depends(get_session)):
+    """State of a job; `result` holds the generated prompts once it has succeeded."""
+    job = await fetch_job(session, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return job_info(job)
@@ -0,0 +1,116 @@
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_session
+from ..models.template import PromptTemplate
+from ..schemas.template import TemplateCreate, TemplateDetail, TemplateSummary, TemplateUpdate
+from ..services.templates import (
+    add_version,
+    compile_template,
+    create_template,
+    delete_template,
+    fetch_template,
+    list_templates,
+    list_versions,
+)
+
+router = APIRouter(prefix="/api", tags=["templates"])
+
+
+def _summary(row: PromptTemplate) -> TemplateSummary:
+    return TemplateSummary(
+        id=row.id,
+        version=row.version,
+        name=row.name,
+        placeholders=compile_template(row.content).placeholders,
+        size=len(row.content),
+        created_at=row.created_at,
+    )
+
+
+def _detail(row: PromptTemplate) -> TemplateDetail:
+    return TemplateDetail(**_summary(row).model_dump(), content=row.content)
+
+
+async def _get_or_404(session: AsyncSession, template_id: UUID, version: Optional[int] = None) -> PromptTemplate:
+    row = await fetch_template(session, template_id, version)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Шаблон не найден")
+    return row
+
+
+@router.get("/templates", response_model=list[TemplateSummary])
+async def get_templates(session: AsyncSession = Depends(get_session)):
+    """List stored templates (latest version of each, without the text)."""
+    return [_summary(row) for row in await list_templates(session)]
+
+
+@router.post("/templates", response_model=TemplateDetail, status_code=201)
+async def post_template(request: TemplateCreate, session: AsyncSession = Depends(get_session)):
+    """
+    Store a system prompt template.
+
+    `{role}` and `{business}` are replaced per request; any other
+    `{name}` placeholder is rejected. Pass the returned `id` as
+    `template_id` in `POST /api/generate` instead of sending
+    `system_prompt` every time.
+    """
+    try:
+        row = await create_template(session, request.name, request.content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _detail(row)
+
+
+@router.get("/templates/{template_id}", response_model=TemplateDetail)
+async def get_template(
+    template_id: UUID,
+    version: Optional[int] = Query(default=None, ge=1, description="Version (if empty, the latest)"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Get a template version with its text."""
+    return _detail(await _get_or_404(session, template_id, version))
+
+
+@router.get("/templates/{template_id}/versions", response_model=list[TemplateSummary])
+async def get_template_versions(template_id: UUID, session: AsyncSession = Depends(get_session)):
+    """All versions of a template, newest first."""
+    rows = await list_versions(session, template_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Шаблон не найден")
+    return [_summary(row) for row in rows]
+
+
+@router.put("/templates/{template_id}", response_model=TemplateDetail)
+async def put_template(
+    template_id: UUID,
+    request: TemplateUpdate,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Store the next version of a template.
+
+    Earlier versions stay available (`?version=`); requests without
+    `template_version` use the new one.
+    """
+    current = await _get_or_404(session, template_id)
+    try:
+        row = await add_version(session, current, request.name, request.content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Шаблон был изменён одновременно, повторите запрос")
+    return _detail(row)
+
+
+@router.delete("/templates/{template_id}", status_code=204)
+async def remove_template(template_id: UUID, session: AsyncSession = Depends(get_session)):
+    """Delete a template with all its versions."""
+    if not await delete_template(session, template_id):
+        raise HTTPException(status_code=404, detail="Шаблон не найден")
+    return Response(status_code=204)
@@ -1,23 +1,43 @@
 from .prompt import (
     GenerateRequest,
     GenerateResponse,
+    CacheMode,
+    CacheStats,
+    FallbackMode,
+    FallbackTarget,
     ProviderEnum,
     ProviderInfo,
     ModelInfo,
     TestApiRequest,
     TestApiResponse,
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
     PROVIDER_LABELS,
     PROVIDER_MODELS,
 )
+from .history import ExportFormat, HistoryItem, HistoryPage, SearchResult, SearchPage
 
 __all__ = [
     "GenerateRequest",
     "GenerateResponse",
+    "CacheMode",
+    "CacheStats",
+    "FallbackMode",
+    "FallbackTarget",
     "ProviderEnum",
     "ProviderInfo",
     "ModelInfo",
     "TestApiRequest",
     "TestApiResponse",
+    "BatchGenerateRequest",
+    "BatchGenerateResponse",
+    "BatchItemResult",
     "PROVIDER_LABELS",
     "PROVIDER_MODELS",
+    "ExportFormat",
+    "HistoryItem",
+    "HistoryPage",
+    "SearchResult",
+    "SearchPage",
 ]
@@ -0,0 +1,57 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from uuid import UUID
+
+
+class HistoryItem(BaseModel):
+    """A stored generation request with its prompts."""
+    id: UUID
+    business: str
+    role: str
+    created_at: datetime
+    prompts: list[str] = []
+
+
+class HistoryPage(BaseModel):
+    """A page of generation history, newest first."""
+
+    items: list[HistoryItem] = Field(
+        ...,
+        description="History entries, newest first"
+    )
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Pass as `cursor` to get the next page; null on the last page"
+    )
+
+
+class SearchResult(BaseModel):
+    """A prompt matching a full-text search."""
+    prompt_id: UUID
+    request_id: Optional[UUID] = None
+    content: str
+    snippet: str = Field(
+        ...,
+        description="Matching fragment with terms wrapped in <mark>…</mark> (content is not HTML-escaped)"
+    )
+    business: Optional[str] = None
+    role: Optional[str] = None
+    created_at: datetime
+    rank: float
+
+
+class ExportFormat(str, Enum):
+    """Formats of GET /api/export."""
+    ndjson = "ndjson"  # one request with its prompts per line
+    csv = "csv"        # one prompt per row
+
+
+class SearchPage(BaseModel):
+    """A page of search results, best match first."""
+    items: list[SearchResult]
+    next_offset: Optional[int] = Field(
+        default=None,
+        description="Pass as `offset` to get the next page; null on the last page"
+    )
@@ -0,0 +1,43 @@
+from pydantic import AnyHttpUrl, BaseModel, Field
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from uuid import UUID
+
+from .prompt import GenerateRequest, GenerateResponse
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of an asynchronous generation job."""
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class JobCreate(GenerateRequest):
+    """Request to run a generation in the background."""
+
+    webhook_url: Optional[AnyHttpUrl] = Field(
+        default=None,
+        description="URL to POST the finished job (same body as GET /api/jobs/{id}) to"
+    )
+
+
+class JobInfo(BaseModel):
+    """State of an asynchronous generation job."""
+    id: UUID
+    status: JobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    attempts: int = 0
+    result: Optional[GenerateResponse] = Field(
+        default=None,
+        description="Same body as POST /api/generate, once the job has succeeded"
+    )
+    error: Optional[str] = None
+    webhook_status: Optional[str] = Field(
+        default=None,
+        description="delivered or failed, once the webhook has been attempted"
+    )
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from enum import Enum
+from typing import Optional
+from uuid import UUID
 
 
 class ProviderEnum(str, Enum):
@@ -176,6 +178,29 @@ PROVIDER_MODELS = {
 }
 
 
+class CacheMode(str, Enum):
+    """How a request uses the response cache."""
+    use = "use"          # serve from cache when possible
+    refresh = "refresh"  # skip lookup, store the fresh result
+    bypass = "bypass"    # neither read nor write the cache
+
+
+class FallbackMode(str, Enum):
+    """How a fallback chain is used."""
+    failover = "failover"  # try the next entry on error or timeout
+    hedge = "hedge"        # also start the next entry after a delay, first success wins
+
+
+class FallbackTarget(BaseModel):
+    """Entry of a generation fallback chain."""
+    provider: ProviderEnum
+    api_key: str = Field(..., min_length=1)
+    model: str = Field(
+        default="",
+        description="Model ID to use (if empty, uses default for provider)"
+    )
+
+
 class ModelInfo(BaseModel):
     """Model information."""
     id: str
@@ -193,12 +218,17 @@ class TestApiRequest(BaseModel):
     """Request to test an API key."""
     provider: ProviderEnum
     api_key: str = Field(..., min_length=1)
+    force: bool = Field(
+        default=False,
+        description="Re-check the key even if a recent result is cached"
+    )
 
 
 class TestApiResponse(BaseModel):
     """Response from API key test."""
     success: bool
     message: str
+    cached: bool = False
 
 
 class GenerateRequest(BaseModel):
@@ -235,6 +265,48 @@ class GenerateRequest(BaseModel):
         default="",
         description="Custom system prompt (if empty, uses default)"
     )
+    template_id: Optional[UUID] = Field(
+        default=None,
+        description="Stored template to use instead of system_prompt (see /api/templates)"
+    )
+    template_version: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Template version (if empty, uses the latest)"
+    )
+    cache: CacheMode = Field(
+        default=CacheMode.use,
+        description="Response cache mode: use, refresh or bypass"
+    )
+    fallbacks: list[FallbackTarget] = Field(
+        default_factory=list,
+        max_length=5,
+        description="Ordered providers to fall back to after the primary one"
+    )
+    fallback_mode: FallbackMode = Field(
+        default=FallbackMode.failover,
+        description="failover: next entry on error/timeout; hedge: next entry also starts after hedge_delay_ms"
+    )
+    hedge_delay_ms: int = Field(
+        default=2000,
+        ge=0,
+        le=60000,
+        description="Delay before starting the next entry in hedge mode"
+    )
+    attempt_timeout_ms: int = Field(
+        default=0,
+        ge=0,
+        le=300000,
+        description="Per-entry timeout when falling back (0 = no extra timeout)"
+    )
+
+    @model_validator(mode="after")
+    def _one_system_prompt_source(self) -> "GenerateRequest":
+        if self.template_id is not None and self.system_prompt:
+            raise ValueError("Укажите либо system_prompt, либо template_id")
+        if self.template_version is not None and self.template_id is None:
+            raise ValueError("template_version требует template_id")
+        return self
 
 
 class GenerateResponse(BaseModel):
@@ -260,3 +332,62 @@ class GenerateResponse(BaseModel):
         ...,
         description="Model used"
     )
+    cached: bool = Field(
+        default=False,
+        description="Whether the result was served from the response cache"
+    )
+    served_by: str = Field(
+        default="",
+        description="Provider ID that served the request (differs from the requested one after a fallback)"
+    )
+
+
+class CacheStats(BaseModel):
+    """Response cache counters."""
+    memory_hits: int
+    shared_hits: int
+    db_hits: int
+    misses: int
+    stores: int
+    bypasses: int
+    hits: int
+    hit_ratio: float
+    memory_entries: int
+    persistent: bool
+    shared: bool
+
+
+class BatchGenerateRequest(BaseModel):
+    """Request schema for batch prompt generation."""
+
+    items: list[GenerateRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=500,
+        description="Generation requests to run"
+    )
+    stream: bool = Field(
+        default=False,
+        description="Stream results as NDJSON as they finish instead of returning them in order"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Result of a single batch item."""
+
+    index: int = Field(
+        ...,
+        description="Position of the item in the request"
+    )
+    success: bool
+    result: Optional[GenerateResponse] = None
+    error: Optional[str] = None
+
+
+class BatchGenerateResponse(BaseModel):
+    """Response schema for batch prompt generation."""
+
+    results: list[BatchItemResult] = Field(
+        ...,
+        description="Results in request order"
+    )
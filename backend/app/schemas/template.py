@@ -0,0 +1,36 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+
+class TemplateCreate(BaseModel):
+    """Request to store a new system prompt template."""
+    name: str = Field(..., min_length=1, max_length=200)
+    content: str = Field(
+        ...,
+        min_length=1,
+        max_length=50000,
+        description="Template text; {role} and {business} are replaced per request"
+    )
+
+
+class TemplateUpdate(BaseModel):
+    """Request to store the next version of a template (omitted fields are kept)."""
+    name: Optional[str] = Field(default=None, min_length=1, max_length=200)
+    content: Optional[str] = Field(default=None, min_length=1, max_length=50000)
+
+
+class TemplateSummary(BaseModel):
+    """A template version without its text."""
+    id: UUID
+    version: int
+    name: str
+    placeholders: list[str]
+    size: int = Field(..., description="Template length in characters")
+    created_at: datetime
+
+
+class TemplateDetail(TemplateSummary):
+    """A template version with its text."""
+    content: str
@@ -0,0 +1,98 @@
+"""
+Production entrypoint.
+
+Usage:
+    python -m app.serve [--host 0.0.0.0] [--port $PORT] [--workers $WORKERS]
+
+Applies migrations once, then starts uvicorn. With more than one worker:
+- workers only check the schema (AUTO_MIGRATE=false), so they never race
+  on migrations at startup
+- the "memory" shared state backend is replaced by "sqlite", so rate
+  limits, the response cache and single-flight span all workers
+- workers share one KEY_CHECK_SALT and JOB_KEY_SECRET (random unless
+  set), so they agree on API key fingerprints in the shared state and can
+  run each other's jobs
+- Prometheus metrics are aggregated across workers through
+  PROMETHEUS_MULTIPROC_DIR
+- with SQLite, writers from different processes queue on the database
+  lock rather than in one connection pool, so the busy timeout is raised
+  to at least MULTI_WORKER_SQLITE_BUSY_TIMEOUT_MS (PERSISTENCE_MODE=
+  write_behind avoids most of that contention)
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import secrets
+import tempfile
+
+import uvicorn
+
+from .config import get_settings
+
+MULTI_WORKER_SQLITE_BUSY_TIMEOUT_MS = 30000
+
+
+async def _init_db() -> None:
+    from .database import engine, init_db
+
+    await init_db()
+    await engine.dispose()
+
+
+def _reset_shared_state(path: str) -> None:
+    """Start from an empty SQLite state file (stale leases and buckets go)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _prepare_metrics_dir() -> None:
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m app.serve")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    asyncio.run(_init_db())
+
+    if workers > 1:
+        # Workers inherit the environment, which takes precedence over .env
+        os.environ["WORKERS"] = str(workers)
+        os.environ["AUTO_MIGRATE"] = "false"
+        # Workers must agree on API key fingerprints in the shared state
+        if not settings.key_check_salt:
+            os.environ["KEY_CHECK_SALT"] = secrets.token_hex(32)
+        # ... and on the key that encrypts job API keys
+        if not settings.job_key_secret:
+            os.environ["JOB_KEY_SECRET"] = secrets.token_hex(32)
+        backend = settings.shared_state_backend
+        if backend == "memory":
+            backend = os.environ["SHARED_STATE_BACKEND"] = "sqlite"
+        if backend == "sqlite":
+            _reset_shared_state(settings.shared_state_path)
+        if settings.metrics_enabled:
+            _prepare_metrics_dir()
+        if settings.database_url.startswith("sqlite"):
+            busy_timeout = max(settings.sqlite_busy_timeout_ms, MULTI_WORKER_SQLITE_BUSY_TIMEOUT_MS)
+            os.environ["SQLITE_BUSY_TIMEOUT_MS"] = str(busy_timeout)
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,35 @@ Multi-provider AI service for prompt generation.
 Supports: OpenAI, Anthropic, Google, OpenRouter, Groq, DeepSeek, Mistral, Cohere, Perplexity, Together AI
 """
 
+import asyncio
+import json
+import math
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+
 import httpx
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
-import google.generativeai as genai
 
+from ..config import get_settings
 from ..schemas.prompt import ProviderEnum, PROVIDER_MODELS, PROVIDER_LABELS
+from .http_clients import get_client_registry
+from .metrics import (
+    OUTPUT_BUDGET_RETRIES,
+    observe_ttft,
+    observe_upstream,
+    cache_write_tokens,
+    cached_prompt_tokens,
+    model_label,
+    record_early_stop,
+    record_prompt_cache,
+    record_tokens,
+    record_usage,
+    stage_timer,
+    usage_value,
+)
+from .output_budget import budget_for, estimate_tokens, get_output_budget
+from .rate_limit import RETRYABLE_STATUS, backoff_delay, get_rate_limiter
+from .templates import compile_template
 
 
 # Provider base URLs
@@ -22,6 +45,27 @@ PROVIDER_URLS = {
     ProviderEnum.together: "https://api.together.xyz/v1",
 }
 
+# Google Generative Language REST API (called natively, without the SDK)
+GOOGLE_API_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+
+def provider_url(provider: ProviderEnum) -> str:
+    """
+    Base URL of an OpenAI-compatible provider.
+
+    UPSTREAM_BASE_URL redirects every provider to one server (e.g. the
+    benchmark stub in bench/stub_server.py).
+    """
+    override = get_settings().upstream_base_url.rstrip("/")
+    return f"{override}/v1" if override else PROVIDER_URLS[provider]
+
+
+def google_api_url() -> str:
+    """Base URL of the Gemini REST API, honouring UPSTREAM_BASE_URL."""
+    override = get_settings().upstream_base_url.rstrip("/")
+    return f"{override}/v1beta" if override else GOOGLE_API_URL
+
+
 # Default models for each provider
 DEFAULT_MODELS = {
     ProviderEnum.openai: "gpt-4o",
@@ -37,10 +81,11 @@ DEFAULT_MODELS = {
 }
 
 
+# Static on purpose: the business and role go into the user message, so the
+# system prompt is a byte-identical prefix that providers can cache
 DEFAULT_SYSTEM_PROMPT = """Вы — эксперт по созданию промптов для AI-ассистентов.
 
-Описание бизнеса: {business}
-Роль сотрудника: {role}
+Пользователь сообщит описание бизнеса и роль сотрудника.
 
 Ваша задача — создать 5 полезных промптов для сотрудника с указанной ролью.
 
@@ -54,95 +99,336 @@ DEFAULT_SYSTEM_PROMPT = """Вы — эксперт по созданию про
 Формат ответа — только список промптов, каждый с новой строки, без нумерации и лишнего текста."""
 
 
-def get_system_prompt(role: str, business: str, custom_prompt: str = "") -> str:
-    """Get system prompt with variables replaced."""
-    template = custom_prompt if custom_prompt else DEFAULT_SYSTEM_PROMPT
-    return template.replace("{role}", role).replace("{business}", business)
+MAX_PROMPTS = 5
+FALLBACK_PROMPT = "Не удалось сгенерировать промпты. Попробуйте ещё раз."
+
+# Line the model is asked to print after the last prompt; used as a
+# server-side stop sequence where the provider supports one
+END_MARKER = "<END>"
+
+# Providers whose chat API accepts stop sequences
+STOP_SEQUENCE_PROVIDERS = {
+    ProviderEnum.openai,
+    ProviderEnum.anthropic,
+    ProviderEnum.google,
+    ProviderEnum.openrouter,
+    ProviderEnum.groq,
+    ProviderEnum.deepseek,
+    ProviderEnum.mistral,
+    ProviderEnum.together,
+}
+
+# OpenAI-compatible providers that report usage on streams when asked with
+# stream_options.include_usage (in one last chunk without choices)
+STREAM_USAGE_PROVIDERS = {
+    ProviderEnum.openrouter,
+    ProviderEnum.groq,
+    ProviderEnum.deepseek,
+}
+
+# Text read past the last prompt while waiting for that usage chunk; a
+# model still writing after this much is cut off (see _complete_streamed)
+USAGE_DRAIN_CHARS = 200
 
 
-def get_user_message(business: str, role: str) -> str:
-    """Simple user message - all instructions are in system prompt."""
-    return "Сгенерируй промпты согласно инструкциям."
+# Only needed by API versions from before prompt caching became generally available
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+
+def _instruction() -> str:
+    """Closing instruction of the user message."""
+    if not get_settings().stop_sequences:
+        return "Сгенерируй промпты согласно инструкциям."
+    return f"Сгенерируй промпты согласно инструкциям. После последнего промпта выведи строку {END_MARKER}"
+
+
+def _stop_kwargs(provider: ProviderEnum, name: str) -> dict:
+    """Stop-sequence request parameter `name`, if the provider supports it."""
+    if not get_settings().stop_sequences or provider not in STOP_SEQUENCE_PROVIDERS:
+        return {}
+    return {name: [END_MARKER]}
+
+
+@dataclass(frozen=True)
+class PromptMessages:
+    """
+    System and user message of a generation, laid out for prompt caching.
+
+    `static_system` is identical for every request with the same template
+    (the prefix providers cache); `dynamic_system` is whatever follows the
+    first {role}/{business} placeholder of a custom template.
+    """
+    static_system: str
+    dynamic_system: str
+    user: str
+
+    @property
+    def system(self) -> str:
+        return self.static_system + self.dynamic_system
+
+
+def build_messages(role: str, business: str, custom_prompt: str = "") -> PromptMessages:
+    """
+    Messages for a generation (templates are compiled once).
+
+    Templates without placeholders, like the default one, stay static and
+    the business and role are sent in the user message. Templates with
+    placeholders are rendered as before; only the text before the first
+    placeholder is cacheable then.
+    """
+    template = compile_template(custom_prompt if custom_prompt else DEFAULT_SYSTEM_PROMPT)
+    instruction = _instruction()
+    if not template.placeholders:
+        return PromptMessages(
+            static_system=template.source,
+            dynamic_system="",
+            user=f"Описание бизнеса: {business}\nРоль сотрудника: {role}\n\n{instruction}",
+        )
+    static = template.static_prefix
+    return PromptMessages(
+        static_system=static,
+        dynamic_system=template.render(role, business)[len(static):],
+        user=instruction,
+    )
+
+
+def _chat_messages(messages: PromptMessages) -> list[dict]:
+    """OpenAI-style message list: system prefix first, per-request parts last."""
+    return [
+        {"role": "system", "content": messages.system},
+        {"role": "user", "content": messages.user},
+    ]
+
+
+def _anthropic_system(messages: PromptMessages) -> list[dict]:
+    """
+    Anthropic system blocks with an explicit cache breakpoint after the
+    static part (PROMPT_CACHING). Prompts shorter than the model's minimum
+    cacheable length are simply not cached.
+    """
+    blocks = []
+    if messages.static_system:
+        block = {"type": "text", "text": messages.static_system}
+        if get_settings().prompt_caching:
+            block["cache_control"] = {"type": "ephemeral"}
+        blocks.append(block)
+    if messages.dynamic_system:
+        blocks.append({"type": "text", "text": messages.dynamic_system})
+    return blocks
+
+
+def _anthropic_headers() -> dict:
+    if not get_settings().prompt_caching:
+        return {}
+    return {"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA}
+
+
+def clean_prompt_line(line: str) -> str:
+    """Clean a single response line. Returns empty string if it is not a prompt."""
+    prompt = line.strip()
+    if not prompt or prompt.startswith(("#", "-", "*", "•")):
+        return ""
+
+    if len(prompt) > 2 and prompt[0].isdigit() and prompt[1] in ".):":
+        prompt = prompt[2:].strip()
+    elif len(prompt) > 3 and prompt[:2].isdigit() and prompt[2] in ".):":
+        prompt = prompt[3:].strip()
+    return prompt
+
+
+def prompt_lines(content: str) -> list[str]:
+    """All lines of a response before END_MARKER that pass the prompt cleaning rules."""
+    content = content.split(END_MARKER, 1)[0]
+    return [prompt for prompt in map(clean_prompt_line, content.split("\n")) if prompt]
 
 
 def parse_prompts(content: str) -> list[str]:
     """Parse prompts from AI response."""
-    prompts = [
-        line.strip()
-        for line in content.split("\n")
-        if line.strip() and not line.strip().startswith(("#", "-", "*", "•"))
-    ]
+    cleaned_prompts = prompt_lines(content)
+    return cleaned_prompts[:MAX_PROMPTS] if cleaned_prompts else [FALLBACK_PROMPT]
+
+
+@dataclass
+class Completion:
+    """A finished (non-streamed) completion and what the provider reported about it."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    # Prompt tokens read from / written to the provider's prompt cache
+    cached_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+    # Stopped by max_tokens rather than by the model
+    truncated: bool = False
+
+    def complete_text(self) -> str:
+        """Text without the cut-off last line of a truncated completion."""
+        if not self.truncated:
+            return self.text
+        return self.text.rsplit("\n", 1)[0] if "\n" in self.text else ""
+
+    def tokens_for_prompts(self, limit: int = MAX_PROMPTS) -> int:
+        """Completion tokens spent up to the end of the `limit`-th prompt line."""
+        text = self.complete_text()
+        span, found = len(text), 0
+        offset = 0
+        for line in text.split("\n"):
+            offset += len(line) + 1
+            if clean_prompt_line(line):
+                found += 1
+                if found == limit:
+                    span = min(offset, len(text))
+                    break
+        if self.completion_tokens and self.text:
+            return math.ceil(self.completion_tokens * span / len(self.text))
+        return estimate_tokens(span)
+
+
+def _max_tokens(max_tokens: Optional[int]) -> int:
+    return max_tokens or get_settings().max_tokens
+
+
+class PromptStreamParser:
+    """
+    Incremental version of parse_prompts for token streams.
+
+    Feed text chunks as they arrive; every line that is complete and
+    passes the same cleaning rules is returned as soon as its newline is seen,
+    as an (index, prompt) pair.
+    The parser is done after `limit` prompts or at END_MARKER.
+    """
+
+    def __init__(self, limit: int = MAX_PROMPTS):
+        self.limit = limit
+        self.prompts: list[str] = []
+        self.ended = False
+        self._buffer = ""
+
+    @property
+    def done(self) -> bool:
+        return self.ended or len(self.prompts) >= self.limit
 
-    cleaned_prompts = []
-    for prompt in prompts:
-        if len(prompt) > 2 and prompt[0].isdigit() and prompt[1] in ".):":
-            prompt = prompt[2:].strip()
-        elif len(prompt) > 3 and prompt[:2].isdigit() and prompt[2] in ".):":
-            prompt = prompt[3:].strip()
-        if prompt:
-            cleaned_prompts.append(prompt)
+    def feed(self, chunk: str) -> list[tuple[int, str]]:
+        """Add a chunk of text, returning prompts completed by it."""
+        self._buffer += chunk
+        completed = []
+        while "\n" in self._buffer and not self.done:
+            line, self._buffer = self._buffer.split("\n", 1)
+            completed.extend(self._accept(line))
+        return completed
 
-    return cleaned_prompts[:5] if cleaned_prompts else ["Не удалось сгенерировать промпты. Попробуйте ещё раз."]
+    def close(self) -> list[tuple[int, str]]:
+        """Flush the trailing line once the stream has ended."""
+        line, self._buffer = self._buffer, ""
+        return self._accept(line) if not self.done else []
+
+    def result(self) -> list[str]:
+        """Final prompt list, matching parse_prompts on the full text."""
+        return list(self.prompts) if self.prompts else [FALLBACK_PROMPT]
+
+    def _accept(self, line: str) -> list[tuple[int, str]]:
+        if END_MARKER in line:
+            line = line.split(END_MARKER, 1)[0]
+            self.ended = True
+        prompt = clean_prompt_line(line)
+        if not prompt:
+            return []
+        self.prompts.append(prompt)
+        return [(len(self.prompts) - 1, prompt)]
 
 
 async def test_openai_compatible(provider: ProviderEnum, api_key: str, test_model: str) -> dict:
     """Test OpenAI-compatible API."""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
+    client = get_client_registry().http_client(provider)
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
 
-        # OpenRouter requires additional headers
-        if provider == ProviderEnum.openrouter:
-            headers["HTTP-Referer"] = "https://prompt-generator.app"
-            headers["X-Title"] = "Prompt Generator"
+    # OpenRouter requires additional headers
+    if provider == ProviderEnum.openrouter:
+        headers["HTTP-Referer"] = "https://prompt-generator.app"
+        headers["X-Title"] = "Prompt Generator"
 
-        try:
-            response = await client.post(
-                f"{PROVIDER_URLS[provider]}/chat/completions",
-                headers=headers,
-                json={
-                    "model": test_model,
-                    "messages": [{"role": "user", "content": "Hi"}],
-                    "max_tokens": 5,
-                },
-                timeout=30.0,
-            )
+    try:
+        response = await client.post(
+            f"{provider_url(provider)}/chat/completions",
+            headers=headers,
+            json={
+                "model": test_model,
+                "messages": [{"role": "user", "content": "Hi"}],
+                "max_tokens": 5,
+            },
+            timeout=30.0,
+        )
+
+        if response.status_code == 200:
+            return {"success": True, "message": f"API ключ {PROVIDER_LABELS[provider]} работает ✓"}
+        elif response.status_code == 401:
+            return {"success": False, "message": "Неверный API ключ", "status": response.status_code}
+        elif response.status_code == 402:
+            return {"success": False, "message": "Недостаточно средств на счёте", "status": response.status_code}
+        elif response.status_code == 429:
+            return {"success": False, "message": "Превышен лимит запросов", "status": response.status_code}
+        else:
+            error_text = response.text[:200] if response.text else ""
+            return {
+                "success": False,
+                "message": f"Ошибка {response.status_code}: {error_text}",
+                "status": response.status_code,
+            }
+    except httpx.TimeoutException:
+        return {"success": False, "message": "Превышено время ожидания"}
+    except Exception as e:
+        return {"success": False, "message": f"Ошибка: {str(e)}"}
 
-            if response.status_code == 200:
-                return {"success": True, "message": f"API ключ {PROVIDER_LABELS[provider]} работает ✓"}
-            elif response.status_code == 401:
-                return {"success": False, "message": "Неверный API ключ"}
-            elif response.status_code == 402:
-                return {"success": False, "message": "Недостаточно средств на счёте"}
-            elif response.status_code == 429:
-                return {"success": False, "message": "Превышен лимит запросов"}
-            else:
-                error_text = response.text[:200] if response.text else ""
-                return {"success": False, "message": f"Ошибка {response.status_code}: {error_text}"}
-        except httpx.TimeoutException:
-            return {"success": False, "message": "Превышено время ожидания"}
-        except Exception as e:
-            return {"success": False, "message": f"Ошибка: {str(e)}"}
+
+async def test_google(api_key: str) -> dict:
+    """Test Google AI API key by listing models."""
+    client = get_client_registry().http_client(ProviderEnum.google)
+    try:
+        response = await client.get(
+            f"{google_api_url()}/models",
+            headers={"x-goog-api-key": api_key},
+            params={"pageSize": 1},
+            timeout=30.0,
+        )
+
+        if response.status_code == 200:
+            return {"success": True, "message": "API ключ Google AI работает ✓"}
+        elif response.status_code in (400, 401, 403):
+            return {"success": False, "message": "Неверный API ключ", "status": response.status_code}
+        elif response.status_code == 429:
+            return {"success": False, "message": "Превышен лимит запросов", "status": response.status_code}
+        else:
+            error_text = response.text[:200] if response.text else ""
+            return {
+                "success": False,
+                "message": f"Ошибка {response.status_code}: {error_text}",
+                "status": response.status_code,
+            }
+    except httpx.TimeoutException:
+        return {"success": False, "message": "Превышено время ожидания"}
+    except Exception as e:
+        return {"success": False, "message": f"Ошибка: {str(e)}"}
 
 
 async def test_api_key(provider: ProviderEnum, api_key: str) -> dict:
     """
     Test if an API key is valid for the given provider.
-    Returns dict with 'success' and 'message' keys.
+    Returns dict with 'success' and 'message' keys; failures also carry the
+    upstream HTTP 'status' when there was a response.
     """
     if not api_key:
         return {"success": False, "message": "API ключ не указан"}
 
     try:
         if provider == ProviderEnum.openai:
-            client = AsyncOpenAI(api_key=api_key)
+            client = get_client_registry().openai_client(api_key)
             await client.models.list()
             return {"success": True, "message": "API ключ OpenAI работает ✓"}
 
         elif provider == ProviderEnum.anthropic:
-            client = AsyncAnthropic(api_key=api_key)
+            client = get_client_registry().anthropic_client(api_key)
             await client.messages.create(
                 model="claude-3-haiku-20240307",
                 max_tokens=10,
@@ -151,11 +437,7 @@ async def test_api_key(provider: ProviderEnum, api_key: str) -> dict:
             return {"success": True, "message": "API ключ Anthropic работает ✓"}
 
         elif provider == ProviderEnum.google:
-            genai.configure(api_key=api_key)
-            # Try to list models
-            models = genai.list_models()
-            list(models)  # Force evaluation
-            return {"success": True, "message": "API ключ Google AI работает ✓"}
+            return await test_google(api_key)
 
         elif provider in PROVIDER_URLS:
             # Use default model for testing
@@ -165,58 +447,221 @@ async def test_api_key(provider: ProviderEnum, api_key: str) -> dict:
         return {"success": False, "message": "Неизвестный провайдер"}
 
     except Exception as e:
-        return {"success": False, "message": f"Ошибка: {str(e)}"}
+        # SDK errors (openai, anthropic) carry the upstream status
+        return {"success": False, "message": f"Ошибка: {str(e)}", "status": getattr(e, "status_code", None)}
+
 
+@asynccontextmanager
+async def sdk_rate_limited(provider: ProviderEnum, api_key: str) -> AsyncIterator[Callable[[Any], Any]]:
+    """
+    Hold a rate limiter slot around an SDK call.
 
-async def generate_with_openai(api_key: str, model: str, business: str, role: str, custom_prompt: str = "") -> str:
+    Yields `parsed`: pass it the response of a `with_raw_response` call to
+    feed its status and rate limit headers to the limiter and get the parsed
+    result back. The SDKs retry 429s themselves; failed responses are still
+    fed to the limiter so concurrent requests back off too, and a call that
+    succeeds without passing its response counts as a plain success.
+    """
+    limiter = get_rate_limiter(provider, api_key)
+    observed = False
+
+    def parsed(raw: Any) -> Any:
+        nonlocal observed
+        limiter.observe(raw.status_code, raw.headers)
+        observed = True
+        return raw.parse()
+
+    async with limiter.slot():
+        try:
+            yield parsed
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if isinstance(response, httpx.Response):
+                limiter.observe(response.status_code, response.headers)
+            raise
+        if not observed:
+            limiter.observe(200, {})
+
+
+async def generate_with_openai(
+    api_key: str, model: str, business: str, role: str, custom_prompt: str = "", max_tokens: Optional[int] = None
+) -> Completion:
     """Generate using OpenAI API."""
-    client = AsyncOpenAI(api_key=api_key)
-    response = await client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": get_system_prompt(role, business, custom_prompt)},
-            {"role": "user", "content": get_user_message(business, role)},
-        ],
-        temperature=0.7,
-        max_tokens=2000,
+    client = get_client_registry().openai_client(api_key)
+    async with sdk_rate_limited(ProviderEnum.openai, api_key) as parsed:
+        response = parsed(await client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=_chat_messages(build_messages(role, business, custom_prompt)),
+            temperature=0.7,
+            max_tokens=_max_tokens(max_tokens),
+            **_stop_kwargs(ProviderEnum.openai, "stop"),
+        ))
+    choice = response.choices[0]
+    return Completion(
+        text=choice.message.content or "",
+        prompt_tokens=usage_value(response.usage, "prompt_tokens"),
+        completion_tokens=usage_value(response.usage, "completion_tokens"),
+        cached_tokens=cached_prompt_tokens(response.usage),
+        truncated=choice.finish_reason == "length",
     )
-    return response.choices[0].message.content or ""
 
 
-async def generate_with_anthropic(api_key: str, model: str, business: str, role: str, custom_prompt: str = "") -> str:
+async def generate_with_anthropic(
+    api_key: str, model: str, business: str, role: str, custom_prompt: str = "", max_tokens: Optional[int] = None
+) -> Completion:
     """Generate using Anthropic API."""
-    client = AsyncAnthropic(api_key=api_key)
-    response = await client.messages.create(
-        model=model,
-        max_tokens=2000,
-        system=get_system_prompt(role, business, custom_prompt),
-        messages=[{"role": "user", "content": get_user_message(business, role)}],
+    client = get_client_registry().anthropic_client(api_key)
+    messages = build_messages(role, business, custom_prompt)
+    async with sdk_rate_limited(ProviderEnum.anthropic, api_key) as parsed:
+        response = parsed(await client.messages.with_raw_response.create(
+            model=model,
+            max_tokens=_max_tokens(max_tokens),
+            system=_anthropic_system(messages),
+            messages=[{"role": "user", "content": messages.user}],
+            extra_headers=_anthropic_headers(),
+            **_stop_kwargs(ProviderEnum.anthropic, "stop_sequences"),
+        ))
+    return Completion(
+        text=response.content[0].text if response.content else "",
+        prompt_tokens=usage_value(response.usage, "input_tokens"),
+        completion_tokens=usage_value(response.usage, "output_tokens"),
+        cached_tokens=cached_prompt_tokens(response.usage),
+        cache_write_tokens=cache_write_tokens(response.usage),
+        truncated=response.stop_reason == "max_tokens",
     )
-    return response.content[0].text if response.content else ""
 
 
-async def generate_with_google(api_key: str, model: str, business: str, role: str, custom_prompt: str = "") -> str:
-    """Generate using Google Generative AI API."""
-    genai.configure(api_key=api_key)
-    model_instance = genai.GenerativeModel(
-        model_name=model,
-        generation_config={
+async def post_with_retries(
+    provider: ProviderEnum, api_key: str, url: str, headers: dict, payload: dict, timeout: float = 60.0
+) -> httpx.Response:
+    """
+    POST through the provider's pooled client and rate limiter.
+
+    429 and transient 5xx are retried with jittered exponential backoff;
+    the limiter also pauses other requests on the same provider and key.
+    """
+    client = get_client_registry().http_client(provider)
+    limiter = get_rate_limiter(provider, api_key)
+    max_retries = get_settings().rate_limit_max_retries
+
+    for attempt in range(max_retries + 1):
+        async with limiter.slot():
+            response = await client.post(url, headers=headers, json=payload, timeout=timeout)
+        retry_after = limiter.observe(response.status_code, response.headers)
+        if response.status_code not in RETRYABLE_STATUS or attempt == max_retries:
+            break
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    response.raise_for_status()
+    return response
+
+
+async def stream_sse_with_retries(
+    provider: ProviderEnum, api_key: str, url: str, headers: dict, payload: dict, timeout: float = 60.0
+) -> AsyncIterator[dict]:
+    """
+    POST and yield each JSON `data:` event of a Server-Sent Events response.
+
+    Throttling is retried like post_with_retries, but only before any
+    event has been produced.
+    """
+    client = get_client_registry().http_client(provider)
+    limiter = get_rate_limiter(provider, api_key)
+    max_retries = get_settings().rate_limit_max_retries
+
+    for attempt in range(max_retries + 1):
+        async with limiter.slot():
+            async with client.stream("POST", url, headers=headers, json=payload, timeout=timeout) as response:
+                retry_after = limiter.observe(response.status_code, response.headers)
+                retry = response.status_code in RETRYABLE_STATUS and attempt < max_retries
+                if not retry:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        yield json.loads(data)
+                    return
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+
+def _google_request(
+    model: str, business: str, role: str, custom_prompt: str, max_tokens: Optional[int] = None
+) -> tuple[str, dict]:
+    """Model path and JSON body for the Gemini generateContent API."""
+    # Combine system prompt and user message for Google, static part first
+    # so Gemini's implicit prefix caching can apply
+    messages = build_messages(role, business, custom_prompt)
+    full_prompt = f"{messages.system}\n\n{messages.user}"
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": full_prompt}]}],
+        "generationConfig": {
             "temperature": 0.7,
-            "max_output_tokens": 2000,
+            "maxOutputTokens": _max_tokens(max_tokens),
+            **_stop_kwargs(ProviderEnum.google, "stopSequences"),
         },
-    )
+    }
+    return f"{google_api_url()}/models/{model.removeprefix('models/')}", payload
 
-    # Combine system prompt and user message for Google
-    full_prompt = f"{get_system_prompt(role, business, custom_prompt)}\n\n{get_user_message(business, role)}"
 
-    response = await model_instance.generate_content_async(full_prompt)
-    return response.text if response.text else ""
+def _google_text(data: dict) -> str:
+    """Concatenate the text parts of the first Gemini candidate."""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get("content", {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def generate_with_google(
+    api_key: str, model: str, business: str, role: str, custom_prompt: str = "", max_tokens: Optional[int] = None
+) -> Completion:
+    """
+    Generate using Google Generative AI API.
+
+    Calls the REST API through the pooled async client: nothing blocks the
+    event loop and the key travels in this request's header only, so
+    concurrent requests with different keys cannot cross.
+    """
+    model_url, payload = _google_request(model, business, role, custom_prompt, max_tokens)
+    response = await post_with_retries(
+        ProviderEnum.google,
+        api_key,
+        f"{model_url}:generateContent",
+        headers={"x-goog-api-key": api_key, "Content-Type": "application/json"},
+        payload=payload,
+    )
+    data = response.json()
+    usage = data.get("usageMetadata")
+    candidates = data.get("candidates") or [{}]
+    return Completion(
+        text=_google_text(data),
+        prompt_tokens=usage_value(usage, "promptTokenCount"),
+        completion_tokens=usage_value(usage, "candidatesTokenCount"),
+        cached_tokens=cached_prompt_tokens(usage),
+        truncated=candidates[0].get("finishReason") == "MAX_TOKENS",
+    )
 
 
 async def generate_with_http(
-    base_url: str, api_key: str, model: str, business: str, role: str, provider: ProviderEnum, custom_prompt: str = ""
-) -> str:
-    """Generate using HTTP API (OpenRouter, xAI, ZAI)."""
+    base_url: str,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    provider: ProviderEnum,
+    custom_prompt: str = "",
+    max_tokens: Optional[int] = None,
+) -> Completion:
+    """
+    Generate using an OpenAI-compatible HTTP API: OpenRouter, Groq, DeepSeek,
+    Mistral, Cohere, Perplexity and Together. OpenAI, Anthropic and Google
+    have their own functions above.
+    """
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -227,24 +672,260 @@ async def generate_with_http(
         headers["HTTP-Referer"] = "https://prompt-generator.local"
         headers["X-Title"] = "Prompt Generator"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{base_url}/chat/completions",
-            headers=headers,
-            json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": get_system_prompt(role, business, custom_prompt)},
-                    {"role": "user", "content": get_user_message(business, role)},
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.7,
-            },
-            timeout=60.0,
+    response = await post_with_retries(
+        provider,
+        api_key,
+        f"{base_url}/chat/completions",
+        headers=headers,
+        payload={
+            "model": model,
+            "messages": _chat_messages(build_messages(role, business, custom_prompt)),
+            "max_tokens": _max_tokens(max_tokens),
+            "temperature": 0.7,
+            **_stop_kwargs(provider, "stop"),
+        },
+    )
+    data = response.json()
+    choice = data["choices"][0]
+    return Completion(
+        text=choice["message"]["content"] or "",
+        prompt_tokens=usage_value(data.get("usage"), "prompt_tokens"),
+        completion_tokens=usage_value(data.get("usage"), "completion_tokens"),
+        cached_tokens=cached_prompt_tokens(data.get("usage")),
+        truncated=choice.get("finish_reason") == "length",
+    )
+
+
+async def stream_with_openai(
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    custom_prompt: str = "",
+    max_tokens: Optional[int] = None,
+    completion: Optional[Completion] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream text chunks from OpenAI API.
+
+    Usage and truncation are filled into `completion` if one is given.
+    """
+    completion = completion if completion is not None else Completion(text="")
+    client = get_client_registry().openai_client(api_key)
+    async with sdk_rate_limited(ProviderEnum.openai, api_key) as parsed:
+        stream = parsed(await client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=_chat_messages(build_messages(role, business, custom_prompt)),
+            temperature=0.7,
+            max_tokens=_max_tokens(max_tokens),
+            stream=True,
+            extra_body={"stream_options": {"include_usage": True}},
+            **_stop_kwargs(ProviderEnum.openai, "stop"),
+        ))
+        try:
+            async for chunk in stream:
+                if chunk.choices:
+                    choice = chunk.choices[0]
+                    if choice.delta.content:
+                        yield choice.delta.content
+                    if choice.finish_reason == "length":
+                        completion.truncated = True
+                # The final chunk (no choices) carries usage when include_usage is set
+                usage = getattr(chunk, "usage", None)
+                if usage:
+                    completion.prompt_tokens = usage_value(usage, "prompt_tokens")
+                    completion.completion_tokens = usage_value(usage, "completion_tokens")
+                    completion.cached_tokens = cached_prompt_tokens(usage)
+                    record_usage(ProviderEnum.openai, model, usage, "prompt_tokens", "completion_tokens")
+        finally:
+            await stream.close()
+
+
+async def stream_with_anthropic(
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    custom_prompt: str = "",
+    max_tokens: Optional[int] = None,
+    completion: Optional[Completion] = None,
+) -> AsyncIterator[str]:
+    """Stream text chunks from Anthropic API."""
+    completion = completion if completion is not None else Completion(text="")
+    client = get_client_registry().anthropic_client(api_key)
+    messages = build_messages(role, business, custom_prompt)
+    async with sdk_rate_limited(ProviderEnum.anthropic, api_key) as parsed:
+        stream = parsed(await client.messages.with_raw_response.create(
+            model=model,
+            max_tokens=_max_tokens(max_tokens),
+            system=_anthropic_system(messages),
+            messages=[{"role": "user", "content": messages.user}],
+            extra_headers=_anthropic_headers(),
+            stream=True,
+            **_stop_kwargs(ProviderEnum.anthropic, "stop_sequences"),
+        ))
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                    yield event.delta.text
+                elif event.type == "message_start":
+                    completion.prompt_tokens = usage_value(event.message.usage, "input_tokens")
+                    record_usage(ProviderEnum.anthropic, model, event.message.usage, "input_tokens", "")
+                elif event.type == "message_delta":
+                    completion.completion_tokens = usage_value(event.usage, "output_tokens")
+                    completion.truncated = event.delta.stop_reason == "max_tokens"
+                    record_usage(ProviderEnum.anthropic, model, event.usage, "", "output_tokens")
+        finally:
+            await stream.close()
+
+
+async def stream_with_google(
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    custom_prompt: str = "",
+    max_tokens: Optional[int] = None,
+    completion: Optional[Completion] = None,
+) -> AsyncIterator[str]:
+    """Stream text chunks from Google Generative AI API via SSE."""
+    completion = completion if completion is not None else Completion(text="")
+    model_url, payload = _google_request(model, business, role, custom_prompt, max_tokens)
+    events = stream_sse_with_retries(
+        ProviderEnum.google,
+        api_key,
+        f"{model_url}:streamGenerateContent?alt=sse",
+        headers={"x-goog-api-key": api_key, "Content-Type": "application/json"},
+        payload=payload,
+    )
+    usage = None
+    try:
+        async with aclosing(events):
+            async for data in events:
+                # Every chunk repeats the running usage; keep the last one
+                usage = data.get("usageMetadata") or usage
+                candidates = data.get("candidates") or [{}]
+                if candidates[0].get("finishReason") == "MAX_TOKENS":
+                    completion.truncated = True
+                text = _google_text(data)
+                if text:
+                    yield text
+    finally:
+        completion.prompt_tokens = usage_value(usage, "promptTokenCount")
+        completion.completion_tokens = usage_value(usage, "candidatesTokenCount")
+        record_usage(ProviderEnum.google, model, usage, "promptTokenCount", "candidatesTokenCount")
+
+
+async def stream_with_http(
+    base_url: str,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    provider: ProviderEnum,
+    custom_prompt: str = "",
+    max_tokens: Optional[int] = None,
+    completion: Optional[Completion] = None,
+) -> AsyncIterator[str]:
+    """Stream text chunks from an OpenAI-compatible HTTP API via SSE."""
+    completion = completion if completion is not None else Completion(text="")
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+
+    if provider == ProviderEnum.openrouter:
+        headers["HTTP-Referer"] = "https://prompt-generator.local"
+        headers["X-Title"] = "Prompt Generator"
+
+    events = stream_sse_with_retries(
+        provider,
+        api_key,
+        f"{base_url}/chat/completions",
+        headers=headers,
+        payload={
+            "model": model,
+            "messages": _chat_messages(build_messages(role, business, custom_prompt)),
+            "max_tokens": _max_tokens(max_tokens),
+            "temperature": 0.7,
+            "stream": True,
+            **({"stream_options": {"include_usage": True}} if provider in STREAM_USAGE_PROVIDERS else {}),
+            **_stop_kwargs(provider, "stop"),
+        },
+    )
+    async with aclosing(events):
+        async for data in events:
+            choices = data.get("choices") or []
+            text = choices[0].get("delta", {}).get("content") if choices else None
+            if text:
+                yield text
+            if choices and choices[0].get("finish_reason") == "length":
+                completion.truncated = True
+            # Some providers (e.g. OpenRouter) send usage with the last chunk
+            if data.get("usage"):
+                completion.prompt_tokens = usage_value(data["usage"], "prompt_tokens")
+                completion.completion_tokens = usage_value(data["usage"], "completion_tokens")
+                completion.cached_tokens = cached_prompt_tokens(data["usage"])
+                record_usage(provider, model, data["usage"], "prompt_tokens", "completion_tokens")
+
+
+def resolve_model(provider: ProviderEnum, model: str) -> str:
+    """Return the requested model or the provider default."""
+    return model or DEFAULT_MODELS.get(provider, "")
+
+
+async def _observed_stream(provider: ProviderEnum, model: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Record upstream latency and time to first token of a completion stream."""
+    started = asyncio.get_running_loop().time()
+    first = True
+    with observe_upstream(provider, model):
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                if first:
+                    observe_ttft(provider, model, asyncio.get_running_loop().time() - started)
+                    first = False
+                yield chunk
+
+
+def stream_completion(
+    provider: ProviderEnum,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    system_prompt: str = "",
+    max_tokens: Optional[int] = None,
+    completion: Optional[Completion] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream raw completion text from the specified AI provider.
+
+    The model must already be resolved (see resolve_model). Usage and
+    truncation are filled into `completion` if one is given.
+    """
+    if not api_key:
+        raise ValueError("API ключ не указан")
+
+    if provider == ProviderEnum.openai:
+        chunks = stream_with_openai(api_key, model, business, role, system_prompt, max_tokens, completion)
+
+    elif provider == ProviderEnum.anthropic:
+        chunks = stream_with_anthropic(api_key, model, business, role, system_prompt, max_tokens, completion)
+
+    elif provider == ProviderEnum.google:
+        chunks = stream_with_google(api_key, model, business, role, system_prompt, max_tokens, completion)
+
+    elif provider in PROVIDER_URLS:
+        base_url = provider_url(provider)
+        chunks = stream_with_http(
+            base_url, api_key, model, business, role, provider, system_prompt, max_tokens, completion
         )
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+
+    else:
+        raise ValueError(f"Неизвестный провайдер: {provider}")
+
+    return _observed_stream(provider, model, chunks)
 
 
 async def generate_prompts(
@@ -273,27 +954,121 @@ async def generate_prompts(
         raise ValueError("API ключ не указан")
 
     # Use default model if not specified
-    if not model:
-        model = DEFAULT_MODELS.get(provider, "")
+    model = resolve_model(provider, model)
 
-    if provider == ProviderEnum.openai:
-        content = await generate_with_openai(api_key, model, business, role, system_prompt)
+    if provider not in (ProviderEnum.openai, ProviderEnum.anthropic, ProviderEnum.google) \
+            and provider not in PROVIDER_URLS:
+        raise ValueError(f"Неизвестный провайдер: {provider}")
 
-    elif provider == ProviderEnum.anthropic:
-        content = await generate_with_anthropic(api_key, model, business, role, system_prompt)
+    # Learned output budget; retried once with the full cap if it cut the answer short
+    budget = budget_for(provider, model)
+    completion = await _complete(provider, api_key, model, business, role, system_prompt, budget)
+    with stage_timer("parse"):
+        prompts = prompt_lines(completion.complete_text())
 
-    elif provider == ProviderEnum.google:
-        content = await generate_with_google(api_key, model, business, role, system_prompt)
+    cap = get_settings().max_tokens
+    if len(prompts) < MAX_PROMPTS and completion.truncated and budget < cap:
+        OUTPUT_BUDGET_RETRIES.labels(provider.value, model_label(provider, model)).inc()
+        completion = await _complete(provider, api_key, model, business, role, system_prompt, cap)
+        with stage_timer("parse"):
+            prompts = prompt_lines(completion.complete_text())
 
-    elif provider in PROVIDER_URLS:
-        # All other providers use OpenAI-compatible API
-        base_url = PROVIDER_URLS[provider]
-        content = await generate_with_http(base_url, api_key, model, business, role, provider, system_prompt)
+    if len(prompts) >= MAX_PROMPTS:
+        get_output_budget().observe(provider, model, completion.tokens_for_prompts())
 
-    else:
-        raise ValueError(f"Неизвестный провайдер: {provider}")
+    return (prompts[:MAX_PROMPTS] or [FALLBACK_PROMPT]), model
+
+
+async def _complete(
+    provider: ProviderEnum,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    system_prompt: str,
+    max_tokens: int,
+) -> Completion:
+    """One provider call, timed and with its token usage recorded."""
+    if get_settings().stream_generation:
+        return await _complete_streamed(provider, api_key, model, business, role, system_prompt, max_tokens)
+
+    with observe_upstream(provider, model):
+        if provider == ProviderEnum.openai:
+            completion = await generate_with_openai(api_key, model, business, role, system_prompt, max_tokens)
+
+        elif provider == ProviderEnum.anthropic:
+            completion = await generate_with_anthropic(api_key, model, business, role, system_prompt, max_tokens)
+
+        elif provider == ProviderEnum.google:
+            completion = await generate_with_google(api_key, model, business, role, system_prompt, max_tokens)
 
-    return parse_prompts(content), model
+        else:
+            # All other providers use OpenAI-compatible API
+            base_url = provider_url(provider)
+            completion = await generate_with_http(
+                base_url, api_key, model, business, role, provider, system_prompt, max_tokens
+            )
+
+    record_tokens(provider, model, completion.prompt_tokens, completion.completion_tokens)
+    record_prompt_cache(provider, model, completion.cached_tokens, completion.cache_write_tokens)
+    return completion
+
+
+async def _complete_streamed(
+    provider: ProviderEnum,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    system_prompt: str,
+    max_tokens: int,
+) -> Completion:
+    """
+    Consume the completion as a stream and close it after MAX_PROMPTS prompts.
+
+    Closing the stream drops the upstream request, so the provider stops
+    generating (and billing) tokens we would throw away. Usually the stop
+    sequence has already ended generation by then, so the stream is read on
+    for up to USAGE_DRAIN_CHARS more text to get the usage sent last;
+    only a model that keeps writing is cut off.
+    """
+    completion = Completion(text="")
+    parser = PromptStreamParser()
+    parts: list[str] = []
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_chunk = None
+    stopped_early = False
+    trailing = 0
+
+    chunks = stream_completion(provider, api_key, model, business, role, system_prompt, max_tokens, completion)
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            if first_chunk is None:
+                first_chunk = loop.time()
+            if parser.done:
+                trailing += len(chunk)
+                if trailing > USAGE_DRAIN_CHARS:
+                    stopped_early = True
+                    break
+                continue
+            parts.append(chunk)
+            parser.feed(chunk)
+
+    completion.text = "".join(parts)
+    if stopped_early:
+        received = estimate_tokens(len(completion.text))
+        record_early_stop(
+            provider,
+            model,
+            received_tokens=received,
+            max_tokens=max_tokens,
+            decode_seconds=loop.time() - (first_chunk or started),
+        )
+        # The usage event never arrives on a closed stream
+        if completion.completion_tokens is None:
+            record_tokens(provider, model, None, received)
+    return completion
 
 
 def get_models_for_provider(provider: ProviderEnum) -> list[dict]:
@@ -0,0 +1,49 @@
+"""
+Batch generation with bounded per-provider concurrency.
+"""
+
+import asyncio
+from typing import AsyncIterator
+
+from ..schemas.prompt import GenerateRequest, BatchItemResult, ProviderEnum
+from .generation import run_generation_request, build_response
+
+
+async def _run_item(
+    index: int,
+    item: GenerateRequest,
+    semaphore: asyncio.Semaphore,
+) -> BatchItemResult:
+    async with semaphore:
+        try:
+            generation = await run_generation_request(item)
+        except ValueError as e:
+            return BatchItemResult(index=index, success=False, error=str(e))
+        except Exception as e:
+            return BatchItemResult(index=index, success=False, error=f"Ошибка генерации: {str(e)}")
+
+    return BatchItemResult(index=index, success=True, result=build_response(item, generation))
+
+
+async def run_batch(
+    items: list[GenerateRequest],
+    concurrency_per_provider: int,
+) -> AsyncIterator[BatchItemResult]:
+    """
+    Fan items out through run_generation, yielding results as they finish.
+
+    At most `concurrency_per_provider` items run against the same provider
+    at once. Per-item failures are returned as unsuccessful results.
+    """
+    semaphores: dict[ProviderEnum, asyncio.Semaphore] = {}
+    tasks = []
+    for index, item in enumerate(items):
+        semaphore = semaphores.setdefault(item.provider, asyncio.Semaphore(max(1, concurrency_per_provider)))
+        tasks.append(asyncio.create_task(_run_item(index, item, semaphore)))
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,190 @@
+"""
+Response cache for generate_prompts.
+
+Tiers: an in-process LRU with a TTL, the shared state backend when several
+workers run (so one worker's result serves the others), and an optional
+persistent tier in the application database. Keys are a hash of the provider, model and the
+rendered prompt messages; API keys never enter the key or the stored value.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete
+
+from ..config import get_settings
+from ..database import async_session
+from ..models.cache import CachedGeneration
+from ..schemas.prompt import ProviderEnum
+from .shared_state import SharedState, get_shared_state
+
+
+class TTLCache:
+    """Small in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class CachedResult:
+    """A cached generation result."""
+    prompts: list[str]
+    model: str
+
+
+def make_cache_key(provider: ProviderEnum, model: str, *parts: str) -> str:
+    """Hash the generation inputs that determine the result."""
+    payload = json.dumps(
+        [provider.value, model, *parts],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Tiered cache of generation results with hit/miss counters."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        persistent: bool = False,
+        shared: Optional[SharedState] = None,
+    ):
+        self.ttl = ttl
+        self.persistent = persistent
+        self._memory = TTLCache(max_entries, ttl)
+        self._shared = shared
+        self.counters = {
+            "memory_hits": 0,
+            "shared_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypasses": 0,
+        }
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        result = self._memory.get(key)
+        if result is not None:
+            self.counters["memory_hits"] += 1
+            return result
+
+        if self._shared is not None:
+            value = await self._shared.get(f"rc:{key}")
+            if value is not None:
+                self.counters["shared_hits"] += 1
+                result = CachedResult(**json.loads(value))
+                self._memory.set(key, result)
+                return result
+
+        if self.persistent:
+            result = await self._db_get(key)
+            if result is not None:
+                self.counters["db_hits"] += 1
+                self._memory.set(key, result)
+                return result
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, provider: ProviderEnum, result: CachedResult) -> None:
+        self._memory.set(key, result)
+        self.counters["stores"] += 1
+        if self._shared is not None:
+            value = json.dumps({"prompts": result.prompts, "model": result.model}, ensure_ascii=False)
+            await self._shared.set(f"rc:{key}", value, self.ttl)
+        if self.persistent:
+            await self._db_set(key, provider, result)
+
+    def record_bypass(self) -> None:
+        self.counters["bypasses"] += 1
+
+    def stats(self) -> dict:
+        hits = self.counters["memory_hits"] + self.counters["shared_hits"] + self.counters["db_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hits": hits,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "persistent": self.persistent,
+            "shared": self._shared is not None,
+        }
+
+    async def _db_get(self, key: str) -> Optional[CachedResult]:
+        async with async_session() as session:
+            row = await session.get(CachedGeneration, key)
+            if row is None:
+                return None
+            if row.expires_at <= datetime.utcnow():
+                await session.delete(row)
+                await session.commit()
+                return None
+            return CachedResult(prompts=json.loads(row.prompts), model=row.model)
+
+    async def _db_set(self, key: str, provider: ProviderEnum, result: CachedResult) -> None:
+        now = datetime.utcnow()
+        async with async_session() as session:
+            await session.execute(delete(CachedGeneration).where(CachedGeneration.key == key))
+            session.add(CachedGeneration(
+                key=key,
+                provider=provider.value,
+                model=result.model,
+                prompts=json.dumps(result.prompts, ensure_ascii=False),
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl),
+            ))
+            await session.commit()
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache."""
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = ResponseCache(
+            max_entries=settings.response_cache_max_entries,
+            ttl=settings.response_cache_ttl_seconds,
+            persistent=settings.response_cache_persistent,
+            shared=get_shared_state(),
+        )
+    return _cache
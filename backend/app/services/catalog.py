@@ -0,0 +1,84 @@
+"""
+Precomputed provider catalog.
+
+The /api/providers payload only changes when PROVIDER_MODELS does, so it is
+serialized to bytes once (at startup or on refresh_catalog()) together with
+a strong ETag, for the whole catalog and for each provider.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from ..schemas.prompt import (
+    ProviderEnum,
+    ProviderInfo,
+    ModelInfo,
+    PROVIDER_LABELS,
+    PROVIDER_MODELS,
+)
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """A serialized catalog resource."""
+    body: bytes
+    etag: str
+
+
+def _entry(payload) -> CatalogEntry:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return CatalogEntry(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class ProviderCatalog:
+    """Serialized provider catalog with per-provider sub-resources."""
+
+    def __init__(self):
+        self._all: Optional[CatalogEntry] = None
+        self._providers: dict[ProviderEnum, CatalogEntry] = {}
+
+    def refresh(self) -> None:
+        """Rebuild the serialized catalog from PROVIDER_MODELS."""
+        infos = {
+            provider: ProviderInfo(
+                value=provider.value,
+                label=PROVIDER_LABELS[provider],
+                models=[ModelInfo(**m) for m in PROVIDER_MODELS.get(provider, [])],
+            ).model_dump()
+            for provider in ProviderEnum
+        }
+        self._providers = {provider: _entry(info) for provider, info in infos.items()}
+        self._all = _entry(list(infos.values()))
+
+    def all(self) -> CatalogEntry:
+        if self._all is None:
+            self.refresh()
+        return self._all
+
+    def provider(self, provider: ProviderEnum) -> CatalogEntry:
+        if self._all is None:
+            self.refresh()
+        return self._providers[provider]
+
+
+_catalog = ProviderCatalog()
+
+
+def get_catalog() -> ProviderCatalog:
+    """Get the process-wide provider catalog."""
+    return _catalog
+
+
+def refresh_catalog() -> None:
+    """Re-serialize the catalog; call after changing PROVIDER_MODELS."""
+    _catalog.refresh()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
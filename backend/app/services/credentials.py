@@ -0,0 +1,47 @@
+"""
+Encryption of API keys that have to be stored for a while (queued jobs).
+
+Keys are sealed with Fernet (AES-CBC with an HMAC-SHA256 tag) under a key
+derived from JOB_KEY_SECRET. Without it the secret is random per process;
+`python -m app.serve` generates one for all of its workers. Sealed keys
+then cannot be opened once those processes are gone, so jobs still queued
+at a restart fail and have to be submitted again. Set JOB_KEY_SECRET for
+queued jobs to survive restarts.
+"""
+
+import base64
+import hashlib
+import json
+import secrets
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from ..config import get_settings
+
+
+class CredentialsUnavailable(Exception):
+    """Sealed keys that can no longer be opened (the secret changed)."""
+
+
+def _fernet() -> Fernet:
+    global _box
+    if _box is None:
+        secret = get_settings().job_key_secret or secrets.token_hex(32)
+        _box = Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest()))
+    return _box
+
+
+_box = None
+
+
+def seal(values: list[str]) -> str:
+    """Encrypt a list of secrets into one token."""
+    return _fernet().encrypt(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def unseal(token: str) -> list[str]:
+    """Decrypt a token made by seal(). Raises CredentialsUnavailable."""
+    try:
+        return json.loads(_fernet().decrypt(token.encode("ascii")))
+    except InvalidToken:
+        raise CredentialsUnavailable() from None
@@ -0,0 +1,139 @@
+"""
+Streaming export of generation history.
+
+Requests and their prompts are read in one ordered pass over a LEFT JOIN,
+through a server-side cursor (AsyncSession.stream with yield_per), and
+consecutive rows of the same request are folded into one record. Only one
+batch of rows and one request are held at a time, so memory stays flat
+regardless of the size of the export.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+
+from ..database import async_session
+from ..models.prompt import GeneratedPrompt, PromptRequest
+from ..schemas.history import ExportFormat
+
+# Rows fetched from the cursor per round trip
+EXPORT_YIELD_PER = 1000
+# Bytes collected before a chunk is sent
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = ["request_id", "created_at", "business", "role", "provider", "model", "prompt_index", "prompt"]
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def _requests_with_prompts(since: Optional[datetime]) -> AsyncIterator[tuple[Row, list[str]]]:
+    """(request row, its prompts) in (created_at, id) order."""
+    query = (
+        select(
+            PromptRequest.id,
+            PromptRequest.created_at,
+            PromptRequest.business_description,
+            PromptRequest.role,
+            PromptRequest.provider,
+            PromptRequest.model,
+            GeneratedPrompt.content,
+        )
+        .outerjoin(GeneratedPrompt, GeneratedPrompt.request_id == PromptRequest.id)
+        # Prompts in generation order, which makes prompt_index stable
+        .order_by(PromptRequest.created_at, PromptRequest.id, GeneratedPrompt.created_at, GeneratedPrompt.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    if since is not None:
+        query = query.where(PromptRequest.created_at >= _naive_utc(since))
+
+    # The request-scoped session is closed before a streaming body runs
+    async with async_session() as session:
+        result = await session.stream(query)
+        current, prompts = None, []
+        # Whole batches: iterating rows one by one costs a greenlet switch per row
+        async for batch in result.partitions():
+            for row in batch:
+                if current is None or row.id != current.id:
+                    if current is not None:
+                        yield current, prompts
+                    current, prompts = row, []
+                if row.content is not None:
+                    prompts.append(row.content)
+        if current is not None:
+            yield current, prompts
+
+
+def ndjson_record(request: Row, prompts: list[str]) -> str:
+    """A request with its prompts as one NDJSON line (also used by the retention archive)."""
+    return json.dumps({
+        "id": str(request.id),
+        "created_at": request.created_at.isoformat(),
+        "business": request.business_description,
+        "role": request.role,
+        "provider": request.provider,
+        "model": request.model,
+        "prompts": prompts,
+    }, ensure_ascii=False) + "\n"
+
+
+def _csv_rows(request: Row, prompts: list[str]) -> Iterator[list]:
+    """One row per prompt; a request without prompts gets one row with an empty prompt."""
+    base = [
+        str(request.id),
+        request.created_at.isoformat(),
+        request.business_description,
+        request.role,
+        request.provider or "",
+        request.model or "",
+    ]
+    if not prompts:
+        yield base + ["", ""]
+    for index, prompt in enumerate(prompts):
+        yield base + [index, prompt]
+
+
+async def export_history(export_format: ExportFormat, since: Optional[datetime] = None) -> AsyncIterator[bytes]:
+    """Encoded export, in chunks of about EXPORT_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == ExportFormat.csv else None
+    if writer is not None:
+        writer.writerow(CSV_COLUMNS)
+
+    async for request, prompts in _requests_with_prompts(since):
+        if writer is not None:
+            writer.writerows(_csv_rows(request, prompts))
+        else:
+            buffer.write(ndjson_record(request, prompts))
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
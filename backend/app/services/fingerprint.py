@@ -0,0 +1,25 @@
+"""
+Salted fingerprints of API keys.
+
+Keys are identified by an HMAC under KEY_CHECK_SALT wherever they would
+otherwise be stored or shown: cache entries, limiter and single-flight keys
+in the shared state backend, and the operator views. A plain hash would let
+anyone who sees it confirm a guessed key.
+
+Without KEY_CHECK_SALT the salt is random per process; `python -m app.serve`
+generates one for all of its workers. Deployments whose hosts share a Redis
+backend need to set it, so that they agree on the keys.
+"""
+
+import hashlib
+import hmac
+import secrets
+
+from ..config import get_settings
+
+_salt = get_settings().key_check_salt.encode("utf-8") or secrets.token_bytes(32)
+
+
+def key_fingerprint(*parts: str) -> str:
+    """HMAC-SHA256 of the parts (an API key and what it's scoped to), hex encoded."""
+    return hmac.new(_salt, ":".join(parts).encode("utf-8"), hashlib.sha256).hexdigest()
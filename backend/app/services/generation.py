@@ -0,0 +1,309 @@
+"""
+Generation orchestration in front of generate_prompts.
+
+Routers call run_generation instead of generate_prompts directly so that
+cross-cutting layers (response cache, single-flight coalescing, provider
+fallback and hedging, ...) apply to every endpoint.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from ..config import get_settings
+from ..schemas.prompt import (
+    CacheMode,
+    FallbackMode,
+    GenerateRequest,
+    GenerateResponse,
+    ProviderEnum,
+    PROVIDER_LABELS,
+)
+from .ai_service import (
+    build_messages,
+    generate_prompts,
+    resolve_model,
+    FALLBACK_PROMPT,
+)
+from .cache import CachedResult, get_response_cache, make_cache_key
+from .fingerprint import key_fingerprint
+from .metrics import record_error
+from .singleflight import SingleFlight, get_shared_flight
+from .templates import StoredTemplate, get_template_registry
+
+
+logger = logging.getLogger(__name__)
+
+_inflight = SingleFlight()
+
+
+@dataclass
+class GenerationTarget:
+    """A (provider, model, api_key) entry of a fallback chain."""
+    provider: ProviderEnum
+    api_key: str
+    model: str = ""
+
+
+@dataclass
+class GenerationResult:
+    """Outcome of a generation request."""
+    prompts: list[str]
+    model: str
+    provider: ProviderEnum
+    cached: bool = False
+
+
+def generation_cache_key(
+    provider: ProviderEnum,
+    model: str,
+    business: str,
+    role: str,
+    system_prompt: str = "",
+    template: Optional[StoredTemplate] = None,
+) -> str:
+    """
+    Cache key for a generation: provider, resolved model and rendered messages.
+
+    A stored template is identified by id and version instead, so the key is
+    stable and needs no rendering.
+    """
+    if template is not None:
+        return make_cache_key(
+            provider,
+            resolve_model(provider, model),
+            "template",
+            str(template.id),
+            str(template.version),
+            role,
+            business,
+            build_messages(role, business, template.compiled.source).user,
+        )
+    messages = build_messages(role, business, system_prompt)
+    return make_cache_key(
+        provider,
+        resolve_model(provider, model),
+        messages.system,
+        messages.user,
+    )
+
+
+def _cache_active(cache_mode: CacheMode) -> bool:
+    return get_settings().response_cache_enabled and cache_mode != CacheMode.bypass
+
+
+async def cache_lookup(key: str, cache_mode: CacheMode) -> Optional[CachedResult]:
+    """
+    Look a result up unless the cache is disabled, bypassed or refreshed.
+    The cache is best-effort: a failing tier counts as a miss.
+    """
+    cache = get_response_cache()
+    if not _cache_active(cache_mode):
+        cache.record_bypass()
+        return None
+    if cache_mode == CacheMode.refresh:
+        return None
+    try:
+        return await cache.get(key)
+    except Exception as e:
+        record_error("cache", e)
+        logger.warning("Cache lookup failed, generating instead", exc_info=True)
+        return None
+
+
+async def cache_store(
+    key: str,
+    provider: ProviderEnum,
+    prompts: list[str],
+    model: str,
+    cache_mode: CacheMode,
+) -> None:
+    """
+    Store a fresh result; the failure placeholder is never cached. A failing
+    tier is logged and skipped, so the result is still returned.
+    """
+    if not _cache_active(cache_mode) or prompts == [FALLBACK_PROMPT]:
+        return
+    try:
+        await get_response_cache().set(key, provider, CachedResult(prompts=prompts, model=model))
+    except Exception as e:
+        record_error("cache", e)
+        logger.warning("Storing a result in the cache failed", exc_info=True)
+
+
+async def run_generation(
+    provider: ProviderEnum,
+    api_key: str,
+    model: str,
+    business: str,
+    role: str,
+    system_prompt: str = "",
+    template: Optional[StoredTemplate] = None,
+    cache_mode: CacheMode = CacheMode.use,
+    fallbacks: Sequence[GenerationTarget] = (),
+    fallback_mode: FallbackMode = FallbackMode.failover,
+    hedge_delay: float = 2.0,
+    attempt_timeout: Optional[float] = None,
+) -> GenerationResult:
+    """
+    Generate prompts, serving identical requests from the response cache.
+
+    With `fallbacks`, the primary target is followed by an ordered chain:
+    - failover: try the next entry when one fails or exceeds `attempt_timeout`
+    - hedge: also start the next entry if nothing has answered within
+      `hedge_delay` seconds; the first success wins and the rest are cancelled
+
+    A stored `template` takes the place of `system_prompt`.
+
+    The returned result names the provider that actually served the request.
+    Raises ValueError for invalid input, like generate_prompts.
+    """
+    targets = [GenerationTarget(provider, api_key, model), *fallbacks]
+
+    async def attempt(target: GenerationTarget) -> GenerationResult:
+        call = _run_single(target, business, role, system_prompt, template, cache_mode)
+        if attempt_timeout:
+            return await asyncio.wait_for(call, attempt_timeout)
+        return await call
+
+    if len(targets) == 1:
+        return await _run_single(targets[0], business, role, system_prompt, template, cache_mode)
+    if fallback_mode == FallbackMode.hedge:
+        return await _hedged(targets, attempt, hedge_delay)
+    return await _failover(targets, attempt)
+
+
+async def run_generation_request(
+    request: GenerateRequest,
+    cache_mode: Optional[CacheMode] = None,
+) -> GenerationResult:
+    """run_generation for a GenerateRequest, including its fallback chain."""
+    return await run_generation(
+        provider=request.provider,
+        api_key=request.api_key,
+        model=request.model,
+        business=request.business,
+        role=request.role,
+        system_prompt=request.system_prompt,
+        template=await resolve_template(request),
+        cache_mode=request.cache if cache_mode is None else cache_mode,
+        fallbacks=[GenerationTarget(f.provider, f.api_key, f.model) for f in request.fallbacks],
+        fallback_mode=request.fallback_mode,
+        hedge_delay=request.hedge_delay_ms / 1000,
+        attempt_timeout=request.attempt_timeout_ms / 1000 or None,
+    )
+
+
+async def resolve_template(request: GenerateRequest) -> Optional[StoredTemplate]:
+    """The stored template a request refers to, if any. Raises TemplateNotFound."""
+    if request.template_id is None:
+        return None
+    return await get_template_registry().get(request.template_id, request.template_version)
+
+
+def build_response(request: GenerateRequest, generation: GenerationResult) -> GenerateResponse:
+    """Response body for a finished generation."""
+    return GenerateResponse(
+        prompts=generation.prompts,
+        role=request.role,
+        business=request.business,
+        provider=PROVIDER_LABELS[generation.provider],
+        model=generation.model,
+        cached=generation.cached,
+        served_by=generation.provider.value,
+    )
+
+
+async def _failover(targets: list[GenerationTarget], attempt) -> GenerationResult:
+    error: Optional[BaseException] = None
+    for target in targets:
+        try:
+            return await attempt(target)
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"Превышено время ожидания ({target.provider.value})")
+        except Exception as e:
+            error = e
+    raise error
+
+
+async def _hedged(targets: list[GenerationTarget], attempt, hedge_delay: float) -> GenerationResult:
+    pending: set[asyncio.Task] = set()
+    remaining = list(targets)
+    error: Optional[BaseException] = None
+
+    def launch() -> None:
+        pending.add(asyncio.create_task(attempt(remaining.pop(0))))
+
+    launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if remaining else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                # Nobody answered within the hedge delay: start the next entry
+                launch()
+                continue
+
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+            # Everything in flight failed: move on without waiting for the delay
+            if not pending and remaining:
+                launch()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _run_single(
+    target: GenerationTarget,
+    business: str,
+    role: str,
+    system_prompt: str,
+    template: Optional[StoredTemplate],
+    cache_mode: CacheMode,
+) -> GenerationResult:
+    provider, api_key, model = target.provider, target.api_key, target.model
+    if not api_key:
+        raise ValueError("API ключ не указан")
+
+    key = generation_cache_key(provider, model, business, role, system_prompt, template)
+    if template is not None:
+        system_prompt = template.compiled.source
+    hit = await cache_lookup(key, cache_mode)
+    if hit is not None:
+        return GenerationResult(prompts=hit.prompts, model=hit.model, provider=provider, cached=True)
+
+    async def generate() -> tuple[list[str], str]:
+        prompts, model_used = await generate_prompts(
+            provider=provider,
+            api_key=api_key,
+            model=model,
+            business=business,
+            role=role,
+            system_prompt=system_prompt,
+        )
+        await cache_store(key, provider, prompts, model_used, cache_mode)
+        return prompts, model_used
+
+    async def call() -> tuple[list[str], str]:
+        shared_flight = get_shared_flight()
+        if shared_flight is None:
+            return await generate()
+        (prompts, model_used), _ = await shared_flight.do(flight_key, generate)
+        return prompts, model_used
+
+    # Identical concurrent requests share one upstream call, within this
+    # worker and then across workers. The key's fingerprint is part of the
+    # flight key so a bad key's error stays with its owner.
+    flight_key = f"{key}:{key_fingerprint(api_key)}"
+    (prompts, model_used), _ = await _inflight.do(flight_key, call)
+    return GenerationResult(prompts=list(prompts), model=model_used, provider=provider)
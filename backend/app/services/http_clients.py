@@ -0,0 +1,151 @@
+"""
+Shared outbound client registry.
+
+Keeps one pooled httpx.AsyncClient per provider (keep-alive, optional HTTP/2)
+and an LRU of SDK clients keyed by (provider, API key) that reuse those pools,
+so generations don't pay a new TCP+TLS handshake on every call.
+
+The provider SDKs are imported on first use, so deployments that only talk
+to OpenAI-compatible HTTP providers never load them.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from anthropic import AsyncAnthropic
+
+from ..config import get_settings
+from ..schemas.prompt import ProviderEnum
+
+
+def _key_fingerprint(api_key: str) -> str:
+    """Hash an API key so raw keys are never used as dict keys."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class ClientRegistry:
+    """Long-lived registry of pooled outbound clients."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        sdk_cache_size: int = 64,
+        base_url_override: str = "",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http2 = http2
+        self._sdk_cache_size = max(1, sdk_cache_size)
+        self._base_url_override = base_url_override.rstrip("/")
+        # Replaces the network for every pooled client (tests)
+        self._transport = transport
+        self._http_clients: dict[ProviderEnum, httpx.AsyncClient] = {}
+        self._sdk_clients: OrderedDict[tuple[ProviderEnum, str], Any] = OrderedDict()
+
+    def http_client(self, provider: ProviderEnum) -> httpx.AsyncClient:
+        """Get the pooled HTTP client for a provider."""
+        client = self._http_clients.get(provider)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=self._limits,
+                http2=self._http2,
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                transport=self._transport,
+            )
+            self._http_clients[provider] = client
+        return client
+
+    def openai_client(self, api_key: str) -> "AsyncOpenAI":
+        """Get a cached AsyncOpenAI client for the given key."""
+        from openai import AsyncOpenAI
+
+        return self._sdk_client(
+            ProviderEnum.openai,
+            api_key,
+            lambda: AsyncOpenAI(
+                api_key=api_key,
+                base_url=f"{self._base_url_override}/v1" if self._base_url_override else None,
+                http_client=self.http_client(ProviderEnum.openai),
+            ),
+        )
+
+    def anthropic_client(self, api_key: str) -> "AsyncAnthropic":
+        """Get a cached AsyncAnthropic client for the given key."""
+        from anthropic import AsyncAnthropic
+
+        return self._sdk_client(
+            ProviderEnum.anthropic,
+            api_key,
+            lambda: AsyncAnthropic(
+                api_key=api_key,
+                base_url=self._base_url_override or None,
+                http_client=self.http_client(ProviderEnum.anthropic),
+            ),
+        )
+
+    def _sdk_client(self, provider: ProviderEnum, api_key: str, factory: Callable[[], Any]) -> Any:
+        key = (provider, _key_fingerprint(api_key))
+        client = self._sdk_clients.get(key)
+        if client is not None:
+            self._sdk_clients.move_to_end(key)
+            return client
+
+        client = factory()
+        self._sdk_clients[key] = client
+        # SDK clients share the provider pool, so evicting one never closes sockets
+        while len(self._sdk_clients) > self._sdk_cache_size:
+            self._sdk_clients.popitem(last=False)
+        return client
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+        self._sdk_clients.clear()
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def init_client_registry() -> ClientRegistry:
+    """Create the process-wide registry from settings."""
+    global _registry
+    settings = get_settings()
+    _registry = ClientRegistry(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+        http2=settings.http2_enabled,
+        sdk_cache_size=settings.sdk_client_cache_size,
+        base_url_override=settings.upstream_base_url,
+    )
+    return _registry
+
+
+def get_client_registry() -> ClientRegistry:
+    """Get the process-wide registry, creating it if lifespan hasn't run."""
+    if _registry is None:
+        return init_client_registry()
+    return _registry
+
+
+async def close_client_registry() -> None:
+    """Close the process-wide registry."""
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
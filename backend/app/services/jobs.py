@@ -0,0 +1,399 @@
+"""
+Asynchronous generation jobs.
+
+POST /api/jobs stores a job row and answers at once. JOB_WORKERS background
+tasks per process claim queued jobs from the database, run them through
+run_generation_request, store the result and POST it to the job's webhook,
+if one was given.
+
+Jobs are claimed with a conditional UPDATE, so several processes can share
+the table. A claim holds a lease of JOB_LEASE_SECONDS: jobs left running by
+a process that died are claimed again once their lease expires, and a clean
+shutdown puts its running jobs straight back into the queue. Idle workers
+are woken by jobs submitted in the same process and poll the table every
+JOB_POLL_INTERVAL seconds for the others.
+
+The job's API keys are stored encrypted (services.credentials) in their own
+column, which is cleared when the job finishes; `request` never holds them.
+Webhooks only go to http(s) URLs on public addresses, or to the hosts in
+JOB_WEBHOOK_ALLOWED_HOSTS when it is set.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+import httpx
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import async_session
+from ..models.job import GenerationJob
+from ..schemas.job import JobCreate, JobInfo, JobStatus
+from ..schemas.prompt import GenerateRequest, GenerateResponse
+from .credentials import CredentialsUnavailable, seal, unseal
+from .generation import build_response, run_generation_request
+from .metrics import JOB_WAIT, JOBS, record_error
+from .persistence import record_generation
+from .rate_limit import RETRYABLE_STATUS, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """JOB_MAX_QUEUED jobs are already waiting."""
+
+
+class WebhookNotAllowed(ValueError):
+    """The webhook URL points somewhere jobs may not send to."""
+
+
+# Stands in for the API keys in the stored request; the real ones are sealed in `credentials`
+REDACTED_KEY = "[redacted]"
+
+
+def _redacted(request: GenerateRequest) -> str:
+    """Request JSON without API keys (or webhook URL), as stored in the job row."""
+    keys = [REDACTED_KEY] * (1 + len(request.fallbacks))
+    return _with_keys(request, keys).model_dump_json(exclude={"webhook_url"})
+
+
+def _keys(request: GenerateRequest) -> list[str]:
+    return [request.api_key, *(target.api_key for target in request.fallbacks)]
+
+
+def _with_keys(request: GenerateRequest, keys: list[str]) -> GenerateRequest:
+    return request.model_copy(update={
+        "api_key": keys[0],
+        "fallbacks": [target.model_copy(update={"api_key": key}) for target, key in zip(request.fallbacks, keys[1:])],
+    })
+
+
+async def resolve_webhook(url: str) -> Optional[list[str]]:
+    """
+    Check a webhook URL and return the addresses to send it to.
+
+    With JOB_WEBHOOK_ALLOWED_HOSTS only those hosts are accepted and None is
+    returned (connect normally). Otherwise the host must resolve to public
+    addresses only: loopback, private, link-local and other reserved ranges
+    are refused. Raises WebhookNotAllowed.
+    """
+    parsed = httpx.URL(url)
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise WebhookNotAllowed("Webhook должен быть http(s) URL")
+    allowed = get_settings().job_webhook_allowed_hosts_list
+    if allowed:
+        if parsed.host.lower() not in allowed:
+            raise WebhookNotAllowed("Хост webhook не входит в список разрешённых")
+        return None
+
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise WebhookNotAllowed("Не удалось определить адрес хоста webhook")
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses or not all(ipaddress.ip_address(address.split("%")[0]).is_global for address in addresses):
+        raise WebhookNotAllowed("Webhook не может указывать на внутренний адрес")
+    return addresses
+
+
+def job_info(job: GenerationJob) -> JobInfo:
+    """API view of a job row."""
+    return JobInfo(
+        id=job.id,
+        status=JobStatus(job.status),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        attempts=job.attempts,
+        result=GenerateResponse.model_validate_json(job.result) if job.result else None,
+        error=job.error,
+        webhook_status=job.webhook_status,
+    )
+
+
+async def submit_job(session: AsyncSession, request: JobCreate) -> GenerationJob:
+    """
+    Queue a generation and commit. Raises QueueFull when the queue is at
+    JOB_MAX_QUEUED and WebhookNotAllowed for a webhook it may not call.
+    """
+    if request.webhook_url:
+        await resolve_webhook(str(request.webhook_url))
+    queued = await session.scalar(
+        select(func.count()).select_from(GenerationJob).where(GenerationJob.status == JobStatus.queued.value)
+    )
+    if queued >= get_settings().job_max_queued:
+        raise QueueFull()
+
+    job = GenerationJob(
+        status=JobStatus.queued.value,
+        request=_redacted(request),
+        credentials=seal(_keys(request)),
+        webhook_url=str(request.webhook_url) if request.webhook_url else None,
+    )
+    session.add(job)
+    await session.commit()
+    if _runner is not None:
+        _runner.wake()
+    return job
+
+
+async def fetch_job(session: AsyncSession, job_id: UUID) -> Optional[GenerationJob]:
+    return await session.get(GenerationJob, job_id)
+
+
+def _claimable(now: datetime):
+    return or_(
+        GenerationJob.status == JobStatus.queued.value,
+        and_(GenerationJob.status == JobStatus.running.value, GenerationJob.lease_expires_at < now),
+    )
+
+
+class JobRunner:
+    """Pool of background tasks processing jobs from the database."""
+
+    def __init__(
+        self,
+        workers: int,
+        poll_interval: float,
+        lease_seconds: float,
+        max_attempts: int,
+        webhook_timeout: float,
+        webhook_retries: int,
+    ):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max(1, max_attempts)
+        self.webhook_retries = max(0, webhook_retries)
+        self._webhook_timeout = webhook_timeout
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._running: set[UUID] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self) -> None:
+        self._client = httpx.AsyncClient(timeout=self._webhook_timeout)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        """Cancel the workers and put the jobs they were running back into the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            try:
+                async with async_session() as session:
+                    await session.execute(
+                        update(GenerationJob)
+                        .where(
+                            GenerationJob.id.in_(list(self._running)),
+                            GenerationJob.status == JobStatus.running.value,
+                        )
+                        .values(
+                            status=JobStatus.queued.value,
+                            started_at=None,
+                            lease_expires_at=None,
+                            attempts=GenerationJob.attempts - 1,
+                        )
+                    )
+                    await session.commit()
+            except Exception:
+                logger.exception("Could not requeue %d running jobs", len(self._running))
+            self._running.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _work(self) -> None:
+        while True:
+            # Cleared before looking, so a job submitted meanwhile is not missed
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                record_error("jobs", e)
+                logger.exception("Claiming a job failed")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Not discarded on cancellation: stop() requeues what is left here
+            self._running.add(job.id)
+            try:
+                await self._process(job)
+            except Exception as e:
+                record_error("jobs", e)
+                logger.exception("Job %s failed", job.id)
+            self._running.discard(job.id)
+
+    async def _claim(self) -> Optional[GenerationJob]:
+        """Take the oldest claimable job, or None if there is nothing to do."""
+        async with async_session() as session:
+            # Retry when another worker claimed the same job first
+            for _ in range(3):
+                now = datetime.utcnow()
+                job_id = await session.scalar(
+                    select(GenerationJob.id)
+                    .where(_claimable(now))
+                    .order_by(GenerationJob.created_at)
+                    .limit(1)
+                )
+                if job_id is None:
+                    return None
+                claimed = await session.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, _claimable(now))
+                    .values(
+                        status=JobStatus.running.value,
+                        started_at=now,
+                        lease_expires_at=now + self.lease,
+                        attempts=GenerationJob.attempts + 1,
+                    )
+                )
+                await session.commit()
+                if claimed.rowcount == 1:
+                    return await session.get(GenerationJob, job_id)
+        return None
+
+    async def _process(self, job: GenerationJob) -> None:
+        JOB_WAIT.observe((job.started_at - job.created_at).total_seconds())
+        request = GenerateRequest.model_validate_json(job.request)
+        result: Optional[GenerateResponse] = None
+        error: Optional[str] = None
+
+        # Jobs queued before the credentials column still carry their keys
+        credentials_lost = False
+        if job.credentials is not None:
+            try:
+                request = _with_keys(request, unseal(job.credentials))
+            except CredentialsUnavailable:
+                credentials_lost = True
+
+        if job.attempts > self.max_attempts:
+            error = "Задание прерывалось слишком много раз"
+        elif credentials_lost:
+            error = "API-ключи задания недоступны после перезапуска сервера, отправьте задание заново"
+        else:
+            try:
+                generation = await run_generation_request(request)
+            except ValueError as e:
+                error = str(e)
+            except Exception as e:
+                error = f"Ошибка генерации: {str(e)}"
+            else:
+                try:
+                    await record_generation(
+                        None,
+                        request.business,
+                        request.role,
+                        generation.prompts,
+                        generation.provider.value,
+                        generation.model,
+                    )
+                    result = build_response(request, generation)
+                except Exception as e:
+                    error = f"Ошибка сохранения: {str(e)}"
+
+        status = JobStatus.succeeded if result is not None else JobStatus.failed
+        async with async_session() as session:
+            job = await session.get(GenerationJob, job.id)
+            job.status = status.value
+            job.request = _redacted(request)
+            job.credentials = None
+            job.result = result.model_dump_json() if result is not None else None
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            job.lease_expires_at = None
+            await session.commit()
+        JOBS.labels(status.value).inc()
+
+        if job.webhook_url:
+            webhook_status = await self._deliver(job)
+            async with async_session() as session:
+                await session.execute(
+                    update(GenerationJob).where(GenerationJob.id == job.id).values(webhook_status=webhook_status)
+                )
+                await session.commit()
+
+    async def _deliver(self, job: GenerationJob) -> str:
+        """POST the finished job to its webhook, retrying transient failures."""
+        body = job_info(job).model_dump_json()
+        for attempt in range(self.webhook_retries + 1):
+            try:
+                response = await self._post_webhook(job.webhook_url, body)
+                if response.status_code < 300:
+                    return "delivered"
+                if response.status_code not in RETRYABLE_STATUS and response.status_code < 500:
+                    break
+            except WebhookNotAllowed as e:
+                record_error("webhook", e)
+                break
+            except httpx.HTTPError as e:
+                record_error("webhook", e)
+            if attempt < self.webhook_retries:
+                await asyncio.sleep(backoff_delay(attempt))
+        logger.warning("Webhook for job %s was not delivered", job.id)
+        return "failed"
+
+    async def _post_webhook(self, url: str, body: str) -> httpx.Response:
+        """
+        POST to a webhook, checked again right before sending. The connection
+        goes to the address that was checked, so a DNS answer that changes in
+        between can't redirect it; TLS still verifies the original host name.
+        """
+        headers = {"Content-Type": "application/json"}
+        addresses = await resolve_webhook(url)
+        if addresses is None:
+            return await self._client.post(url, content=body, headers=headers)
+        original = httpx.URL(url)
+        headers["Host"] = original.netloc.decode("ascii")
+        return await self._client.post(
+            original.copy_with(host=addresses[0]),
+            content=body,
+            headers=headers,
+            extensions={"sni_hostname": original.raw_host.decode("ascii")},
+        )
+
+
+_runner: Optional[JobRunner] = None
+
+
+def start_job_workers() -> None:
+    """Start the job workers of this process (none with JOB_WORKERS=0)."""
+    global _runner
+    settings = get_settings()
+    if settings.job_workers <= 0:
+        return
+    _runner = JobRunner(
+        workers=settings.job_workers,
+        poll_interval=settings.job_poll_interval,
+        lease_seconds=settings.job_lease_seconds,
+        max_attempts=settings.job_max_attempts,
+        webhook_timeout=settings.job_webhook_timeout,
+        webhook_retries=settings.job_webhook_retries,
+    )
+    _runner.start()
+
+
+async def stop_job_workers() -> None:
+    """Stop the job workers, requeueing the jobs they were running."""
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
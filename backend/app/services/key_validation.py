@@ -0,0 +1,58 @@
+"""
+Memoized API key validation.
+
+test_api_key makes a paid upstream call, so results are cached in-process
+with separate TTLs for valid and rejected keys. Only a definitive rejection
+(401/403) is cached as invalid: rate limits, timeouts and upstream errors
+say nothing about the key and are re-checked every time. Entries are keyed by a salted
+HMAC of (provider, api_key); raw keys are never stored. Concurrent checks of
+the same key share one upstream call.
+"""
+
+from ..config import get_settings
+from ..schemas.prompt import ProviderEnum
+from .ai_service import test_api_key
+from .cache import TTLCache
+from .fingerprint import key_fingerprint
+from .singleflight import SingleFlight
+
+
+_settings = get_settings()
+_results = TTLCache(_settings.key_check_cache_size, _settings.key_check_success_ttl)
+_inflight = SingleFlight()
+
+# Upstream statuses that mean the key itself was rejected
+REJECTED_STATUS = {401, 403}
+
+
+def _cache_key(provider: ProviderEnum, api_key: str) -> str:
+    return key_fingerprint(provider.value, api_key)
+
+
+async def check_api_key(provider: ProviderEnum, api_key: str, force: bool = False) -> tuple[dict, bool]:
+    """
+    Validate an API key, serving recent results from the cache.
+
+    Returns (result, cached) where result has 'success' and 'message' keys.
+    `force` skips the cache lookup and stores the fresh result.
+    """
+    key = _cache_key(provider, api_key)
+    if not force:
+        hit = _results.get(key)
+        if hit is not None:
+            return dict(hit), True
+
+    result, _ = await _inflight.do(key, lambda: test_api_key(provider, api_key))
+    result = dict(result)
+    status = result.pop("status", None)
+
+    settings = get_settings()
+    if result["success"]:
+        ttl = settings.key_check_success_ttl
+    elif status in REJECTED_STATUS:
+        ttl = settings.key_check_failure_ttl
+    else:
+        ttl = 0
+    if ttl > 0:
+        _results.set(key, dict(result), ttl)
+    return dict(result), False
@@ -0,0 +1,325 @@
+"""
+Prometheus metrics and per-request stage timings.
+
+Histograms cover upstream latency (by provider, model and status), time to
+first token of streamed completions, database writes and end-to-end request
+time; counters cover errors by class and tokens reported in provider `usage`,
+including prompt tokens served from the provider's prompt cache. Models
+outside the provider catalog are labelled "other".
+
+The same stage timings are collected per request in a context variable and
+returned in a `Server-Timing` header by MetricsMiddleware.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from prometheus_client import Counter, Histogram
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..schemas.prompt import PROVIDER_MODELS, ProviderEnum
+
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Provider call duration",
+    ["provider", "model", "status"],
+    buckets=UPSTREAM_BUCKETS,
+)
+UPSTREAM_TTFT = Histogram(
+    "upstream_time_to_first_token_seconds",
+    "Time from the provider call to the first streamed text chunk",
+    ["provider", "model"],
+    buckets=UPSTREAM_BUCKETS,
+)
+DB_WRITE = Histogram(
+    "db_write_duration_seconds",
+    "Flush and commit time of generation writes",
+    ["operation"],
+    buckets=DB_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "End-to-end request time, including streamed bodies",
+    ["method", "route", "status"],
+    buckets=UPSTREAM_BUCKETS,
+)
+ERRORS = Counter(
+    "errors_total",
+    "Errors by stage and exception class",
+    ["stage", "error"],
+)
+TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by providers",
+    ["provider", "model", "kind"],
+)
+PROMPT_CACHE = Counter(
+    "prompt_cache_requests_total",
+    "Provider calls whose usage reported cached prompt tokens (hit) or none (miss)",
+    ["provider", "model", "result"],
+)
+JOBS = Counter(
+    "jobs_total",
+    "Finished asynchronous generation jobs",
+    ["status"],
+)
+JOB_WAIT = Histogram(
+    "job_queue_wait_seconds",
+    "Time asynchronous jobs spent queued before a worker claimed them",
+    buckets=UPSTREAM_BUCKETS,
+)
+RETENTION_ARCHIVED = Counter(
+    "retention_archived_rows_total",
+    "Rows written to the retention archive",
+    ["table"],
+)
+RETENTION_DELETED = Counter(
+    "retention_deleted_rows_total",
+    "Rows deleted by the retention task",
+    ["table"],
+)
+RETENTION_RECLAIMED = Counter(
+    "retention_reclaimed_bytes_total",
+    "Database bytes given back by compaction after retention runs",
+)
+RETENTION_RUN = Histogram(
+    "retention_run_duration_seconds",
+    "Duration of retention runs, including compaction",
+    buckets=UPSTREAM_BUCKETS,
+)
+WRITE_BEHIND_DROPPED = Counter(
+    "write_behind_dropped_rows_total",
+    "Rows the write-behind queue gave up on after retries and per-result writes",
+    ["table"],
+)
+OUTPUT_BUDGET_RETRIES = Counter(
+    "output_budget_retries_total",
+    "Generations retried with the full max_tokens after a learned budget cut them short",
+    ["provider", "model"],
+)
+
+EARLY_STOPS = Counter(
+    "early_stops_total",
+    "Completions closed as soon as enough prompts were parsed",
+    ["provider", "model"],
+)
+EARLY_STOP_SAVED_TOKENS = Counter(
+    "early_stop_saved_tokens_total",
+    "Estimated completion tokens not generated because of early stops "
+    "(the unused max_tokens budget, an upper bound)",
+    ["provider", "model"],
+)
+EARLY_STOP_SAVED_SECONDS = Histogram(
+    "early_stop_saved_seconds",
+    "Estimated decode time saved per early stop (saved tokens at the observed decode rate)",
+    ["provider", "model"],
+    buckets=UPSTREAM_BUCKETS,
+)
+
+# Label for models outside the provider catalog. The model comes from the
+# request, so labelling free text would let clients create unbounded series
+OTHER_MODEL = "other"
+
+_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+def add_timing(stage: str, seconds: float) -> None:
+    """Add time to a stage of the current request (no-op outside requests)."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time a block as a Server-Timing stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(stage, time.perf_counter() - started)
+
+
+def error_status(error: BaseException) -> str:
+    """Status label for a failed call: HTTP status if known, else the exception class."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def model_label(provider: ProviderEnum, model: str) -> str:
+    """The model as a metric label: catalog models by ID, anything else as OTHER_MODEL."""
+    if any(entry["id"] == model for entry in PROVIDER_MODELS.get(provider, [])):
+        return model
+    return OTHER_MODEL
+
+
+def record_error(stage: str, error: BaseException) -> None:
+    ERRORS.labels(stage, type(error).__name__).inc()
+
+
+@contextmanager
+def observe_upstream(provider: ProviderEnum, model: str) -> Iterator[None]:
+    """Time a provider call into the upstream histogram and Server-Timing."""
+    started = time.perf_counter()
+    status = "200"
+    try:
+        yield
+    except asyncio.CancelledError:
+        # A stream closed early by its consumer (GeneratorExit) still counts as 200
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status = error_status(e)
+        record_error("upstream", e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_LATENCY.labels(provider.value, model_label(provider, model), status).observe(elapsed)
+        add_timing("upstream", elapsed)
+
+
+def observe_ttft(provider: ProviderEnum, model: str, seconds: float) -> None:
+    UPSTREAM_TTFT.labels(provider.value, model_label(provider, model)).observe(seconds)
+    add_timing("ttft", seconds)
+
+
+@contextmanager
+def observe_db(operation: str) -> Iterator[None]:
+    """Time a database write into the DB histogram and Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error("db", e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_WRITE.labels(operation).observe(elapsed)
+        add_timing("db", elapsed)
+
+
+def usage_value(usage: Any, name: str) -> Optional[int]:
+    """An integer field of a provider `usage` object or dict, if present."""
+    if usage is None:
+        return None
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+
+def record_tokens(
+    provider: ProviderEnum, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]
+) -> None:
+    model = model_label(provider, model)
+    for kind, value in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if value:
+            TOKENS.labels(provider.value, model, kind).inc(value)
+
+
+def cached_prompt_tokens(usage: Any) -> Optional[int]:
+    """Prompt tokens read from the provider's prompt cache, if the provider reports them."""
+    if usage is None:
+        return None
+    # OpenAI and most compatible APIs
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    cached = usage_value(details, "cached_tokens")
+    if cached is not None:
+        return cached
+    # DeepSeek, Anthropic, Gemini
+    for name in ("prompt_cache_hit_tokens", "cache_read_input_tokens", "cachedContentTokenCount"):
+        cached = usage_value(usage, name)
+        if cached is not None:
+            return cached
+    return None
+
+
+def cache_write_tokens(usage: Any) -> Optional[int]:
+    """Prompt tokens written to the prompt cache (Anthropic bills these separately)."""
+    return usage_value(usage, "cache_creation_input_tokens")
+
+
+def record_prompt_cache(
+    provider: ProviderEnum, model: str, cached: Optional[int], written: Optional[int]
+) -> None:
+    """Count cached prompt tokens; calls are a hit or miss only if the provider reported it."""
+    model = model_label(provider, model)
+    for kind, value in (("cache_read", cached), ("cache_write", written)):
+        if value:
+            TOKENS.labels(provider.value, model, kind).inc(value)
+    if cached is not None:
+        PROMPT_CACHE.labels(provider.value, model, "hit" if cached else "miss").inc()
+
+
+def record_usage(provider: ProviderEnum, model: str, usage: Any, prompt_field: str, completion_field: str) -> None:
+    """Count tokens from a provider `usage` object or dict, if present."""
+    record_tokens(provider, model, usage_value(usage, prompt_field), usage_value(usage, completion_field))
+    if prompt_field:
+        record_prompt_cache(provider, model, cached_prompt_tokens(usage), cache_write_tokens(usage))
+
+
+def record_early_stop(
+    provider: ProviderEnum, model: str, received_tokens: int, max_tokens: int, decode_seconds: float
+) -> None:
+    """Count an early-closed completion and estimate what it saved."""
+    saved = max(0, max_tokens - received_tokens)
+    model = model_label(provider, model)
+    EARLY_STOPS.labels(provider.value, model).inc()
+    EARLY_STOP_SAVED_TOKENS.labels(provider.value, model).inc(saved)
+    if received_tokens > 0 and decode_seconds > 0:
+        EARLY_STOP_SAVED_SECONDS.labels(provider.value, model).observe(saved * decode_seconds / received_tokens)
+
+
+def server_timing(timings: dict[str, float], total: float) -> str:
+    """Format stage timings as a Server-Timing header value (milliseconds)."""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Time every HTTP request and add a Server-Timing header.
+
+    Pure ASGI, so streamed bodies are timed to their last chunk; the
+    header carries the stages completed before the response started.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            record_error("request", e)
+            raise
+        finally:
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,179 @@
+"""
+Adaptive output budget (max_tokens) per provider and model.
+
+Tracks how many completion tokens each (provider, model) actually needs
+to produce MAX_PROMPTS prompts and asks for a high percentile of that,
+times a safety margin, instead of the fixed MAX_TOKENS cap. Models that
+ramble past the fifth prompt get cut off early, saving decode time.
+
+Samples come from provider `usage` on live calls and, at startup, from
+stored prompts (estimated from their length). Until a model has enough
+samples it gets the full cap. generate_prompts retries with the full cap
+when a tightened budget truncates the answer before MAX_PROMPTS prompts.
+"""
+
+import logging
+import math
+from collections import OrderedDict, deque
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from ..config import get_settings
+from ..schemas.prompt import ProviderEnum
+
+logger = logging.getLogger(__name__)
+
+# Conservative characters-per-token for mostly Cyrillic text; overestimating
+# tokens only makes the learned budget a little looser
+CHARS_PER_TOKEN = 2.5
+
+# Stored requests read at startup
+SEED_REQUESTS = 5000
+
+
+def estimate_tokens(chars: int) -> int:
+    """Rough completion tokens for `chars` characters of output."""
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+class OutputBudget:
+    """Recent completion lengths and the max_tokens derived from them."""
+
+    def __init__(
+        self,
+        cap: int = 2000,
+        floor: int = 256,
+        margin: float = 1.25,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        max_models: int = 256,
+    ):
+        self.cap = cap
+        self.floor = min(floor, cap)
+        self.margin = margin
+        self.percentile = percentile
+        self.window = max(1, window)
+        self.min_samples = min_samples
+        # Models come from requests, so only the most recently used are kept
+        self.max_models = max(1, max_models)
+        self._samples: OrderedDict[tuple[str, str], deque[int]] = OrderedDict()
+
+    def observe(self, provider: ProviderEnum, model: str, tokens: int) -> None:
+        """Record the completion tokens a successful generation needed."""
+        if tokens <= 0:
+            return
+        key = (provider.value, model)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+            while len(self._samples) > self.max_models:
+                self._samples.popitem(last=False)
+        else:
+            self._samples.move_to_end(key)
+        samples.append(tokens)
+
+    def max_tokens(self, provider: ProviderEnum, model: str) -> int:
+        """Budget for the next call; the full cap until enough samples exist."""
+        samples = self._samples.get((provider.value, model))
+        if samples is None or len(samples) < self.min_samples:
+            return self.cap
+        return self._budget(samples)
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {
+                "provider": provider,
+                "model": model,
+                "samples": len(samples),
+                "p50": self._quantile(samples, 0.5),
+                "p95": self._quantile(samples, 0.95),
+                "max_tokens": self._budget(samples) if len(samples) >= self.min_samples else self.cap,
+            }
+            for (provider, model), samples in self._samples.items()
+        ]
+
+    def _budget(self, samples: deque[int]) -> int:
+        budget = math.ceil(self._quantile(samples, self.percentile) * self.margin)
+        return max(self.floor, min(self.cap, budget))
+
+    @staticmethod
+    def _quantile(samples: deque[int], q: float) -> int:
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_budget: Optional[OutputBudget] = None
+
+
+def get_output_budget() -> OutputBudget:
+    global _budget
+    if _budget is None:
+        settings = get_settings()
+        _budget = OutputBudget(
+            cap=settings.max_tokens,
+            floor=settings.output_budget_floor,
+            margin=settings.output_budget_margin,
+            percentile=settings.output_budget_percentile,
+            window=settings.output_budget_window,
+            min_samples=settings.output_budget_min_samples,
+            max_models=settings.output_budget_max_models,
+        )
+    return _budget
+
+
+def budget_for(provider: ProviderEnum, model: str) -> int:
+    """max_tokens to request, honouring ADAPTIVE_MAX_TOKENS."""
+    if not get_settings().adaptive_max_tokens:
+        return get_settings().max_tokens
+    return get_output_budget().max_tokens(provider, model)
+
+
+async def load_output_budget() -> int:
+    """
+    Seed the statistics from stored generations.
+
+    Uses the most recent complete requests (MAX_PROMPTS prompts) with a
+    known provider and model. Returns the number of samples loaded.
+    """
+    from ..database import async_session
+    from ..models.prompt import PromptRequest, GeneratedPrompt
+    from .ai_service import MAX_PROMPTS, FALLBACK_PROMPT
+
+    recent = (
+        select(PromptRequest.id)
+        .where(PromptRequest.provider.is_not(None))
+        .order_by(PromptRequest.created_at.desc())
+        .limit(SEED_REQUESTS)
+        .subquery()
+    )
+    query = (
+        select(
+            PromptRequest.provider,
+            PromptRequest.model,
+            func.sum(func.length(GeneratedPrompt.content)),
+        )
+        .join(recent, recent.c.id == PromptRequest.id)
+        .join(GeneratedPrompt, GeneratedPrompt.request_id == PromptRequest.id)
+        .where(GeneratedPrompt.content != FALLBACK_PROMPT)
+        .group_by(PromptRequest.id, PromptRequest.provider, PromptRequest.model)
+        .having(func.count(GeneratedPrompt.id) >= MAX_PROMPTS)
+    )
+
+    budget = get_output_budget()
+    loaded = 0
+    try:
+        async with async_session() as session:
+            for provider, model, chars in await session.execute(query):
+                try:
+                    provider_enum = ProviderEnum(provider)
+                except ValueError:
+                    continue
+                # One newline per prompt line on top of the stored content
+                budget.observe(provider_enum, model, estimate_tokens(chars + MAX_PROMPTS))
+                loaded += 1
+    except Exception:
+        # Statistics are an optimisation; start with the full cap instead
+        logger.exception("Loading output budget statistics failed")
+    return loaded
@@ -0,0 +1,287 @@
+"""
+Persistence helpers for generation results.
+
+Results are written synchronously by default. In write-behind mode
+(PERSISTENCE_MODE=write_behind) they go onto an in-process queue that a
+background task drains in batches, so responses don't wait on the
+database. Failed flushes are retried with backoff; results that still
+cannot be written are logged and counted in write_behind_dropped_rows_total.
+
+Either way a write is one multi-row INSERT for the requests and one for
+their prompts; on PostgreSQL large batches of prompts are loaded with COPY.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import uuid4
+
+from sqlalchemy import insert, Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import async_session
+from ..models.prompt import PromptRequest, GeneratedPrompt
+from .metrics import WRITE_BEHIND_DROPPED, observe_db, record_error
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement; keeps SQLite under its bound-parameter limit
+INSERT_CHUNK_ROWS = 200
+# From this many rows PostgreSQL (asyncpg) gets them through COPY instead
+COPY_MIN_ROWS = 500
+
+
+async def save_generation(
+    session: AsyncSession,
+    business: str,
+    role: str,
+    prompts: list[str],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+) -> PromptRequest:
+    """Save a request with its generated prompts and commit."""
+    with observe_db("save"):
+        requests = await _insert_generations(session, [PendingGeneration(business, role, prompts, provider, model)])
+    return PromptRequest(**requests[0])
+
+
+async def save_generations(
+    session: AsyncSession,
+    results: list["PendingGeneration"],
+) -> None:
+    """Save several results in a single transaction."""
+    with observe_db("save_batch"):
+        await _insert_generations(session, results)
+
+
+async def _insert_generations(session: AsyncSession, results: list["PendingGeneration"]) -> list[dict[str, Any]]:
+    """
+    Insert results and commit: one statement for the requests and one for
+    their prompts (ids are generated here, so nothing needs reading back).
+    Returns the request rows.
+    """
+    requests = []
+    prompts = []
+    for pending in results:
+        request_id = uuid4()
+        requests.append({
+            "id": request_id,
+            "business_description": pending.business,
+            "role": pending.role,
+            "provider": pending.provider,
+            "model": pending.model,
+            "created_at": pending.created_at,
+        })
+        # A microsecond apart, so ordering by created_at keeps the generation order
+        prompts.extend(
+            {
+                "id": uuid4(),
+                "request_id": request_id,
+                "content": content,
+                "created_at": pending.created_at + timedelta(microseconds=position),
+            }
+            for position, content in enumerate(pending.prompts)
+        )
+
+    await bulk_insert(session, PromptRequest.__table__, requests)
+    await bulk_insert(session, GeneratedPrompt.__table__, prompts)
+    await session.commit()
+    return requests
+
+
+async def bulk_insert(session: AsyncSession, table: Table, rows: list[dict[str, Any]]) -> None:
+    """Insert rows with multi-row INSERT ... VALUES statements, or COPY for large PostgreSQL batches."""
+    if len(rows) >= COPY_MIN_ROWS and await _copy_rows(session, table, rows):
+        return
+    for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+        await session.execute(insert(table).values(rows[start:start + INSERT_CHUNK_ROWS]))
+
+
+async def _copy_rows(session: AsyncSession, table: Table, rows: list[dict[str, Any]]) -> bool:
+    """Load rows with asyncpg's binary COPY. False when the connection can't."""
+    connection = await session.connection()
+    if connection.dialect.driver != "asyncpg":
+        return False
+    driver = (await connection.get_raw_connection()).driver_connection
+    # The transaction only begins with the first statement; a COPY ahead of
+    # it would commit on its own
+    if not driver.is_in_transaction():
+        return False
+    columns = list(rows[0])
+    await driver.copy_records_to_table(
+        table.name,
+        columns=columns,
+        records=[tuple(row[column] for column in columns) for row in rows],
+    )
+    return True
+
+
+@dataclass
+class PendingGeneration:
+    """A generation result waiting to be written."""
+    business: str
+    role: str
+    prompts: list[str]
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+class WriteBehindQueue:
+    """Async queue of results drained in bulk by a background task."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_size: int,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[Optional[PendingGeneration]] = asyncio.Queue(maxsize=max_size)
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"enqueued": 0, "flushed": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, item: PendingGeneration) -> None:
+        """Enqueue a result; waits only if the queue is full."""
+        await self._queue.put(item)
+        self.counters["enqueued"] += 1
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+
+            # Collect until the batch is full or the flush interval elapses
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[PendingGeneration]) -> None:
+        """
+        Write a batch, retrying with exponential backoff. If it still fails,
+        write the results one at a time so a single bad row loses only
+        itself; those are logged and counted as dropped.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.counters["errors"] += 1
+                record_error("write_behind", e)
+                logger.warning(
+                    "Write-behind flush of %d results failed (attempt %d of %d): %s",
+                    len(batch), attempt + 1, self.retries + 1, e,
+                )
+                continue
+            self.counters["flushes"] += 1
+            self.counters["flushed"] += len(batch)
+            return
+
+        for item in batch:
+            try:
+                await self._write([item])
+            except Exception:
+                self.counters["dropped"] += 1
+                WRITE_BEHIND_DROPPED.labels(PromptRequest.__tablename__).inc()
+                WRITE_BEHIND_DROPPED.labels(GeneratedPrompt.__tablename__).inc(len(item.prompts))
+                logger.exception("Write-behind dropped the result for %r", item.business[:100])
+                continue
+            self.counters["flushed"] += 1
+
+    async def _write(self, batch: list[PendingGeneration]) -> None:
+        with observe_db("write_behind"):
+            async with async_session() as session:
+                await _insert_generations(session, batch)
+
+
+_write_behind: Optional[WriteBehindQueue] = None
+
+
+def start_write_behind() -> None:
+    """Start the write-behind queue if enabled in settings."""
+    global _write_behind
+    settings = get_settings()
+    if settings.persistence_mode != "write_behind":
+        return
+    _write_behind = WriteBehindQueue(
+        batch_size=settings.write_behind_batch_size,
+        flush_interval=settings.write_behind_flush_interval,
+        max_size=settings.write_behind_max_queue,
+        retries=settings.write_behind_retries,
+        retry_delay=settings.write_behind_retry_delay,
+    )
+    _write_behind.start()
+
+
+async def stop_write_behind() -> None:
+    """Drain and stop the write-behind queue."""
+    global _write_behind
+    if _write_behind is not None:
+        await _write_behind.stop()
+        _write_behind = None
+
+
+async def record_generation(
+    session: Optional[AsyncSession],
+    business: str,
+    role: str,
+    prompts: list[str],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+) -> None:
+    """Persist a result, through the write-behind queue when it is running."""
+    if _write_behind is not None:
+        await _write_behind.put(PendingGeneration(business, role, prompts, provider, model))
+        return
+    if session is None:
+        async with async_session() as own_session:
+            await save_generation(own_session, business, role, prompts, provider, model)
+        return
+    await save_generation(session, business, role, prompts, provider, model)
+
+
+async def record_generations(results: list[PendingGeneration]) -> None:
+    """Persist several results, in one transaction unless write-behind is running."""
+    if _write_behind is not None:
+        for result in results:
+            await _write_behind.put(result)
+        return
+    async with async_session() as session:
+        await save_generations(session, results)
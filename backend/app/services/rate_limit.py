@@ -0,0 +1,271 @@
+"""
+Adaptive per-provider rate limiting.
+
+Each (provider, API key) pair gets a token bucket plus a concurrency cap.
+The bucket rate adapts AIMD-style: it is halved on every 429 and slowly
+raised again on success. Retry-After and x-ratelimit-* response headers
+pause the whole bucket until the provider's window resets, so concurrent
+requests wait instead of hammering a throttled endpoint.
+
+With several workers the bucket and its pauses live in the shared state
+backend, so the configured rate holds for the whole deployment; the
+concurrency cap is split evenly between workers.
+"""
+
+import asyncio
+import math
+import random
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Mapping, Optional
+
+from ..config import get_settings
+from ..schemas.prompt import ProviderEnum
+from .fingerprint import key_fingerprint
+from .shared_state import SharedState, get_shared_state
+
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse a rate-limit reset value into seconds from now.
+
+    Accepts plain seconds ("12"), Go-style durations ("1m30s", "120ms")
+    and epoch timestamps in seconds or milliseconds (OpenRouter).
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+    if number > 1e12:
+        return max(0.0, number / 1000 - time.time())
+    if number > 1e9:
+        return max(0.0, number - time.time())
+    return max(0.0, number)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header, if any."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Jittered exponential backoff, never shorter than Retry-After."""
+    settings = get_settings()
+    delay = min(settings.rate_limit_backoff_max, settings.rate_limit_backoff_base * (2 ** attempt))
+    delay = random.uniform(delay / 2, delay)
+    return max(delay, retry_after or 0.0)
+
+
+class AdaptiveLimiter:
+    """Token bucket with a concurrency cap and header-driven pauses."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        shared: Optional[SharedState] = None,
+        shared_key: str = "",
+    ):
+        self.max_rate = rate
+        self.min_rate = rate / 32
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._shared = shared
+        self._shared_key = shared_key
+        self._pauses: set[asyncio.Task] = set()
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.throttled_total = 0
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a concurrency slot and a token, then hold the slot."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._take_token()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            if self._shared is not None:
+                wait = await self._shared.take_token(self._shared_key, self.rate, self.capacity)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+                continue
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> Optional[float]:
+        """
+        Learn from a provider response.
+
+        Returns the Retry-After delay in seconds when the provider sent one.
+        """
+        now = time.monotonic()
+        headers = {k.lower(): v for k, v in headers.items()}
+
+        limit = headers.get("x-ratelimit-limit-requests") or headers.get("x-ratelimit-limit")
+        remaining = headers.get("x-ratelimit-remaining-requests") or headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset")
+        if limit and limit.isdigit():
+            self.limit = int(limit)
+        if remaining and remaining.isdigit():
+            self.remaining = int(remaining)
+
+        reset_in = parse_duration(reset) if reset else None
+        if self.remaining == 0 and reset_in:
+            self._pause(now, reset_in)
+
+        retry_after = parse_retry_after(headers)
+        if status_code == 429:
+            self.throttled_total += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else reset_in
+            if pause:
+                self._pause(now, pause)
+        elif status_code < 400:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+        return retry_after
+
+    def _pause(self, now: float, seconds: float) -> None:
+        """Block the bucket here and, in the background, for the other workers."""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        if self._shared is not None:
+            task = asyncio.ensure_future(self._shared.pause(self._shared_key, seconds))
+            self._pauses.add(task)
+            task.add_done_callback(self._pauses.discard)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "tokens": round(min(self.capacity, self.tokens + (now - self.updated) * self.rate), 3),
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "blocked_for": round(max(0.0, self.blocked_until - now), 3),
+            "throttled_total": self.throttled_total,
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "shared": self._shared is not None,
+        }
+
+
+class RateLimiterRegistry:
+    """Limiters keyed by (provider, salted API key fingerprint) with LRU eviction of idle entries."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._limiters: OrderedDict[tuple[ProviderEnum, str], AdaptiveLimiter] = OrderedDict()
+
+    def get(self, provider: ProviderEnum, api_key: str) -> AdaptiveLimiter:
+        key = (provider, key_fingerprint(api_key)[:16])
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            settings = get_settings()
+            limiter = AdaptiveLimiter(
+                rate=settings.rate_limit_requests_per_second,
+                burst=settings.rate_limit_burst,
+                # Each worker gets its share of the concurrency cap
+                max_concurrency=math.ceil(settings.rate_limit_max_concurrency / max(1, settings.workers)),
+                shared=get_shared_state(),
+                shared_key=f"rl:{provider.value}:{key[1]}",
+            )
+            self._limiters[key] = limiter
+            self._evict_idle()
+        else:
+            self._limiters.move_to_end(key)
+        return limiter
+
+    def _evict_idle(self) -> None:
+        excess = len(self._limiters) - self.max_entries
+        for key in list(self._limiters):
+            if excess <= 0:
+                break
+            limiter = self._limiters[key]
+            if not limiter.in_flight and not limiter.waiting:
+                del self._limiters[key]
+                excess -= 1
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {"provider": provider.value, "key_id": key_id, **limiter.snapshot()}
+            for (provider, key_id), limiter in self._limiters.items()
+        ]
+
+
+_registry = RateLimiterRegistry()
+
+
+def get_rate_limiter(provider: ProviderEnum, api_key: str) -> AdaptiveLimiter:
+    """Get the limiter for a provider and API key."""
+    return _registry.get(provider, api_key)
+
+
+def rate_limit_snapshot() -> list[dict]:
+    """Live limiter state for operators (keys are shown as salted fingerprint prefixes)."""
+    return _registry.snapshot()
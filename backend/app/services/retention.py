@@ -0,0 +1,293 @@
+"""
+Retention of generation history.
+
+With RETENTION_DAYS > 0 a background task runs every
+RETENTION_INTERVAL_SECONDS and removes requests older than that, with their
+prompts:
+
+- rows are taken oldest first in batches of RETENTION_BATCH_SIZE requests,
+  each written to the archive and deleted in its own short transaction,
+  with a pause in between so request writers are not held up
+- the archive is gzip NDJSON (the /api/export record format) partitioned
+  by day: RETENTION_ARCHIVE_DIR/YYYY-MM/YYYY-MM-DD.ndjson.gz. Each batch is
+  appended as its own gzip member and synced before the rows are deleted;
+  a crash in between may archive a batch twice, never lose it
+- finished jobs and expired persistent cache rows past the cutoff are
+  deleted without archiving
+- the database is compacted afterwards: SQLite runs an incremental vacuum
+  (databases created before auto_vacuum=INCREMENTAL need a one-off
+  `python -m app.cli compact`; until then freed pages are only reused) and
+  truncates the WAL; PostgreSQL runs VACUUM ANALYZE
+
+Under app.serve only one worker runs it per interval (a shared state lease).
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..config import get_settings
+from ..database import async_session, engine
+from ..models.cache import CachedGeneration
+from ..models.job import GenerationJob
+from ..models.prompt import GeneratedPrompt, PromptRequest
+from ..schemas.job import JobStatus
+from .export import ndjson_record
+from .metrics import (
+    RETENTION_ARCHIVED,
+    RETENTION_DELETED,
+    RETENTION_RECLAIMED,
+    RETENTION_RUN,
+    record_error,
+)
+from .shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionReport:
+    """What a retention run did."""
+    cutoff: datetime
+    archived: int = 0
+    deleted: dict[str, int] = field(default_factory=dict)
+    reclaimed_bytes: int = 0
+
+    def count(self, table: str, rows: int) -> None:
+        self.deleted[table] = self.deleted.get(table, 0) + rows
+        RETENTION_DELETED.labels(table).inc(rows)
+
+
+def _append_archive(directory: str, lines_by_day: dict[str, list[str]]) -> None:
+    """Append one gzip member per day file and sync it to disk."""
+    for day, lines in lines_by_day.items():
+        path = Path(directory) / day[:7] / f"{day}.ndjson.gz"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "ab") as archive:
+            archive.write(gzip.compress("".join(lines).encode("utf-8")))
+            archive.flush()
+            os.fsync(archive.fileno())
+
+
+async def _archive_batch(cutoff: datetime, batch_size: int, archive_dir: str, report: RetentionReport) -> bool:
+    """Archive and delete the oldest batch of expired requests. Returns False when none are left."""
+    async with async_session() as session:
+        requests = (await session.execute(
+            select(
+                PromptRequest.id,
+                PromptRequest.created_at,
+                PromptRequest.business_description,
+                PromptRequest.role,
+                PromptRequest.provider,
+                PromptRequest.model,
+            )
+            .where(PromptRequest.created_at < cutoff)
+            .order_by(PromptRequest.created_at, PromptRequest.id)
+            .limit(batch_size)
+        )).all()
+        if not requests:
+            return False
+        ids = [request.id for request in requests]
+
+        if archive_dir:
+            prompts: dict = defaultdict(list)
+            for request_id, content in await session.execute(
+                select(GeneratedPrompt.request_id, GeneratedPrompt.content)
+                .where(GeneratedPrompt.request_id.in_(ids))
+            ):
+                prompts[request_id].append(content)
+            lines_by_day = defaultdict(list)
+            for request in requests:
+                lines_by_day[request.created_at.date().isoformat()].append(
+                    ndjson_record(request, prompts[request.id])
+                )
+            await asyncio.to_thread(_append_archive, archive_dir, lines_by_day)
+            report.archived += len(requests)
+            RETENTION_ARCHIVED.labels(PromptRequest.__tablename__).inc(len(requests))
+            RETENTION_ARCHIVED.labels(GeneratedPrompt.__tablename__).inc(sum(map(len, prompts.values())))
+
+        deleted_prompts = await session.execute(delete(GeneratedPrompt).where(GeneratedPrompt.request_id.in_(ids)))
+        deleted_requests = await session.execute(delete(PromptRequest).where(PromptRequest.id.in_(ids)))
+        await session.commit()
+
+    report.count(GeneratedPrompt.__tablename__, deleted_prompts.rowcount)
+    report.count(PromptRequest.__tablename__, deleted_requests.rowcount)
+    return True
+
+
+async def _delete_batches(table, key, condition, batch_size: int, pause: float, report: RetentionReport) -> None:
+    """Delete matching rows, a batch of primary keys at a time."""
+    while True:
+        async with async_session() as session:
+            keys = (await session.execute(select(key).where(condition).limit(batch_size))).scalars().all()
+            if not keys:
+                return
+            result = await session.execute(delete(table).where(key.in_(keys)))
+            await session.commit()
+        report.count(table.__tablename__, result.rowcount)
+        await asyncio.sleep(pause)
+
+
+# Pages freed per incremental vacuum step (each is one short write transaction)
+VACUUM_STEP_PAGES = 2048
+
+
+def _sqlite_file_bytes(sync_conn) -> int:
+    path = engine.url.database or ""
+    wal = os.path.getsize(path + "-wal") if path and os.path.exists(path + "-wal") else 0
+    page_size = sync_conn.exec_driver_sql("PRAGMA page_size").scalar()
+    pages = sync_conn.exec_driver_sql("PRAGMA page_count").scalar()
+    return page_size * pages + wal
+
+
+async def _sqlite_compact(conn: AsyncConnection, full: bool, pause: float) -> None:
+    # pysqlite steps PRAGMA incremental_vacuum only once (one page);
+    # aiosqlite's executescript runs statements to completion
+    driver = (await conn.get_raw_connection()).driver_connection
+    if full:
+        await driver.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+    elif await conn.scalar(text("PRAGMA auto_vacuum")) == 2:
+        while await conn.scalar(text("PRAGMA freelist_count")):
+            await driver.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+            await asyncio.sleep(pause)
+    await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+_POSTGRES_SIZE = (
+    "SELECT pg_total_relation_size('prompt_requests') + pg_total_relation_size('generated_prompts')"
+)
+
+
+async def compact(full: bool = False, pause: float = 0.0) -> int:
+    """
+    Give freed space back after deletes. Returns the bytes reclaimed.
+
+    `full` rewrites the whole database (SQLite VACUUM, which also switches
+    it to incremental auto-vacuum; PostgreSQL VACUUM FULL) and blocks
+    writers while it runs, so it is only used by `python -m app.cli compact`.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if conn.dialect.name == "sqlite":
+            before = await conn.run_sync(_sqlite_file_bytes)
+            await _sqlite_compact(conn, full, pause)
+            return max(0, before - await conn.run_sync(_sqlite_file_bytes))
+        if conn.dialect.name == "postgresql":
+            options = "FULL, ANALYZE" if full else "ANALYZE"
+            before = await conn.scalar(text(_POSTGRES_SIZE))
+            await conn.execute(text(f"VACUUM ({options}) generated_prompts, prompt_requests"))
+            return max(0, before - await conn.scalar(text(_POSTGRES_SIZE)))
+    return 0
+
+
+async def run_retention(days: Optional[int] = None) -> Optional[RetentionReport]:
+    """
+    Archive and delete history older than `days` (RETENTION_DAYS), then compact.
+
+    Does nothing and returns None when `days` is 0 or less (keep everything).
+    """
+    settings = get_settings()
+    days = settings.retention_days if days is None else days
+    if days <= 0:
+        return None
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    report = RetentionReport(cutoff=cutoff)
+    batch_size = max(1, settings.retention_batch_size)
+    pause = settings.retention_batch_pause
+
+    started = time.perf_counter()
+    while await _archive_batch(cutoff, batch_size, settings.retention_archive_dir, report):
+        await asyncio.sleep(pause)
+    await _delete_batches(
+        GenerationJob,
+        GenerationJob.id,
+        GenerationJob.status.in_([JobStatus.succeeded.value, JobStatus.failed.value])
+        & (GenerationJob.created_at < cutoff),
+        batch_size,
+        pause,
+        report,
+    )
+    await _delete_batches(
+        CachedGeneration,
+        CachedGeneration.key,
+        CachedGeneration.expires_at < datetime.utcnow(),
+        batch_size,
+        pause,
+        report,
+    )
+
+    if any(report.deleted.values()):
+        report.reclaimed_bytes = await compact(pause=pause)
+        RETENTION_RECLAIMED.inc(report.reclaimed_bytes)
+    RETENTION_RUN.observe(time.perf_counter() - started)
+    return report
+
+
+class RetentionTask:
+    """Runs retention periodically in the background."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._run_once()
+            except Exception as e:
+                record_error("retention", e)
+                logger.exception("Retention run failed")
+            await asyncio.sleep(self.interval)
+
+    async def _run_once(self) -> None:
+        # Other workers skip the run until the lease expires
+        state = get_shared_state()
+        if state is not None and not await state.add("retention", str(os.getpid()), self.interval):
+            return
+        report = await run_retention()
+        if report is not None and (report.archived or any(report.deleted.values())):
+            logger.info(
+                "Retention: archived %d requests, deleted %s, reclaimed %d bytes",
+                report.archived,
+                report.deleted,
+                report.reclaimed_bytes,
+            )
+
+
+_retention: Optional[RetentionTask] = None
+
+
+def start_retention() -> None:
+    """Start the retention task if RETENTION_DAYS is set."""
+    global _retention
+    settings = get_settings()
+    if settings.retention_days <= 0:
+        return
+    _retention = RetentionTask(interval=settings.retention_interval_seconds)
+    _retention.start()
+
+
+async def stop_retention() -> None:
+    global _retention
+    if _retention is not None:
+        await _retention.stop()
+        _retention = None
@@ -0,0 +1,168 @@
+"""
+Full-text search over generated prompt history.
+
+SQLite uses an FTS5 table kept in sync by triggers on generated_prompts;
+PostgreSQL uses generated tsvector columns with GIN indexes. Both index the
+prompt text and the business description of its request.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+_SQLITE_SETUP = [
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_prompts_fts_insert AFTER INSERT ON generated_prompts BEGIN
+        INSERT INTO generated_prompts_fts(rowid, content, business)
+        VALUES (
+            new.rowid,
+            new.content,
+            (SELECT business_description FROM prompt_requests WHERE id = new.request_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_prompts_fts_delete AFTER DELETE ON generated_prompts BEGIN
+        DELETE FROM generated_prompts_fts WHERE rowid = old.rowid;
+    END
+    """,
+]
+
+_SQLITE_REBUILD = [
+    "DELETE FROM generated_prompts_fts",
+    """
+    INSERT INTO generated_prompts_fts(rowid, content, business)
+    SELECT gp.rowid, gp.content, pr.business_description
+    FROM generated_prompts gp
+    LEFT JOIN prompt_requests pr ON pr.id = gp.request_id
+    """,
+    "INSERT INTO generated_prompts_fts(generated_prompts_fts) VALUES ('optimize')",
+]
+
+_SQLITE_SEARCH = f"""
+    SELECT gp.id AS prompt_id, gp.request_id, gp.content, gp.created_at,
+           pr.business_description AS business, pr.role,
+           snippet(generated_prompts_fts, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 24) AS snippet,
+           -bm25(generated_prompts_fts) AS rank
+    FROM generated_prompts_fts
+    JOIN generated_prompts gp ON gp.rowid = generated_prompts_fts.rowid
+    LEFT JOIN prompt_requests pr ON pr.id = gp.request_id
+    WHERE generated_prompts_fts MATCH :query
+    ORDER BY bm25(generated_prompts_fts)
+    LIMIT :limit OFFSET :offset
+"""
+
+_POSTGRES_SETUP = [
+    """
+    ALTER TABLE generated_prompts ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
+    """,
+    """
+    ALTER TABLE prompt_requests ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(business_description, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_generated_prompts_search ON generated_prompts USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_prompt_requests_search ON prompt_requests USING GIN (search_vector)",
+]
+
+_POSTGRES_REBUILD = [
+    "REINDEX INDEX ix_generated_prompts_search",
+    "REINDEX INDEX ix_prompt_requests_search",
+]
+
+_POSTGRES_SEARCH = f"""
+    SELECT gp.id AS prompt_id, gp.request_id, gp.content, gp.created_at,
+           pr.business_description AS business, pr.role,
+           ts_headline('simple', gp.content, q,
+                       'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=35, MinWords=15') AS snippet,
+           ts_rank(gp.search_vector, q) + 0.5 * ts_rank(pr.search_vector, q) AS rank
+    FROM generated_prompts gp
+    JOIN prompt_requests pr ON pr.id = gp.request_id,
+         websearch_to_tsquery('simple', :query) AS q
+    WHERE gp.search_vector @@ q OR pr.search_vector @@ q
+    ORDER BY rank DESC, gp.created_at DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    """A single search result row."""
+    prompt_id: Any
+    request_id: Any
+    content: str
+    created_at: datetime
+    business: str
+    role: str
+    snippet: str
+    rank: float
+
+
+def to_fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return " ".join(f'"{term}"*' for term in _TERM.findall(query))
+
+
+def _setup_sqlite(conn: Connection) -> None:
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'generated_prompts_fts'")
+    ).first()
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS generated_prompts_fts "
+        "USING fts5(content, business, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    for statement in _SQLITE_SETUP:
+        conn.execute(text(statement))
+    # Backfill rows written before the index existed
+    if not exists:
+        for statement in _SQLITE_REBUILD:
+            conn.execute(text(statement))
+
+
+async def setup_search(conn: AsyncConnection) -> None:
+    """Create the full-text index for the current database if missing."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        await conn.run_sync(_setup_sqlite)
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_SETUP:
+            await conn.execute(text(statement))
+
+
+async def rebuild_search(conn: AsyncConnection) -> None:
+    """Rebuild the full-text index from the stored prompts."""
+    await setup_search(conn)
+    statements = {
+        "sqlite": _SQLITE_REBUILD,
+        "postgresql": _POSTGRES_REBUILD,
+    }.get(conn.dialect.name, [])
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+async def search_prompts(session: AsyncSession, query: str, limit: int, offset: int) -> list[SearchHit]:
+    """Ranked full-text search over prompts and business descriptions."""
+    dialect = session.bind.dialect.name
+    if dialect == "sqlite":
+        statement, query = _SQLITE_SEARCH, to_fts5_query(query)
+    elif dialect == "postgresql":
+        statement = _POSTGRES_SEARCH
+    else:
+        raise ValueError(f"Полнотекстовый поиск не поддерживается для {dialect}")
+
+    if not query.strip():
+        return []
+
+    result = await session.execute(text(statement), {"query": query, "limit": limit, "offset": offset})
+    return [SearchHit(**row._mapping) for row in result]
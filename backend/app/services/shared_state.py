@@ -0,0 +1,273 @@
+"""
+State shared between worker processes.
+
+With a single worker everything lives in process memory (backend "memory",
+no shared state). With several workers (see app/serve.py) the response
+cache, rate limiter buckets and single-flight leases go through one of:
+
+- "sqlite": a small SQLite file in WAL mode next to the database, for
+  workers on one host; no extra services needed
+- "redis": any Redis-compatible server (REDIS_URL); needs the optional
+  `redis` package
+
+All timestamps are wall-clock seconds, so they mean the same in every
+process.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from ..config import get_settings
+
+
+class SharedState(ABC):
+    """Key-value store, leases and token buckets visible to all workers."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Value of a key, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        """Store a value for `ttl` seconds."""
+
+    @abstractmethod
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        """Store a value only if the key is absent; True if stored (a lease)."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a key."""
+
+    @abstractmethod
+    async def take_token(self, key: str, rate: float, capacity: int) -> float:
+        """
+        Take one token from a shared bucket.
+
+        Returns 0 when a token was taken, otherwise the seconds to wait
+        before trying again (the bucket is empty or paused).
+        """
+
+    @abstractmethod
+    async def pause(self, key: str, seconds: float) -> None:
+        """Empty a bucket and pause it for `seconds` (Retry-After)."""
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteState(SharedState):
+    """Shared state in a local SQLite file, for workers on the same host."""
+
+    # Expired keys are purged every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _transaction(self, fn, *args):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def _add(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        self._conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl),
+        )
+        return cursor.rowcount == 1
+
+    def _take_token(self, key: str, rate: float, capacity: int) -> float:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT tokens, updated_at, blocked_until FROM buckets WHERE key = ?", (key,)
+        ).fetchone()
+        tokens, updated_at, blocked_until = row if row else (float(capacity), now, 0.0)
+        if blocked_until > now:
+            return blocked_until - now
+
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._conn.execute(
+            "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+            (key, tokens, now, blocked_until),
+        )
+        return wait
+
+    def _pause(self, key: str, seconds: float) -> None:
+        now = time.time()
+        row = self._conn.execute("SELECT blocked_until FROM buckets WHERE key = ?", (key,)).fetchone()
+        blocked_until = max(row[0] if row else 0.0, now + seconds)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?)",
+            (key, now, blocked_until),
+        )
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return await self._run(self._transaction, self._add, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._conn.execute, "DELETE FROM kv WHERE key = ?", (key,))
+
+    async def take_token(self, key: str, rate: float, capacity: int) -> float:
+        return await self._run(self._transaction, self._take_token, key, rate, capacity)
+
+    async def pause(self, key: str, seconds: float) -> None:
+        await self._run(self._transaction, self._pause, key, seconds)
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+
+
+# KEYS[1] bucket; ARGV: now, rate, capacity. Returns the wait in seconds as a string.
+_TAKE_TOKEN_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'blocked_until')
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+local blocked_until = tonumber(bucket[3]) or 0
+if blocked_until > now then
+  return tostring(blocked_until - now)
+end
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now), 'blocked_until', tostring(blocked_until))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+# KEYS[1] bucket; ARGV: now, seconds
+_PAUSE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local blocked_until = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+blocked_until = math.max(blocked_until, now + tonumber(ARGV[2]))
+redis.call('HSET', KEYS[1], 'tokens', '0', 'updated_at', tostring(now), 'blocked_until', tostring(blocked_until))
+redis.call('EXPIRE', KEYS[1], 3600)
+return 1
+"""
+
+
+class RedisState(SharedState):
+    """Shared state in Redis (or any server speaking its protocol and Lua)."""
+
+    def __init__(self, url: str = "", client=None, prefix: str = "pg:"):
+        if client is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError:
+                raise RuntimeError("SHARED_STATE_BACKEND=redis requires the `redis` package")
+            client = Redis.from_url(url, decode_responses=True)
+        self._redis = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._redis.get(self._prefix + key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._redis.set(self._prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(await self._redis.set(self._prefix + key, value, px=max(1, int(ttl * 1000)), nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._prefix + key)
+
+    async def take_token(self, key: str, rate: float, capacity: int) -> float:
+        # Plain EVAL rather than EVALSHA: the scripts are short and some
+        # Redis-compatible servers don't implement SCRIPT LOAD
+        wait = await self._redis.eval(_TAKE_TOKEN_SCRIPT, 1, self._prefix + key, time.time(), rate, capacity)
+        return float(wait)
+
+    async def pause(self, key: str, seconds: float) -> None:
+        await self._redis.eval(_PAUSE_SCRIPT, 1, self._prefix + key, time.time(), seconds)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """The process-wide shared state, or None with the "memory" backend."""
+    global _state
+    if _state is None:
+        settings = get_settings()
+        backend = settings.shared_state_backend
+        if backend == "sqlite":
+            _state = SQLiteState(settings.shared_state_path)
+        elif backend == "redis":
+            _state = RedisState(settings.redis_url)
+        elif backend != "memory":
+            raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+    return _state
+
+
+async def close_shared_state() -> None:
+    global _state
+    if _state is not None:
+        await _state.close()
+        _state = None
@@ -0,0 +1,153 @@
+"""
+Single-flight coalescing.
+
+Concurrent callers asking for the same key share one underlying call and
+its result. Each caller awaits the shared task through asyncio.shield, so a
+caller that is cancelled (e.g. a client disconnect) stops waiting without
+cancelling the call for everyone else. Only when the last waiter leaves is
+the shared call itself cancelled.
+
+With several workers SharedFlight extends this across processes: one worker
+takes a lease in the shared state backend and runs the call, the others poll
+for its result.
+"""
+
+import asyncio
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from .shared_state import SharedState, get_shared_state
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one."""
+
+    def __init__(self):
+        self._calls: dict[str, _Flight] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Run factory() once for all concurrent callers of `key`.
+
+        Returns (result, shared) where `shared` is True if this caller joined
+        a call started by someone else.
+        """
+        flight = self._calls.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda done: self._forget(key, done))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        flight = self._calls.get(key)
+        if flight is not None and flight.task is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+
+class SharedFlight:
+    """
+    Coalesce identical calls across workers.
+
+    The leader holds the lease `sf:<key>` while it runs the call and then
+    publishes the JSON-encoded result under the lease's token. Followers
+    poll for that result; if the lease goes away without one (the leader
+    failed or was cancelled), the next follower to take the lease runs the
+    call itself. Errors are not shared.
+    """
+
+    def __init__(
+        self,
+        state: SharedState,
+        lease_ttl: float = 120.0,
+        result_ttl: float = 30.0,
+        poll_interval: float = 0.05,
+        max_poll_interval: float = 1.0,
+    ):
+        self.state = state
+        self.lease_ttl = lease_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Run factory() once across workers for concurrent callers of `key`.
+
+        The result must be JSON-serialisable; followers get the decoded
+        value. Returns (result, shared) like SingleFlight.do.
+        """
+        lease_key = f"sf:{key}"
+        token = uuid.uuid4().hex
+        while True:
+            if await self.state.add(lease_key, token, self.lease_ttl):
+                return await self._lead(key, lease_key, token, factory), False
+
+            leader = await self.state.get(lease_key)
+            if leader is None:
+                continue
+            value = await self._follow(key, lease_key, leader)
+            if value is not None:
+                return json.loads(value), True
+
+    async def _lead(self, key: str, lease_key: str, token: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await factory()
+            await self.state.set(f"sfr:{key}:{token}", json.dumps(result, ensure_ascii=False), self.result_ttl)
+            return result
+        finally:
+            await self.state.delete(lease_key)
+
+    async def _follow(self, key: str, lease_key: str, leader: str) -> Optional[str]:
+        """Wait for the leader's result; None if its lease ended without one."""
+        result_key = f"sfr:{key}:{leader}"
+        delay = self.poll_interval
+        while True:
+            value = await self.state.get(result_key)
+            if value is not None:
+                return value
+            if await self.state.get(lease_key) != leader:
+                # The result may have landed just before the lease was released
+                return await self.state.get(result_key)
+            await asyncio.sleep(delay)
+            delay = min(self.max_poll_interval, delay * 2)
+
+
+_shared_flight: Optional[SharedFlight] = None
+
+
+def get_shared_flight() -> Optional[SharedFlight]:
+    """The cross-worker single-flight, or None without a shared state backend."""
+    global _shared_flight
+    if _shared_flight is None:
+        state = get_shared_state()
+        if state is not None:
+            _shared_flight = SharedFlight(state)
+    return _shared_flight
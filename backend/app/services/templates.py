@@ -0,0 +1,215 @@
+"""
+System prompt templates.
+
+A template is parsed once into a CompiledTemplate: the literal text split
+around its {role} / {business} placeholders, so rendering is a single join
+instead of scanning the whole text on every request. Compiled forms are
+cached by source text, which covers the default prompt, custom
+`system_prompt` values and stored templates alike.
+
+Stored templates live in the prompt_templates table. Versions are
+immutable: an update adds a new version under the same id. The registry
+keeps recently used versions in memory; "latest version" lookups expire
+after TEMPLATE_CACHE_TTL_SECONDS, so other workers see updates after at
+most that long.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import async_session
+from ..models.template import PromptTemplate
+from .cache import TTLCache
+
+PLACEHOLDERS = ("role", "business")
+
+_PLACEHOLDER = re.compile(r"\{(role|business)\}")
+# Anything that looks like a placeholder; unknown names are rejected in
+# stored templates (usually a typo such as {buisness})
+_PLACEHOLDER_LIKE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class TemplateNotFound(ValueError):
+    """The requested template or template version does not exist."""
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Template text split into literal segments and placeholder names."""
+    source: str
+    # literal, name, literal, name, ..., literal
+    segments: tuple[str, ...]
+
+    @property
+    def placeholders(self) -> list[str]:
+        return sorted(set(self.segments[1::2]))
+
+    @property
+    def static_prefix(self) -> str:
+        """Text before the first placeholder; the same for every request."""
+        return self.segments[0]
+
+    def render(self, role: str, business: str) -> str:
+        values = {"role": role, "business": business}
+        parts = list(self.segments)
+        parts[1::2] = [values[name] for name in self.segments[1::2]]
+        return "".join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    """Parse template text; unknown placeholders are left as literal text."""
+    return CompiledTemplate(source=source, segments=tuple(_PLACEHOLDER.split(source)))
+
+
+def validate_template(source: str) -> CompiledTemplate:
+    """Compile a template for storage. Raises ValueError on unknown placeholders."""
+    unknown = sorted(set(_PLACEHOLDER_LIKE.findall(source)) - set(PLACEHOLDERS))
+    if unknown:
+        names = ", ".join(f"{{{name}}}" for name in unknown)
+        raise ValueError(f"Неизвестные переменные в шаблоне: {names}. Доступны: {{role}}, {{business}}")
+    return compile_template(source)
+
+
+@dataclass(frozen=True)
+class StoredTemplate:
+    """A stored template version with its compiled form."""
+    id: UUID
+    version: int
+    name: str
+    compiled: CompiledTemplate
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row: PromptTemplate) -> "StoredTemplate":
+        return cls(
+            id=row.id,
+            version=row.version,
+            name=row.name,
+            compiled=compile_template(row.content),
+            created_at=row.created_at,
+        )
+
+
+async def fetch_template(
+    session: AsyncSession, template_id: UUID, version: Optional[int] = None
+) -> Optional[PromptTemplate]:
+    """A template version, or the latest one when `version` is None."""
+    query = select(PromptTemplate).where(PromptTemplate.id == template_id)
+    if version is not None:
+        query = query.where(PromptTemplate.version == version)
+    query = query.order_by(PromptTemplate.version.desc()).limit(1)
+    return (await session.execute(query)).scalars().first()
+
+
+async def list_templates(session: AsyncSession) -> list[PromptTemplate]:
+    """Latest version of every template, by name."""
+    latest = (
+        select(PromptTemplate.id, func.max(PromptTemplate.version).label("version"))
+        .group_by(PromptTemplate.id)
+        .subquery()
+    )
+    query = (
+        select(PromptTemplate)
+        .join(latest, (latest.c.id == PromptTemplate.id) & (latest.c.version == PromptTemplate.version))
+        .order_by(PromptTemplate.name, PromptTemplate.id)
+    )
+    return list((await session.execute(query)).scalars().all())
+
+
+async def list_versions(session: AsyncSession, template_id: UUID) -> list[PromptTemplate]:
+    """All versions of a template, newest first."""
+    query = (
+        select(PromptTemplate)
+        .where(PromptTemplate.id == template_id)
+        .order_by(PromptTemplate.version.desc())
+    )
+    return list((await session.execute(query)).scalars().all())
+
+
+async def create_template(session: AsyncSession, name: str, content: str) -> PromptTemplate:
+    """Store version 1 of a new template and commit."""
+    validate_template(content)
+    row = PromptTemplate(name=name, content=content)
+    session.add(row)
+    await session.commit()
+    return row
+
+
+async def add_version(
+    session: AsyncSession, current: PromptTemplate, name: Optional[str], content: Optional[str]
+) -> PromptTemplate:
+    """Store the next version of a template and commit."""
+    content = current.content if content is None else content
+    validate_template(content)
+    row = PromptTemplate(
+        id=current.id,
+        version=current.version + 1,
+        name=current.name if name is None else name,
+        content=content,
+    )
+    session.add(row)
+    await session.commit()
+    get_template_registry().invalidate(current.id)
+    return row
+
+
+async def delete_template(session: AsyncSession, template_id: UUID) -> int:
+    """Delete every version of a template and commit. Returns the versions deleted."""
+    versions = [row.version for row in await list_versions(session, template_id)]
+    await session.execute(delete(PromptTemplate).where(PromptTemplate.id == template_id))
+    await session.commit()
+    get_template_registry().invalidate(template_id, versions)
+    return len(versions)
+
+
+class TemplateRegistry:
+    """In-memory cache of stored template versions."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries, ttl)
+
+    async def get(self, template_id: UUID, version: Optional[int] = None) -> StoredTemplate:
+        """A template version (latest when `version` is None). Raises TemplateNotFound."""
+        key = f"{template_id}:{version or 'latest'}"
+        stored = self._cache.get(key)
+        if stored is not None:
+            return stored
+
+        async with async_session() as session:
+            row = await fetch_template(session, template_id, version)
+        if row is None:
+            raise TemplateNotFound("Шаблон не найден")
+
+        stored = StoredTemplate.from_row(row)
+        self._cache.set(key, stored)
+        self._cache.set(f"{template_id}:{stored.version}", stored)
+        return stored
+
+    def invalidate(self, template_id: UUID, versions: Sequence[int] = ()) -> None:
+        self._cache.delete(f"{template_id}:latest")
+        for version in versions:
+            self._cache.delete(f"{template_id}:{version}")
+
+
+_registry: Optional[TemplateRegistry] = None
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Get the process-wide template registry."""
+    global _registry
+    if _registry is None:
+        settings = get_settings()
+        _registry = TemplateRegistry(
+            max_entries=settings.template_cache_max_entries,
+            ttl=settings.template_cache_ttl_seconds,
+        )
+    return _registry
@@ -0,0 +1,257 @@
+"""
+Load driver for a running backend.
+
+Fires concurrent requests at one scenario and reports, as JSON:
+- requests per second, error count and status breakdown
+- latency p50/p95/p99 (for `stream`, also time to the first prompt event)
+- DB write throughput (rows/s) when --database-url points at the backend's DB
+
+Every request uses a unique business, so the response cache never answers.
+Run the backend against the stub provider to keep it offline:
+
+    python -m bench.stub_server --latency-ms 500 &
+    UPSTREAM_BASE_URL=http://127.0.0.1:9100 uvicorn app.main:app --port 8000 &
+    python -m bench.load --scenario generate --requests 500 --concurrency 50 \\
+        --database-url sqlite+aiosqlite:///./prompts.db
+
+Results are saved to bench/results/<timestamp>-<git sha>-<scenario>.json;
+pass --compare <file> to print the change against an earlier run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+SCENARIOS = ("generate", "stream", "batch", "providers")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(values: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    ms = [v * 1000 for v in values]
+    return {
+        "p50_ms": _percentile(ms, 50),
+        "p95_ms": _percentile(ms, 95),
+        "p99_ms": _percentile(ms, 99),
+        "mean_ms": statistics.fmean(ms) if ms else None,
+        "max_ms": max(ms) if ms else None,
+    }
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _item(args, index: int) -> dict:
+    item = {
+        "business": f"Нагрузочный тест {uuid.uuid4().hex[:8]} #{index}",
+        "role": "Менеджер",
+        "provider": args.provider,
+        "api_key": args.api_key,
+    }
+    if args.model:
+        item["model"] = args.model
+    return item
+
+
+async def _count_rows(database_url: Optional[str]) -> Optional[int]:
+    if not database_url:
+        return None
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(text("SELECT count(*) FROM generated_prompts"))).scalar_one()
+    finally:
+        await engine.dispose()
+
+
+async def _generate(client: httpx.AsyncClient, args, index: int) -> dict:
+    response = await client.post("/api/generate", json=_item(args, index))
+    return {"status": response.status_code}
+
+
+async def _stream(client: httpx.AsyncClient, args, index: int) -> dict:
+    started = time.perf_counter()
+    first_prompt = None
+    status = None
+    async with client.stream("POST", "/api/generate/stream", json=_item(args, index)) as response:
+        status = response.status_code
+        async for line in response.aiter_lines():
+            if line == "event: prompt" and first_prompt is None:
+                first_prompt = time.perf_counter() - started
+            elif line == "event: error":
+                status = "error_event"
+    return {"status": status, "first_prompt": first_prompt}
+
+
+async def _batch(client: httpx.AsyncClient, args, index: int) -> dict:
+    items = [_item(args, index * args.batch_size + i) for i in range(args.batch_size)]
+    response = await client.post("/api/generate/batch", json={"items": items})
+    failed = 0
+    if response.status_code == 200:
+        failed = sum(1 for result in response.json()["results"] if not result["success"])
+    return {"status": response.status_code if not failed else "item_errors"}
+
+
+async def _providers(client: httpx.AsyncClient, args, index: int) -> dict:
+    response = await client.get("/api/providers")
+    return {"status": response.status_code}
+
+
+RUNNERS = {
+    "generate": _generate,
+    "stream": _stream,
+    "batch": _batch,
+    "providers": _providers,
+}
+
+
+async def run(args) -> dict:
+    runner = RUNNERS[args.scenario]
+    latencies: list[float] = []
+    first_prompts: list[float] = []
+    statuses: Counter = Counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(args.requests):
+        queue.put_nowait(index)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                outcome = await runner(client, args, index)
+            except httpx.HTTPError as e:
+                outcome = {"status": type(e).__name__}
+            latencies.append(time.perf_counter() - started)
+            statuses[str(outcome["status"])] += 1
+            if outcome.get("first_prompt") is not None:
+                first_prompts.append(outcome["first_prompt"])
+
+    rows_before = await _count_rows(args.database_url)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    # Give write-behind mode a moment to flush before counting
+    if args.database_url and args.settle > 0:
+        await asyncio.sleep(args.settle)
+    rows_after = await _count_rows(args.database_url)
+
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    result = {
+        "scenario": args.scenario,
+        "git_sha": _git_sha(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "base_url": args.base_url,
+            "provider": args.provider,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size if args.scenario == "batch" else None,
+        },
+        "elapsed_s": elapsed,
+        "rps": args.requests / elapsed if elapsed else None,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "latency": _summary(latencies),
+    }
+    if first_prompts:
+        result["first_prompt"] = _summary(first_prompts)
+    if rows_before is not None and rows_after is not None:
+        written = rows_after - rows_before
+        result["db"] = {"rows_written": written, "rows_per_s": written / elapsed if elapsed else None}
+    return result
+
+
+def _compare(current: dict, baseline: dict) -> dict:
+    """Relative change (%) of the headline numbers against a baseline run."""
+    def change(new, old):
+        if new is None or not old:
+            return None
+        return round((new - old) / old * 100, 1)
+
+    diff = {
+        "baseline": baseline.get("git_sha"),
+        "rps_pct": change(current.get("rps"), baseline.get("rps")),
+    }
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        diff[f"{key}_pct"] = change(current["latency"].get(key), baseline.get("latency", {}).get(key))
+    if "db" in current and "db" in baseline:
+        diff["db_rows_per_s_pct"] = change(current["db"]["rows_per_s"], baseline["db"]["rows_per_s"])
+    return diff
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.load")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="generate")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=10, help="Items per request in the batch scenario")
+    parser.add_argument("--provider", default="openai")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--api-key", default="sk-bench")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--database-url", default=None,
+                        help="Backend database, to measure rows written per second")
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="Seconds to wait before the final row count")
+    parser.add_argument("--output", default=None, help="Result file (default: bench/results/...)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            result["compare"] = _compare(result, json.load(f))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['git_sha']}-{args.scenario}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+    print(f"\nsaved to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
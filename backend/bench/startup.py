@@ -0,0 +1,107 @@
+"""
+Cold-start benchmark for the backend.
+
+Spawns fresh interpreters and reports, as JSON:
+- import time of app.main as measured by `python -X importtime`
+- time from process start to "ready" (import + lifespan startup)
+- RSS at ready, and which provider SDKs were loaded
+- the same for a second boot against an already migrated database
+
+Usage (from backend/):
+    python -m bench.startup [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_READY_SNIPPET = r"""
+import asyncio, json, resource, sys, time
+t0 = time.perf_counter()
+from app.main import app
+t_import = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+t_ready = asyncio.run(boot())
+with open("/proc/self/status") as status:
+    rss_kb = next((int(l.split()[1]) for l in status if l.startswith("VmRSS:")), 0)
+print(json.dumps({
+    "import_s": t_import - t0,
+    "startup_s": t_ready - t_import,
+    "ready_s": t_ready - t0,
+    "rss_mb": rss_kb / 1024,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "sdks_loaded": [m for m in ("openai", "anthropic") if m in sys.modules],
+}))
+"""
+
+
+def _importtime(env: dict) -> float:
+    """Cumulative import time of app.main in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == "app.main":
+            return int(parts[1]) / 1e6
+    raise RuntimeError("app.main not found in -X importtime output")
+
+
+def _boot(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _READY_SNIPPET],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _summary(samples: list[dict]) -> dict:
+    keys = ["import_s", "startup_s", "ready_s", "rss_mb", "max_rss_mb"]
+    return {
+        **{key: round(statistics.median(s[key] for s in samples), 4) for key in keys},
+        "sdks_loaded": samples[-1]["sdks_loaded"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": backend_dir,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/bench.db",
+        }
+        first_boot = _boot(env)
+        warm_boots = [_boot(env) for _ in range(args.runs)]
+        importtimes = [_importtime(env) for _ in range(args.runs)]
+
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "importtime_app_main_s": round(statistics.median(importtimes), 4),
+        "first_boot": _summary([first_boot]),
+        "migrated_boot": _summary(warm_boots),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Local stub of the upstream LLM APIs for offline benchmarking.
+
+Speaks the shapes the backend uses:
+- OpenAI chat/completions (plain and SSE streaming) and GET /v1/models
+- Anthropic messages (plain and SSE streaming)
+- Gemini generateContent / streamGenerateContent?alt=sse and GET /v1beta/models
+
+Latency is log-normal around --latency-ms; --error-rate and --rate-limit-rate
+inject 500s and 429s (with Retry-After). Point the backend at it with
+UPSTREAM_BASE_URL=http://127.0.0.1:9100.
+
+Prompt caching is simulated on the system prompt: a system prompt of at
+least 1024 tokens seen before is reported as cached (OpenAI
+`prompt_tokens_details.cached_tokens`; Anthropic `cache_read_input_tokens`
+/ `cache_creation_input_tokens` for blocks marked with cache_control), and
+--prefill-ms-per-1k adds latency only for the uncached prompt tokens.
+
+Usage (from backend/):
+    python -m bench.stub_server [--port 9100] [--latency-ms 800] [--error-rate 0.01]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+PROMPT_LINES = [
+    "Помоги мне составить еженедельный план работы для {role}, учитывая загрузку сотрудников и приоритетные задачи бизнеса.",
+    "Составь шаблон ответа клиенту на типичную жалобу, сохраняя вежливый тон и предлагая конкретное решение проблемы.",
+    "Проанализируй основные показатели за прошлый месяц и предложи три идеи, как улучшить результаты в следующем периоде.",
+    "Подготовь чек-лист ежедневных проверок для {role}, чтобы ничего важного не было упущено в течение рабочего дня.",
+    "Сформулируй вопросы для собеседования кандидата, которые помогут оценить его опыт и соответствие нашей команде.",
+    "Предложи пять идей для акции, которая привлечёт новых клиентов без значительного увеличения маркетингового бюджета.",
+    "Опиши пошаговый процесс обучения нового сотрудника в первую неделю, включая ключевые материалы и контрольные точки.",
+]
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    tokens_per_second: float = 80.0
+    prompts: int = 6
+    prefill_ms_per_1k: float = 0.0
+
+
+# Same minimum as the OpenAI and Anthropic prompt caches
+CACHE_MIN_TOKENS = 1024
+
+
+config = StubConfig()
+app = FastAPI(title="LLM stub")
+_cached_prefixes: set[str] = set()
+
+
+def _completion_text() -> str:
+    lines = random.sample(PROMPT_LINES, k=min(config.prompts, len(PROMPT_LINES)))
+    return "\n".join(line.format(role="сотрудника") for line in lines)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _budgeted(text: str, max_tokens) -> tuple[str, bool]:
+    """Cut text at max_tokens; returns (text, truncated)."""
+    if isinstance(max_tokens, int) and _tokens(text) > max_tokens:
+        return text[:max_tokens * 4], True
+    return text, False
+
+
+def _chunks(text: str) -> list[str]:
+    """Split into ~1-token pieces (4 characters)."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+async def _latency() -> None:
+    median = config.latency_ms / 1000
+    if median > 0:
+        await asyncio.sleep(median * math.exp(random.gauss(0, config.latency_sigma)))
+
+
+def _prefix_cache(prefix: str) -> tuple[int, int]:
+    """(cached, written) tokens for a cacheable prompt prefix."""
+    tokens = _tokens(prefix)
+    if tokens < CACHE_MIN_TOKENS:
+        return 0, 0
+    if prefix in _cached_prefixes:
+        return tokens, 0
+    _cached_prefixes.add(prefix)
+    return 0, tokens
+
+
+async def _prefill(uncached_tokens: int) -> None:
+    if config.prefill_ms_per_1k > 0:
+        await asyncio.sleep(uncached_tokens * config.prefill_ms_per_1k / 1_000_000)
+
+
+def _injected_failure():
+    """Return an error response to inject, or None."""
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse(
+            {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_error"}},
+            status_code=429,
+            headers={"Retry-After": str(config.retry_after), "x-ratelimit-remaining-requests": "0"},
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse({"error": {"message": "Internal error (stub)", "type": "api_error"}}, status_code=500)
+    return None
+
+
+def _sse(data: dict, event: str = "") -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _paced(pieces: list[str]):
+    delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+    for piece in pieces:
+        if delay:
+            await asyncio.sleep(delay)
+        yield piece
+
+
+@app.get("/v1/models")
+async def openai_models():
+    return {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    failure = _injected_failure()
+    await _latency()
+    if failure is not None:
+        return failure
+
+    text, truncated = _budgeted(_completion_text(), body.get("max_tokens"))
+    model = body.get("model", "stub-model")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    messages = body.get("messages", [])
+    prompt_tokens = _tokens(json.dumps(messages, ensure_ascii=False))
+    system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+    cached_tokens, _ = _prefix_cache(system)
+    await _prefill(prompt_tokens - cached_tokens)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": _tokens(text),
+        "total_tokens": prompt_tokens + _tokens(text),
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "length" if truncated else "stop",
+            }],
+            "usage": usage,
+        }
+
+    async def events():
+        async for piece in _paced(_chunks(text)):
+            yield _sse({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        yield _sse({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "length" if truncated else "stop"}],
+        })
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield _sse({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            })
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/messages")
+async def anthropic_messages(request: Request):
+    body = await request.json()
+    failure = _injected_failure()
+    await _latency()
+    if failure is not None:
+        return failure
+
+    text, truncated = _budgeted(_completion_text(), body.get("max_tokens"))
+    stop_reason = "max_tokens" if truncated else "end_turn"
+    model = body.get("model", "stub-model")
+    message_id = f"msg_{uuid.uuid4().hex[:12]}"
+    system = body.get("system", "")
+    input_tokens = _tokens(json.dumps(system, ensure_ascii=False)) + _tokens(json.dumps(body.get("messages", [])))
+    cached_tokens = written_tokens = 0
+    if isinstance(system, list):
+        # Only the blocks up to the last cache_control breakpoint are cached
+        marked = [i for i, block in enumerate(system) if block.get("cache_control")]
+        if marked:
+            prefix = "".join(block.get("text", "") for block in system[:marked[-1] + 1])
+            cached_tokens, written_tokens = _prefix_cache(prefix)
+    input_tokens -= cached_tokens + written_tokens
+    await _prefill(input_tokens + written_tokens)
+    usage = {
+        "input_tokens": input_tokens,
+        "cache_creation_input_tokens": written_tokens,
+        "cache_read_input_tokens": cached_tokens,
+    }
+
+    if not body.get("stream"):
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": text}],
+            "model": model,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": _tokens(text)},
+        }
+
+    async def events():
+        yield _sse({
+            "type": "message_start",
+            "message": {
+                "id": message_id, "type": "message", "role": "assistant", "content": [], "model": model,
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {**usage, "output_tokens": 1},
+            },
+        }, "message_start")
+        yield _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                   "content_block_start")
+        async for piece in _paced(_chunks(text)):
+            yield _sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}},
+                       "content_block_delta")
+        yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield _sse({
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": _tokens(text)},
+        }, "message_delta")
+        yield _sse({"type": "message_stop"}, "message_stop")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/v1beta/models")
+async def gemini_models():
+    return {"models": [{"name": "models/stub-model"}]}
+
+
+@app.post("/v1beta/models/{model_action:path}")
+async def gemini_generate(model_action: str, request: Request):
+    body = await request.json()
+    failure = _injected_failure()
+    await _latency()
+    if failure is not None:
+        return failure
+
+    max_tokens = (body.get("generationConfig") or {}).get("maxOutputTokens")
+    text, truncated = _budgeted(_completion_text(), max_tokens)
+
+    def payload(part: str, finished: bool) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": part}]}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "MAX_TOKENS" if truncated else "STOP"
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {"promptTokenCount": 200, "candidatesTokenCount": _tokens(text)},
+        }
+
+    if model_action.endswith(":streamGenerateContent"):
+        async def events():
+            pieces = _chunks(text)
+            index = 0
+            async for piece in _paced(pieces):
+                index += 1
+                yield _sse(payload(piece, index == len(pieces)))
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return payload(text, True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.stub_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma,
+                        help="Log-normal sigma of the latency (0 = constant)")
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="Share of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate,
+                        help="Share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=config.retry_after, help="Retry-After sent with 429s")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second,
+                        help="Streaming pace (0 = as fast as possible)")
+    parser.add_argument("--prompts", type=int, default=config.prompts, help="Prompt lines per completion")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=config.prefill_ms_per_1k,
+                        help="Extra latency per 1000 uncached prompt tokens")
+    args = parser.parse_args()
+
+    config.latency_ms = args.latency_ms
+    config.latency_sigma = args.latency_sigma
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.retry_after = args.retry_after
+    config.tokens_per_second = args.tokens_per_second
+    config.prompts = args.prompts
+    config.prefill_ms_per_1k = args.prefill_ms_per_1k
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+# Settings and the engine are created on import, so the test database has
+# to be configured before anything from app is imported
+_DATA_DIR = tempfile.mkdtemp(prefix="prompt-generator-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DATA_DIR}/test.db"
+os.environ["SHARED_STATE_PATH"] = f"{_DATA_DIR}/shared_state.db"
+os.environ["RETENTION_ARCHIVE_DIR"] = f"{_DATA_DIR}/archive"
+# Generations against the stub shouldn't wait on the upstream rate limiter
+os.environ["RATE_LIMIT_REQUESTS_PER_SECOND"] = "1000"
+os.environ["RATE_LIMIT_BURST"] = "1000"
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from app.config import get_settings
+from app.database import async_session, engine, init_db
+from app.models.cache import CachedGeneration
+from app.models.job import GenerationJob
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.models.template import PromptTemplate
+from app.services import cache, http_clients
+from bench import stub_server
+
+STUB_URL = "http://stub.test"
+
+
+class StubUpstream(httpx.ASGITransport):
+    """The benchmark stub (bench/stub_server.py) in-process; records the requests it answers."""
+
+    def __init__(self, config: stub_server.StubConfig):
+        super().__init__(app=stub_server.app)
+        self.config = config
+        self.requests: list[httpx.Request] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return await super().handle_async_request(request)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Migrated test database, emptied after the test."""
+    await init_db()
+    yield
+    async with async_session() as session:
+        await session.execute(delete(GeneratedPrompt))
+        await session.execute(delete(PromptRequest))
+        await session.execute(delete(GenerationJob))
+        await session.execute(delete(PromptTemplate))
+        await session.execute(delete(CachedGeneration))
+        await session.commit()
+    # Pooled connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def stub(monkeypatch):
+    """
+    Every provider answered by the benchmark stub without latency, with a
+    fresh response cache. Change `stub.config` to inject errors or delays.
+    """
+    upstream = StubUpstream(stub_server.StubConfig(latency_ms=0, tokens_per_second=0, prompts=5))
+    registry = http_clients.ClientRegistry(http2=False, base_url_override=STUB_URL, transport=upstream)
+    monkeypatch.setattr(stub_server, "config", upstream.config)
+    monkeypatch.setattr(get_settings(), "upstream_base_url", STUB_URL)
+    monkeypatch.setattr(http_clients, "_registry", registry)
+    monkeypatch.setattr(cache, "_cache", None)
+    yield upstream
+    await registry.aclose()
+
+
+@pytest.fixture
+async def api(db):
+    """HTTP client for the app (without its lifespan: no background tasks)."""
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
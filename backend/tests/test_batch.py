@@ -0,0 +1,94 @@
+import json
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import func, select
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.services import persistence
+
+pytestmark = pytest.mark.anyio
+
+ROLES = ["Повар", "Официант", "Бармен", "Администратор", "Сомелье", "Менеджер"]
+
+
+def _items(count: int = len(ROLES)) -> list[dict]:
+    return [
+        {"business": "Ресторан грузинской кухни", "role": role, "provider": "groq", "api_key": "gsk-test"}
+        for role in ROLES[:count]
+    ]
+
+
+async def _stored_roles() -> list[str]:
+    async with async_session() as session:
+        return sorted((await session.execute(select(PromptRequest.role))).scalars().all())
+
+
+async def test_results_are_in_request_order(api, stub):
+    # Log-normal latency finishes the items out of order
+    stub.config.latency_ms = 20
+    stub.config.latency_sigma = 1.0
+
+    response = await api.post("/api/generate/batch", json={"items": _items()})
+
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == list(range(len(ROLES)))
+    assert [result["result"]["role"] for result in results] == ROLES
+
+
+async def test_failed_item_does_not_fail_the_batch(api, stub):
+    items = _items(3)
+    items[1]["template_id"] = str(uuid4())
+
+    response = await api.post("/api/generate/batch", json={"items": items})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[1]["error"] == "Шаблон не найден"
+    assert await _stored_roles() == sorted([ROLES[0], ROLES[2]])
+
+
+async def test_streamed_batch_ends_with_the_saved_count(api, stub):
+    items = _items(3)
+    items[2]["template_id"] = str(uuid4())
+
+    response = await api.post("/api/generate/batch", json={"items": items, "stream": True})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert lines[-1] == {"done": True, "saved": 2}
+
+
+async def test_results_are_saved_in_one_transaction(api, stub, monkeypatch):
+    saves = []
+    save_generations = persistence.save_generations
+
+    async def counted(session, results):
+        saves.append(len(results))
+        await save_generations(session, results)
+
+    monkeypatch.setattr(persistence, "save_generations", counted)
+
+    await api.post("/api/generate/batch", json={"items": _items()})
+
+    assert saves == [len(ROLES)]
+    assert await _stored_roles() == sorted(ROLES)
+
+
+async def test_failed_save_stores_nothing(api, stub, monkeypatch):
+    bulk_insert = persistence.bulk_insert
+
+    async def prompts_fail(session, table, rows):
+        if table is GeneratedPrompt.__table__:
+            raise RuntimeError("disk I/O error")
+        await bulk_insert(session, table, rows)
+
+    monkeypatch.setattr(persistence, "bulk_insert", prompts_fail)
+
+    response = await api.post("/api/generate/batch", json={"items": _items()})
+
+    assert response.status_code == 500
+    async with async_session() as session:
+        assert await session.scalar(select(func.count()).select_from(PromptRequest)) == 0
@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.services import cache
+from app.services.cache import ResponseCache
+from app.services.metrics import ERRORS
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "business": "Кофейня у метро, три бариста, завтраки навынос",
+    "role": "Бариста",
+    "provider": "openrouter",
+    "api_key": "sk-test",
+}
+
+
+@pytest.fixture
+def broken_cache(stub, monkeypatch):
+    """A persistent response cache whose database tier is locked."""
+    async def locked(*args):
+        raise OperationalError("SELECT", {}, sqlite3.OperationalError("database is locked"))
+
+    response_cache = ResponseCache(max_entries=16, ttl=60, persistent=True)
+    monkeypatch.setattr(response_cache, "_db_get", locked)
+    monkeypatch.setattr(response_cache, "_db_set", locked)
+    monkeypatch.setattr(cache, "_cache", response_cache)
+    return response_cache
+
+
+async def test_identical_request_is_served_from_cache(api, stub):
+    first = await api.post("/api/generate", json=REQUEST)
+    second = await api.post("/api/generate", json=REQUEST)
+
+    assert first.headers["X-Cache"] == "MISS" and not first.json()["cached"]
+    assert second.headers["X-Cache"] == "HIT" and second.json()["cached"]
+    assert second.json()["prompts"] == first.json()["prompts"]
+    assert len(stub.requests) == 1
+
+
+async def test_system_prompt_is_part_of_the_key(api, stub):
+    await api.post("/api/generate", json=REQUEST)
+    other = await api.post("/api/generate", json={**REQUEST, "system_prompt": "Пиши кратко для {role}."})
+
+    assert not other.json()["cached"]
+    assert len(stub.requests) == 2
+
+
+@pytest.mark.parametrize("refresh", [
+    {"json": {**REQUEST, "cache": "refresh"}},
+    {"headers": {"Cache-Control": "no-cache"}},
+])
+async def test_refresh_regenerates_and_stores(api, stub, refresh):
+    await api.post("/api/generate", json=REQUEST)
+
+    refreshed = await api.post("/api/generate", **{"json": REQUEST, **refresh})
+    after = await api.post("/api/generate", json=REQUEST)
+
+    assert not refreshed.json()["cached"]
+    assert len(stub.requests) == 2
+    assert after.json()["cached"]
+    assert after.json()["prompts"] == refreshed.json()["prompts"]
+
+
+@pytest.mark.parametrize("bypass", [
+    {"json": {**REQUEST, "cache": "bypass"}},
+    {"headers": {"Cache-Control": "no-store"}},
+])
+async def test_bypass_neither_reads_nor_writes(api, stub, bypass):
+    bypassed = await api.post("/api/generate", **{"json": REQUEST, **bypass})
+    plain = await api.post("/api/generate", json=REQUEST)
+    bypassed_again = await api.post("/api/generate", **{"json": REQUEST, **bypass})
+
+    assert not bypassed.json()["cached"]
+    assert not plain.json()["cached"]
+    assert not bypassed_again.json()["cached"]
+    assert len(stub.requests) == 3
+    assert cache.get_response_cache().stats()["bypasses"] == 2
+
+
+async def test_persistent_tier_survives_the_memory_tier(api, stub, monkeypatch):
+    response_cache = ResponseCache(max_entries=16, ttl=60, persistent=True)
+    monkeypatch.setattr(cache, "_cache", response_cache)
+
+    first = await api.post("/api/generate", json=REQUEST)
+    response_cache._memory.clear()
+    second = await api.post("/api/generate", json=REQUEST)
+
+    assert second.json()["cached"]
+    assert second.json()["prompts"] == first.json()["prompts"]
+    assert response_cache.stats()["db_hits"] == 1
+    assert len(stub.requests) == 1
+
+
+async def test_failing_cache_tier_does_not_fail_generation(api, stub, broken_cache):
+    errors = ERRORS.labels("cache", "OperationalError")
+    before = errors._value.get()
+
+    first = await api.post("/api/generate", json=REQUEST)
+    second = await api.post("/api/generate", json=REQUEST)
+
+    assert first.status_code == 200
+    assert len(first.json()["prompts"]) == 5
+    assert not first.json()["cached"]
+    # The memory tier still works in front of the broken one
+    assert second.json()["cached"]
+    assert second.json()["prompts"] == first.json()["prompts"]
+    assert len(stub.requests) == 1
+    assert errors._value.get() - before == 2
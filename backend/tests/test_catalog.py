@@ -0,0 +1,49 @@
+import pytest
+
+from app.schemas.prompt import PROVIDER_MODELS, ProviderEnum
+from app.services.catalog import refresh_catalog
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path", ["/api/providers", "/api/providers/groq"])
+async def test_matching_etag_is_not_modified(api, path):
+    first = await api.get(path)
+    etag = first.headers["etag"]
+
+    for if_none_match in [etag, f"W/{etag}", f'"stale", {etag}', "*"]:
+        revalidated = await api.get(path, headers={"If-None-Match": if_none_match})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+        assert revalidated.headers["cache-control"] == first.headers["cache-control"]
+
+
+async def test_stale_etag_gets_the_body(api):
+    response = await api.get("/api/providers", headers={"If-None-Match": '"stale"'})
+
+    assert response.status_code == 200
+    assert [provider["value"] for provider in response.json()] == [provider.value for provider in ProviderEnum]
+
+
+async def test_providers_have_their_own_etags(api):
+    etags = {(await api.get(f"/api/providers/{provider.value}")).headers["etag"] for provider in ProviderEnum}
+    etags.add((await api.get("/api/providers")).headers["etag"])
+
+    assert len(etags) == len(ProviderEnum) + 1
+
+
+async def test_changed_models_change_the_etag(api, monkeypatch):
+    before = await api.get("/api/providers/groq")
+    models = [*PROVIDER_MODELS[ProviderEnum.groq], {"id": "groq-test-model", "name": "Test model"}]
+    monkeypatch.setitem(PROVIDER_MODELS, ProviderEnum.groq, models)
+    refresh_catalog()
+    try:
+        after = await api.get("/api/providers/groq", headers={"If-None-Match": before.headers["etag"]})
+    finally:
+        monkeypatch.undo()
+        refresh_catalog()
+
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert after.json()["models"][-1]["id"] == "groq-test-model"
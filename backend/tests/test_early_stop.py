@@ -0,0 +1,98 @@
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.config import get_settings
+from app.schemas.prompt import PROVIDER_MODELS, ProviderEnum
+from app.services.ai_service import END_MARKER, PromptStreamParser, generate_prompts, prompt_lines
+from bench import stub_server
+
+pytestmark = pytest.mark.anyio
+
+MODEL = PROVIDER_MODELS[ProviderEnum.groq][0]["id"]
+PROMPTS = [
+    "Составь план смены для кассира",
+    "Подготовь ответ на отзыв покупателя",
+    "Предложи идею акции выходного дня",
+]
+CHATTER = "Надеюсь, эти промпты помогут вашему бизнесу. " * 6
+
+
+def _early_stops() -> float:
+    return REGISTRY.get_sample_value("early_stops_total", {"provider": "groq", "model": MODEL}) or 0.0
+
+
+@pytest.fixture
+def answer(stub, monkeypatch):
+    """Make the stub answer with the given text."""
+    def set_answer(text: str) -> None:
+        monkeypatch.setattr(stub_server, "_completion_text", lambda: text)
+
+    return set_answer
+
+
+async def _generate() -> list[str]:
+    prompts, _ = await generate_prompts(ProviderEnum.groq, "gsk-test", MODEL, "Супермаркет у дома", "Кассир")
+    return prompts
+
+
+def test_parser_stops_at_the_end_marker():
+    parser = PromptStreamParser()
+
+    completed = parser.feed(f"{PROMPTS[0]}\n{PROMPTS[1]}{END_MARKER}\n{PROMPTS[2]}\n")
+
+    assert completed == [(0, PROMPTS[0]), (1, PROMPTS[1])]
+    assert parser.done
+    assert parser.close() == []
+    assert prompt_lines(f"{PROMPTS[0]}\n{END_MARKER}\n{PROMPTS[1]}") == [PROMPTS[0]]
+
+
+async def test_prompts_after_the_end_marker_are_dropped(answer):
+    answer("\n".join([*PROMPTS[:2], END_MARKER, PROMPTS[2]]))
+
+    assert await _generate() == PROMPTS[:2]
+
+
+async def test_stop_sequence_is_requested(stub):
+    await _generate()
+
+    body = json.loads(stub.requests[0].content)
+    assert body["stop"] == [END_MARKER]
+    assert END_MARKER in body["messages"][-1]["content"]
+
+
+async def test_stop_sequence_can_be_turned_off(stub, monkeypatch):
+    monkeypatch.setattr(get_settings(), "stop_sequences", False)
+
+    await _generate()
+
+    body = json.loads(stub.requests[0].content)
+    assert "stop" not in body
+    assert END_MARKER not in body["messages"][-1]["content"]
+
+
+async def test_short_tail_after_the_marker_is_read_to_the_end(answer):
+    answer("\n".join([*PROMPTS, END_MARKER, "Удачи!"]))
+    before = _early_stops()
+
+    assert await _generate() == PROMPTS
+    assert _early_stops() == before
+
+
+async def test_long_tail_after_the_marker_is_cut_off(answer):
+    answer("\n".join([*PROMPTS, END_MARKER, CHATTER]))
+    before = _early_stops()
+
+    assert await _generate() == PROMPTS
+    assert _early_stops() == before + 1
+
+
+async def test_stream_is_cut_off_after_five_prompts_without_a_marker(answer):
+    answer("\n".join([*(f"{n}. {PROMPTS[n % 3]}" for n in range(1, 6)), CHATTER]))
+    before = _early_stops()
+
+    prompts = await _generate()
+
+    assert len(prompts) == 5
+    assert _early_stops() == before + 1
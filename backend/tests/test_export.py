@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.schemas.history import ExportFormat
+from app.services.export import export_history
+from app.services.persistence import PendingGeneration, bulk_insert, save_generations
+
+pytestmark = pytest.mark.anyio
+
+GENERATIONS = {
+    f"Пекарня номер {n}": [f"Промпт {letter} для пекарни {n}" for letter in "ДГВБА"]
+    for n in range(20)
+}
+
+
+async def _export(export_format: ExportFormat) -> str:
+    return b"".join([chunk async for chunk in export_history(export_format)]).decode("utf-8")
+
+
+@pytest.fixture
+async def history(db):
+    async with async_session() as session:
+        await save_generations(session, [
+            PendingGeneration(business, "Пекарь", prompts) for business, prompts in GENERATIONS.items()
+        ])
+
+
+async def test_ndjson_keeps_generation_order(history):
+    records = [json.loads(line) for line in (await _export(ExportFormat.ndjson)).splitlines()]
+
+    assert {record["business"]: record["prompts"] for record in records} == GENERATIONS
+
+
+async def test_csv_prompt_index_is_the_generation_position(history):
+    rows = list(csv.DictReader(io.StringIO(await _export(ExportFormat.csv))))
+
+    assert len(rows) == 100
+    for row in rows:
+        assert GENERATIONS[row["business"]][int(row["prompt_index"])] == row["prompt"]
+
+
+async def test_order_does_not_depend_on_storage_order(db):
+    request_id = uuid4()
+    created_at = datetime(2026, 1, 1)
+    prompts = [f"Промпт {n}" for n in range(5)]
+    async with async_session() as session:
+        await bulk_insert(session, PromptRequest.__table__, [{
+            "id": request_id,
+            "business_description": "Кондитерская",
+            "role": "Кондитер",
+            "created_at": created_at,
+        }])
+        await bulk_insert(session, GeneratedPrompt.__table__, [
+            {
+                "id": uuid4(),
+                "request_id": request_id,
+                "content": prompt,
+                "created_at": created_at + timedelta(seconds=position),
+            }
+            for position, prompt in reversed(list(enumerate(prompts)))
+        ])
+        await session.commit()
+
+    record = json.loads(await _export(ExportFormat.ndjson))
+    assert record["prompts"] == prompts
@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "business": "Школа английского для детей",
+    "role": "Методист",
+    "provider": "groq",
+    "api_key": "gsk-test",
+    "fallbacks": [{"provider": "google", "api_key": "AIza-test"}],
+    "cache": "bypass",
+}
+# groq speaks the OpenAI API to the stub, google the Gemini one
+PRIMARY_PATH = "/v1/chat/completions"
+
+
+class Primary:
+    """Makes the stub's answers for the primary provider fail or hang."""
+
+    def __init__(self, stub, monkeypatch, status: int = 0, delay: float = 0):
+        self.started = 0
+        self.cancelled = 0
+        handle = stub.handle_async_request
+
+        async def handle_async_request(request: httpx.Request) -> httpx.Response:
+            if request.url.path != PRIMARY_PATH:
+                return await handle(request)
+            self.started += 1
+            if status:
+                return httpx.Response(status, json={"error": {"message": "stub"}})
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return await handle(request)
+
+        monkeypatch.setattr(stub, "handle_async_request", handle_async_request)
+
+
+def _paths(stub) -> list[str]:
+    return [request.url.path for request in stub.requests]
+
+
+async def test_failover_moves_on_after_an_error(api, stub, monkeypatch):
+    primary = Primary(stub, monkeypatch, status=401)
+
+    response = await api.post("/api/generate", json=REQUEST)
+
+    assert response.status_code == 200
+    assert response.json()["served_by"] == "google"
+    assert len(response.json()["prompts"]) == 5
+    assert primary.started == 1
+
+
+async def test_failover_moves_on_after_the_attempt_timeout(api, stub, monkeypatch):
+    primary = Primary(stub, monkeypatch, delay=5)
+
+    response = await api.post("/api/generate", json={**REQUEST, "attempt_timeout_ms": 100})
+
+    assert response.json()["served_by"] == "google"
+    assert primary.cancelled == 1
+
+
+async def test_hedge_cancels_the_slower_attempt(api, stub, monkeypatch):
+    primary = Primary(stub, monkeypatch, delay=5)
+
+    response = await api.post("/api/generate", json={**REQUEST, "fallback_mode": "hedge", "hedge_delay_ms": 50})
+
+    assert response.json()["served_by"] == "google"
+    assert primary.started == 1
+    assert primary.cancelled == 1
+
+
+async def test_hedge_is_not_started_when_the_primary_answers_in_time(api, stub, monkeypatch):
+    primary = Primary(stub, monkeypatch)
+
+    response = await api.post("/api/generate", json={**REQUEST, "fallback_mode": "hedge", "hedge_delay_ms": 5000})
+
+    assert response.json()["served_by"] == "groq"
+    assert primary.started == 1
+    assert _paths(stub) == [PRIMARY_PATH]
+
+
+async def test_hedge_starts_the_next_entry_at_once_after_an_error(api, stub, monkeypatch):
+    Primary(stub, monkeypatch, status=401)
+
+    response = await asyncio.wait_for(
+        api.post("/api/generate", json={**REQUEST, "fallback_mode": "hedge", "hedge_delay_ms": 60000}), 5
+    )
+
+    assert response.json()["served_by"] == "google"
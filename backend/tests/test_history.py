@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.routers.history import get_history
+from app.services.persistence import bulk_insert
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_page_prompts_do_not_depend_on_storage_order(db):
+    created_at = datetime(2026, 1, 1)
+    requests = {uuid4(): [f"Промпт {n} для #{index}" for n in range(5)] for index in range(3)}
+    async with async_session() as session:
+        await bulk_insert(session, PromptRequest.__table__, [
+            {
+                "id": request_id,
+                "business_description": f"Кондитерская #{index}",
+                "role": "Кондитер",
+                "created_at": created_at + timedelta(minutes=index),
+            }
+            for index, request_id in enumerate(requests)
+        ])
+        await bulk_insert(session, GeneratedPrompt.__table__, [
+            {
+                "id": uuid4(),
+                "request_id": request_id,
+                "content": prompt,
+                "created_at": created_at + timedelta(seconds=position),
+            }
+            for request_id, prompts in reversed(requests.items())
+            for position, prompt in reversed(list(enumerate(prompts)))
+        ])
+        await session.commit()
+
+    async with async_session() as session:
+        page = await get_history(limit=2, cursor=None, session=session)
+        rest = await get_history(limit=2, cursor=page.next_cursor, session=session)
+
+    assert {item.id: item.prompts for item in page.items + rest.items} == requests
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+from app.schemas.prompt import ProviderEnum
+from app.services import ai_service
+from app.services.http_clients import ClientRegistry
+from app.services.rate_limit import AdaptiveLimiter
+
+pytestmark = pytest.mark.anyio
+
+KEYS = {"alice": "sk-alice-0001", "bob": "sk-bob-0002"}
+
+CHAT_COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "m",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+RESPONSES = {
+    ProviderEnum.openai: CHAT_COMPLETION,
+    ProviderEnum.groq: CHAT_COMPLETION,
+    ProviderEnum.anthropic: {
+        "id": "msg_1",
+        "type": "message",
+        "role": "assistant",
+        "model": "m",
+        "content": [{"type": "text", "text": "ok"}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 1},
+    },
+    ProviderEnum.google: {
+        "candidates": [{"content": {"parts": [{"text": "ok"}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1},
+    },
+}
+KEY_HEADERS = {
+    ProviderEnum.openai: "authorization",
+    ProviderEnum.groq: "authorization",
+    ProviderEnum.anthropic: "x-api-key",
+    ProviderEnum.google: "x-goog-api-key",
+}
+
+
+@pytest.fixture
+def seen(monkeypatch):
+    """Requests sent through a mocked registry, answered out of order."""
+    requests: list[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        # Chosen by key header: the SDKs' base URLs can be moved by environment variables
+        if "x-goog-api-key" in request.headers:
+            return httpx.Response(200, json=RESPONSES[ProviderEnum.google])
+        if "x-api-key" in request.headers:
+            return httpx.Response(200, json=RESPONSES[ProviderEnum.anthropic])
+        return httpx.Response(200, json=CHAT_COMPLETION)
+
+    registry = ClientRegistry(transport=httpx.MockTransport(handler))
+    limiters = {}
+    monkeypatch.setattr(ai_service, "get_client_registry", lambda: registry)
+    monkeypatch.setattr(
+        ai_service,
+        "get_rate_limiter",
+        lambda provider, api_key: limiters.setdefault(
+            (provider, api_key), AdaptiveLimiter(rate=10000.0, burst=1000, max_concurrency=100)
+        ),
+    )
+    return requests
+
+
+async def _generate(provider: ProviderEnum, owner: str):
+    business = f"Кофейня клиента {owner}"
+    if provider == ProviderEnum.openai:
+        return await ai_service.generate_with_openai(KEYS[owner], "m", business, "Менеджер")
+    if provider == ProviderEnum.anthropic:
+        return await ai_service.generate_with_anthropic(KEYS[owner], "m", business, "Менеджер")
+    if provider == ProviderEnum.google:
+        return await ai_service.generate_with_google(KEYS[owner], "m", business, "Менеджер")
+    return await ai_service.generate_with_http(
+        ai_service.provider_url(provider), KEYS[owner], "m", business, "Менеджер", provider
+    )
+
+
+@pytest.mark.parametrize("provider", list(KEY_HEADERS))
+async def test_concurrent_calls_carry_only_their_own_key(seen, provider):
+    owners = ["alice", "bob"] * 20
+    random.shuffle(owners)
+
+    completions = await asyncio.gather(*(_generate(provider, owner) for owner in owners))
+
+    assert [completion.text for completion in completions] == ["ok"] * len(owners)
+    assert len(seen) == len(owners)
+    for request in seen:
+        body = json.dumps(json.loads(request.content), ensure_ascii=False)
+        owner = "alice" if "клиента alice" in body else "bob"
+        other = next(name for name in KEYS if name != owner)
+
+        assert KEYS[owner] in request.headers[KEY_HEADERS[provider]]
+        assert KEYS[other] not in str(request.url)
+        assert all(KEYS[other] not in value for value in request.headers.values())
+
+
+async def test_google_key_is_sent_in_header_not_url(seen):
+    await _generate(ProviderEnum.google, "alice")
+
+    request = seen[0]
+    assert request.headers["x-goog-api-key"] == KEYS["alice"]
+    assert "key" not in request.url.params
+    assert KEYS["alice"] not in str(request.url)
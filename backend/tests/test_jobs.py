@@ -0,0 +1,259 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import text
+
+from app.config import get_settings
+from app.database import async_session
+from app.services import credentials, jobs
+from app.services.jobs import JobRunner, WebhookNotAllowed, resolve_webhook
+
+pytestmark = pytest.mark.anyio
+
+API_KEY = "sk-job-secret-0123456789"
+FALLBACK_KEY = "sk-job-fallback-9876543210"
+REQUEST = {
+    "business": "Ветеринарная клиника с круглосуточным стационаром",
+    "role": "Администратор",
+    "provider": "openrouter",
+    "api_key": API_KEY,
+    "fallbacks": [{"provider": "groq", "api_key": FALLBACK_KEY}],
+}
+
+
+def _runner(transport: httpx.AsyncBaseTransport = None, webhook_retries: int = 0) -> JobRunner:
+    runner = JobRunner(
+        workers=1,
+        poll_interval=0.05,
+        lease_seconds=60,
+        max_attempts=3,
+        webhook_timeout=1,
+        webhook_retries=webhook_retries,
+    )
+    runner._client = httpx.AsyncClient(transport=transport or httpx.MockTransport(lambda r: httpx.Response(204)))
+    return runner
+
+
+async def _stored_row(job_id: str) -> str:
+    async with async_session() as session:
+        row = (await session.execute(
+            text("SELECT * FROM generation_jobs WHERE id = :id"), {"id": job_id.replace("-", "")}
+        )).mappings().one()
+    return json.dumps({key: str(value) for key, value in row.items()}, ensure_ascii=False)
+
+
+async def _set(job_id: str, **values) -> None:
+    assignments = ", ".join(f"{name} = :{name}" for name in values)
+    async with async_session() as session:
+        await session.execute(
+            text(f"UPDATE generation_jobs SET {assignments} WHERE id = :id"), {"id": job_id.replace("-", ""), **values}
+        )
+        await session.commit()
+
+
+async def _attempts(job_id: str) -> int:
+    async with async_session() as session:
+        return await session.scalar(
+            text("SELECT attempts FROM generation_jobs WHERE id = :id"), {"id": job_id.replace("-", "")}
+        )
+
+
+async def _run_next(runner: JobRunner) -> None:
+    job = await runner._claim()
+    await runner._process(job)
+
+
+async def test_api_keys_never_reach_the_row_in_plaintext(api, stub):
+    job_id = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+
+    queued = await _stored_row(job_id)
+    assert API_KEY not in queued and FALLBACK_KEY not in queued
+    assert '"credentials": "None"' not in queued
+
+    await _run_next(_runner())
+
+    finished = await _stored_row(job_id)
+    assert API_KEY not in finished and FALLBACK_KEY not in finished
+    assert '"credentials": "None"' in finished
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["status"] == "succeeded"
+    assert stub.requests[0].headers["authorization"] == f"Bearer {API_KEY}"
+
+
+async def test_job_fails_when_its_keys_can_no_longer_be_opened(api, stub, monkeypatch):
+    job_id = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+    # A restart without JOB_KEY_SECRET: the process has a new random secret
+    monkeypatch.setattr(credentials, "_box", Fernet(Fernet.generate_key()))
+
+    await _run_next(_runner())
+
+    job = (await api.get(f"/api/jobs/{job_id}")).json()
+    assert job["status"] == "failed"
+    assert "отправьте задание заново" in job["error"]
+    assert stub.requests == []
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook",
+    "http://10.0.0.5/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://localhost/hook",
+])
+async def test_webhooks_to_internal_addresses_are_rejected(api, url):
+    response = await api.post("/api/jobs", json={**REQUEST, "webhook_url": url})
+
+    assert response.status_code == 400
+    with pytest.raises(WebhookNotAllowed):
+        await resolve_webhook(url)
+
+
+async def test_webhook_allow_list(monkeypatch):
+    monkeypatch.setattr(get_settings(), "job_webhook_allowed_hosts", "hooks.internal, ci.example.com")
+
+    assert await resolve_webhook("http://hooks.internal/done") is None
+    with pytest.raises(WebhookNotAllowed):
+        await resolve_webhook("https://example.org/done")
+
+
+async def test_webhook_is_sent_to_the_checked_address(api, stub, monkeypatch):
+    async def public(url):
+        return ["93.184.216.34"]
+
+    deliveries = []
+
+    def receive(request: httpx.Request) -> httpx.Response:
+        deliveries.append(request)
+        return httpx.Response(204)
+
+    job_id = (await api.post("/api/jobs", json={**REQUEST, "webhook_url": "https://93.184.216.34/done"})).json()["id"]
+    # The name now resolves elsewhere; delivery re-checks and pins the address
+    monkeypatch.setattr("app.services.jobs.resolve_webhook", public)
+    async with async_session() as session:
+        await session.execute(
+            text("UPDATE generation_jobs SET webhook_url = 'https://hooks.example.com/done' WHERE id = :id"),
+            {"id": job_id.replace("-", "")},
+        )
+        await session.commit()
+
+    await _run_next(_runner(httpx.MockTransport(receive)))
+
+    [delivery] = deliveries
+    assert delivery.url == "https://93.184.216.34/done"
+    assert delivery.headers["host"] == "hooks.example.com"
+    assert delivery.extensions["sni_hostname"] == "hooks.example.com"
+    assert json.loads(delivery.content)["id"] == job_id
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["webhook_status"] == "delivered"
+
+
+async def test_jobs_are_claimed_oldest_first(api, stub):
+    first = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+    await api.post("/api/jobs", json=REQUEST)
+
+    job = await _runner()._claim()
+
+    assert str(job.id) == first
+    assert (await api.get(f"/api/jobs/{first}")).json()["status"] == "running"
+
+
+async def test_concurrent_claims_take_different_jobs(api, stub):
+    submitted = [(await api.post("/api/jobs", json=REQUEST)).json()["id"] for _ in range(2)]
+
+    claimed = await asyncio.gather(*(_runner()._claim() for _ in range(3)))
+
+    assert sorted(str(job.id) for job in claimed if job is not None) == sorted(submitted)
+    assert await _runner()._claim() is None
+
+
+async def test_expired_lease_is_claimed_again(api, stub):
+    job_id = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+    await _set(job_id, status="running", attempts=1, lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    await _run_next(_runner())
+
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["status"] == "succeeded"
+    assert await _attempts(job_id) == 2
+
+
+async def test_job_interrupted_too_often_fails(api, stub):
+    job_id = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+    await _set(job_id, status="running", attempts=3, lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    await _run_next(_runner())
+
+    job = (await api.get(f"/api/jobs/{job_id}")).json()
+    assert job["status"] == "failed" and job["error"] == "Задание прерывалось слишком много раз"
+    assert stub.requests == []
+
+
+async def test_running_jobs_are_requeued_on_shutdown(api, stub):
+    stub.config.latency_ms = 5000
+    stub.config.latency_sigma = 0
+    job_id = (await api.post("/api/jobs", json=REQUEST)).json()["id"]
+    runner = _runner()
+    runner.start()
+    for _ in range(100):
+        if (await api.get(f"/api/jobs/{job_id}")).json()["status"] == "running":
+            break
+        await asyncio.sleep(0.01)
+    else:
+        pytest.fail("the job was not picked up")
+
+    await runner.stop()
+
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["status"] == "queued"
+    assert await _attempts(job_id) == 0
+    # The keys are still there for whoever runs it next
+    stub.config.latency_ms = 0
+    await _run_next(_runner())
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["status"] == "succeeded"
+
+
+async def test_full_queue_is_rejected(api, monkeypatch):
+    monkeypatch.setattr(get_settings(), "job_max_queued", 1)
+
+    assert (await api.post("/api/jobs", json=REQUEST)).status_code == 202
+    assert (await api.post("/api/jobs", json=REQUEST)).status_code == 503
+
+
+async def test_webhook_receives_the_finished_job(api, stub, monkeypatch):
+    monkeypatch.setattr(get_settings(), "job_webhook_allowed_hosts", "hooks.test")
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt: 0)
+    answers = [httpx.Response(503), httpx.Response(200)]
+    deliveries = []
+
+    def receive(request: httpx.Request) -> httpx.Response:
+        deliveries.append(request)
+        return answers.pop(0)
+
+    job_id = (await api.post("/api/jobs", json={**REQUEST, "webhook_url": "http://hooks.test/done"})).json()["id"]
+
+    await _run_next(_runner(httpx.MockTransport(receive), webhook_retries=2))
+
+    job = (await api.get(f"/api/jobs/{job_id}")).json()
+    assert len(deliveries) == 2
+    assert str(deliveries[-1].url) == "http://hooks.test/done"
+    delivered = json.loads(deliveries[-1].content)
+    assert delivered == {**job, "webhook_status": None}
+    assert delivered["status"] == "succeeded" and len(delivered["result"]["prompts"]) == 5
+    assert job["webhook_status"] == "delivered"
+    assert API_KEY not in deliveries[-1].content.decode()
+
+
+async def test_rejected_webhook_is_not_retried(api, stub, monkeypatch):
+    monkeypatch.setattr(get_settings(), "job_webhook_allowed_hosts", "hooks.test")
+    deliveries = []
+
+    def receive(request: httpx.Request) -> httpx.Response:
+        deliveries.append(request)
+        return httpx.Response(404)
+
+    job_id = (await api.post("/api/jobs", json={**REQUEST, "webhook_url": "http://hooks.test/done"})).json()["id"]
+
+    await _run_next(_runner(httpx.MockTransport(receive), webhook_retries=3))
+
+    assert len(deliveries) == 1
+    assert (await api.get(f"/api/jobs/{job_id}")).json()["webhook_status"] == "failed"
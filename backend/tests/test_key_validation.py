@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.config import get_settings
+from app.schemas.prompt import ProviderEnum
+from app.services import key_validation
+from app.services.cache import TTLCache
+from app.services.key_validation import check_api_key
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def results(monkeypatch):
+    results = TTLCache(100, 600)
+    monkeypatch.setattr(key_validation, "_results", results)
+    return results
+
+
+async def _check_twice(provider: ProviderEnum = ProviderEnum.groq) -> list[bool]:
+    return [(await check_api_key(provider, "gsk-test"))[1] for _ in range(2)]
+
+
+@pytest.mark.parametrize("status", [401, 403])
+async def test_rejected_key_is_cached(monkeypatch, status):
+    calls = []
+
+    async def rejected(provider, api_key):
+        calls.append(api_key)
+        return {"success": False, "message": "Неверный API ключ", "status": status}
+
+    monkeypatch.setattr(key_validation, "test_api_key", rejected)
+
+    assert await _check_twice() == [False, True]
+    assert len(calls) == 1
+    result, _ = await check_api_key(ProviderEnum.groq, "gsk-test")
+    assert result == {"success": False, "message": "Неверный API ключ"}
+
+
+@pytest.mark.parametrize("injected", ["rate_limit_rate", "error_rate"])
+async def test_transient_failure_is_not_cached(stub, injected):
+    setattr(stub.config, injected, 1.0)
+
+    assert await _check_twice() == [False, False]
+    assert len(stub.requests) == 2
+
+    setattr(stub.config, injected, 0.0)
+    result, cached = await check_api_key(ProviderEnum.groq, "gsk-test")
+    assert result["success"] and not cached
+
+
+async def test_timeout_is_not_cached(monkeypatch):
+    calls = []
+
+    async def timed_out(provider, api_key):
+        calls.append(api_key)
+        return {"success": False, "message": "Превышено время ожидания"}
+
+    monkeypatch.setattr(key_validation, "test_api_key", timed_out)
+
+    assert await _check_twice() == [False, False]
+    assert len(calls) == 2
+
+
+async def test_endpoint_serves_the_cached_result(api, stub):
+    first = await api.post("/api/test-api", json={"provider": "groq", "api_key": "gsk-test"})
+    second = await api.post("/api/test-api", json={"provider": "groq", "api_key": "gsk-test"})
+
+    assert first.json()["success"] and not first.json()["cached"]
+    assert second.json() == {**first.json(), "cached": True}
+    assert len(stub.requests) == 1
+
+
+async def test_result_expires_after_its_ttl(stub, monkeypatch):
+    monkeypatch.setattr(get_settings(), "key_check_success_ttl", 0.05)
+
+    assert await _check_twice() == [False, True]
+    await asyncio.sleep(0.1)
+    assert await _check_twice() == [False, True]
+    assert len(stub.requests) == 2
+
+
+async def test_zero_ttl_disables_caching(stub, monkeypatch):
+    monkeypatch.setattr(get_settings(), "key_check_success_ttl", 0)
+
+    assert await _check_twice() == [False, False]
+
+
+async def test_force_rechecks_and_stores(api, stub):
+    await api.post("/api/test-api", json={"provider": "groq", "api_key": "gsk-test"})
+    stub.config.rate_limit_rate = 1.0
+
+    forced = await api.post("/api/test-api", json={"provider": "groq", "api_key": "gsk-test", "force": True})
+
+    assert not forced.json()["success"] and not forced.json()["cached"]
+    assert len(stub.requests) == 2
+
+
+async def test_keys_are_cached_separately(stub):
+    await check_api_key(ProviderEnum.groq, "gsk-one")
+    _, cached = await check_api_key(ProviderEnum.groq, "gsk-two")
+
+    assert not cached
+    assert len(stub.requests) == 2
+
+
+async def test_concurrent_checks_share_one_call(stub):
+    stub.config.latency_ms = 50
+    stub.config.latency_sigma = 0
+
+    results = await asyncio.gather(*(check_api_key(ProviderEnum.groq, "gsk-test") for _ in range(5)))
+
+    assert all(result["success"] for result, _ in results)
+    assert len(stub.requests) == 1
+
+
+
+async def test_cache_never_holds_the_raw_key(stub, results):
+    await check_api_key(ProviderEnum.groq, "gsk-secret-value")
+
+    assert len(results) == 1
+    assert all("gsk-secret-value" not in key for key in results._entries)
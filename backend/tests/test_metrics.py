@@ -0,0 +1,89 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from app.schemas.prompt import ProviderEnum
+from app.services.output_budget import OutputBudget
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "business": "Автомойка самообслуживания на трассе",
+    "role": "Администратор",
+    "provider": "groq",
+    "api_key": "sk-test",
+}
+
+
+def _server_timing(response) -> dict[str, float]:
+    stages = {}
+    for part in response.headers["server-timing"].split(","):
+        name, duration = part.strip().split(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+def _series(name: str, **labels) -> list[dict]:
+    return [
+        sample.labels
+        for metric in REGISTRY.collect()
+        for sample in metric.samples
+        if sample.name == name and all(sample.labels.get(k) == v for k, v in labels.items())
+    ]
+
+
+async def test_models_outside_the_catalog_share_one_label(api, stub):
+    for model in ("custom-model-1", "custom-model-2"):
+        response = await api.post("/api/generate", json={**REQUEST, "model": model})
+        assert response.status_code == 200
+
+    labelled = {
+        series["model"]
+        for series in _series("upstream_request_duration_seconds_count", provider="groq")
+    }
+    assert "other" in labelled
+    assert not {"custom-model-1", "custom-model-2"} & labelled
+
+
+def test_output_budget_keeps_the_most_recently_used_models():
+    budget = OutputBudget(cap=2000, min_samples=1, max_models=2)
+
+    budget.observe(ProviderEnum.groq, "a", 100)
+    budget.observe(ProviderEnum.groq, "b", 100)
+    budget.observe(ProviderEnum.groq, "a", 100)
+    budget.observe(ProviderEnum.groq, "c", 100)
+
+    assert [entry["model"] for entry in budget.snapshot()] == ["a", "c"]
+    assert budget.max_tokens(ProviderEnum.groq, "b") == 2000
+
+
+async def test_server_timing_breaks_down_a_generation(api, stub):
+    stub.config.latency_ms = 30
+    stub.config.latency_sigma = 0
+
+    generated = await api.post("/api/generate", json=REQUEST)
+    cached = await api.post("/api/generate", json=REQUEST)
+
+    stages = _server_timing(generated)
+    assert {"upstream", "db", "total"} <= set(stages)
+    assert stages["upstream"] >= 30
+    assert stages["total"] >= stages["upstream"] + stages["db"]
+    assert "upstream" not in _server_timing(cached)
+
+
+async def test_server_timing_on_other_endpoints(api):
+    response = await api.get("/api/providers")
+
+    assert set(_server_timing(response)) == {"total"}
+
+
+async def test_metrics_endpoint_exposes_request_and_upstream_series(api, stub):
+    await api.post("/api/generate", json=REQUEST)
+
+    response = await api.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'route="/api/generate"' in response.text
+    assert any(
+        line.startswith("upstream_request_duration_seconds_count{") and 'provider="groq"' in line
+        for line in response.text.splitlines()
+    )
@@ -0,0 +1,46 @@
+import ast
+import inspect
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.database import async_session
+from app.migrations import MIGRATIONS, m0001_initial
+from app.services.persistence import save_generation
+from app.services.search import search_prompts
+
+
+@pytest.mark.parametrize("migration", MIGRATIONS, ids=lambda m: m.__name__.rsplit(".", 1)[-1])
+def test_migrations_are_frozen(migration):
+    """Migrations must not depend on code that keeps changing."""
+    imported = set()
+    for node in ast.walk(ast.parse(inspect.getsource(migration))):
+        if isinstance(node, ast.ImportFrom):
+            imported.add("." * node.level + (node.module or ""))
+        elif isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+
+    assert not {name for name in imported if name.startswith(("..", "app."))}
+
+
+def test_initial_schema_keeps_column_lengths():
+    tables = m0001_initial.metadata.tables
+    ddl = {
+        name: str(CreateTable(tables[name]).compile(dialect=postgresql.dialect()))
+        for name in ("prompt_requests", "generation_cache")
+    }
+
+    assert "role VARCHAR(50) NOT NULL" in ddl["prompt_requests"]
+    assert "key VARCHAR(64) NOT NULL" in ddl["generation_cache"]
+    assert "provider VARCHAR(50) NOT NULL" in ddl["generation_cache"]
+
+
+@pytest.mark.anyio
+async def test_search_index_follows_inserts_on_a_fresh_database(db):
+    async with async_session() as session:
+        await save_generation(session, "Цветочный магазин", "Флорист", ["Составь букет к юбилею компании"])
+    async with async_session() as session:
+        hits = await search_prompts(session, "юбилею", limit=10, offset=0)
+
+    assert [hit.business for hit in hits] == ["Цветочный магазин"]
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from app.config import get_settings
+from app.schemas.prompt import PROVIDER_MODELS, ProviderEnum
+from app.services import output_budget
+from app.services.ai_service import generate_prompts
+from app.services.output_budget import OutputBudget
+
+pytestmark = pytest.mark.anyio
+
+MODEL = PROVIDER_MODELS[ProviderEnum.groq][0]["id"]
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    """A fresh budget that trusts a single sample."""
+    budget = OutputBudget(cap=get_settings().max_tokens, floor=16, min_samples=1)
+    monkeypatch.setattr(output_budget, "_budget", budget)
+    return budget
+
+
+async def _generate() -> list[str]:
+    prompts, _ = await generate_prompts(ProviderEnum.groq, "gsk-test", MODEL, "Книжный магазин", "Продавец")
+    return prompts
+
+
+def _max_tokens(stub) -> list[int]:
+    return [json.loads(request.content)["max_tokens"] for request in stub.requests]
+
+
+async def test_truncated_answer_is_retried_with_the_full_cap(stub, budget):
+    # Far too small for five prompts: the stub cuts the answer off
+    budget.observe(ProviderEnum.groq, MODEL, 20)
+    tight = budget.max_tokens(ProviderEnum.groq, MODEL)
+
+    prompts = await _generate()
+
+    assert len(prompts) == 5
+    assert _max_tokens(stub) == [tight, get_settings().max_tokens]
+    # The full answer is learned from, so the next budget is looser
+    assert budget.max_tokens(ProviderEnum.groq, MODEL) > tight
+
+
+async def test_sufficient_budget_is_not_retried(stub, budget):
+    budget.observe(ProviderEnum.groq, MODEL, 600)
+
+    prompts = await _generate()
+
+    assert len(prompts) == 5
+    assert _max_tokens(stub) == [budget.max_tokens(ProviderEnum.groq, MODEL)]
+
+
+async def test_truncation_at_the_full_cap_is_not_retried(stub, budget, monkeypatch):
+    monkeypatch.setattr(get_settings(), "max_tokens", 20)
+    budget.cap = 20
+
+    prompts = await _generate()
+
+    assert len(prompts) < 5
+    assert _max_tokens(stub) == [20]
+
+
+async def test_unknown_model_gets_the_full_cap(stub, budget):
+    await _generate()
+
+    assert _max_tokens(stub) == [get_settings().max_tokens]
+
+
+async def test_adaptive_budget_can_be_turned_off(stub, budget, monkeypatch):
+    monkeypatch.setattr(get_settings(), "adaptive_max_tokens", False)
+    budget.observe(ProviderEnum.groq, MODEL, 20)
+
+    await _generate()
+
+    assert _max_tokens(stub) == [get_settings().max_tokens]
@@ -0,0 +1,96 @@
+import hashlib
+
+import httpx
+import openai
+import pytest
+
+from app.schemas.prompt import ProviderEnum
+from app.services import ai_service
+from app.services.fingerprint import key_fingerprint
+from app.services.rate_limit import AdaptiveLimiter
+
+pytestmark = pytest.mark.anyio
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-test",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = AdaptiveLimiter(rate=1000.0, burst=1000, max_concurrency=10)
+    monkeypatch.setattr(ai_service, "get_rate_limiter", lambda provider, api_key: limiter)
+    return limiter
+
+
+def _client(responses: list[httpx.Response]) -> openai.AsyncOpenAI:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    return openai.AsyncOpenAI(
+        api_key="sk-test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+async def _call(client: openai.AsyncOpenAI):
+    async with ai_service.sdk_rate_limited(ProviderEnum.openai, "sk-test") as parsed:
+        return parsed(await client.chat.completions.with_raw_response.create(
+            model="gpt-test", messages=[{"role": "user", "content": "hi"}],
+        ))
+
+
+async def test_rate_recovers_after_throttling(limiter):
+    client = _client(
+        [httpx.Response(429, json={"error": {"message": "slow down"}}) for _ in range(3)]
+        + [httpx.Response(200, json=COMPLETION) for _ in range(50)]
+    )
+    for _ in range(3):
+        with pytest.raises(openai.RateLimitError):
+            await _call(client)
+    assert limiter.rate == pytest.approx(limiter.max_rate / 8)
+
+    for _ in range(50):
+        await _call(client)
+    assert limiter.rate == limiter.max_rate
+
+
+async def test_success_headers_are_learned(limiter):
+    client = _client([httpx.Response(
+        200,
+        json=COMPLETION,
+        headers={"x-ratelimit-limit-requests": "500", "x-ratelimit-remaining-requests": "499"},
+    )])
+    response = await _call(client)
+
+    assert response.choices[0].message.content == "ok"
+    assert (limiter.limit, limiter.remaining) == (500, 499)
+
+
+async def test_unreported_success_still_raises_rate(limiter):
+    limiter.rate = limiter.min_rate
+    async with ai_service.sdk_rate_limited(ProviderEnum.openai, "sk-test"):
+        pass
+    assert limiter.rate > limiter.min_rate
+
+
+async def test_snapshot_identifies_keys_by_salted_fingerprint(api, stub):
+    api_key = "sk-rate-limits-snapshot"
+    response = await api.post("/api/generate", json={
+        "business": "Цветочный магазин с доставкой по городу",
+        "role": "Флорист",
+        "provider": "groq",
+        "api_key": api_key,
+    })
+    assert response.status_code == 200
+
+    key_ids = [entry["key_id"] for entry in (await api.get("/api/rate-limits")).json()]
+
+    assert key_fingerprint(api_key)[:16] in key_ids
+    assert hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] not in key_ids
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.services.retention import run_retention
+
+pytestmark = pytest.mark.anyio
+
+
+async def _add_request(age: timedelta) -> None:
+    created_at = datetime.utcnow() - age
+    async with async_session() as session:
+        request = PromptRequest(business_description="Кофейня", role="Менеджер", created_at=created_at)
+        session.add(request)
+        await session.flush()
+        session.add(GeneratedPrompt(request_id=request.id, content="Промпт", created_at=created_at))
+        await session.commit()
+
+
+async def _count(model) -> int:
+    async with async_session() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.parametrize("days", [0, -1])
+async def test_disabled_retention_keeps_everything(db, days):
+    await _add_request(timedelta(days=30))
+    await _add_request(timedelta(0))
+
+    assert await run_retention(days) is None
+    assert await _count(PromptRequest) == 2
+    assert await _count(GeneratedPrompt) == 2
+
+
+async def test_retention_deletes_only_expired_history(db):
+    await _add_request(timedelta(days=30))
+    await _add_request(timedelta(0))
+
+    report = await run_retention(7)
+    assert report.archived == 1
+    assert report.deleted[PromptRequest.__tablename__] == 1
+    assert await _count(PromptRequest) == 1
+    assert await _count(GeneratedPrompt) == 1
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import delete
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt
+from app.services.persistence import PendingGeneration, save_generations
+
+pytestmark = pytest.mark.anyio
+
+
+async def _save(*generations: PendingGeneration) -> None:
+    async with async_session() as session:
+        await save_generations(session, list(generations))
+
+
+async def _search(api, q: str, **params) -> dict:
+    response = await api.get("/api/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_saved_prompts_are_searchable(api, stub):
+    generated = await api.post("/api/generate", json={
+        "business": "Салон красоты на набережной",
+        "role": "Стилист",
+        "provider": "groq",
+        "api_key": "gsk-test",
+    })
+    prompt = generated.json()["prompts"][0]
+    word = max(prompt.split(), key=len).strip(".,")
+
+    items = (await _search(api, word))["items"]
+
+    assert prompt in [item["content"] for item in items]
+    assert {item["business"] for item in items} == {"Салон красоты на набережной"}
+
+
+async def test_deleted_prompts_leave_the_index(api):
+    await _save(PendingGeneration("Автомойка", "Мойщик", ["Составь график смен для мойщиков"]))
+    assert len((await _search(api, "график"))["items"]) == 1
+
+    async with async_session() as session:
+        await session.execute(delete(GeneratedPrompt))
+        await session.commit()
+
+    assert (await _search(api, "график"))["items"] == []
+
+
+async def test_business_description_matches(api):
+    await _save(PendingGeneration("Пекарня с дровяной печью", "Пекарь", ["Составь меню на неделю"]))
+
+    [item] = (await _search(api, "дровяной"))["items"]
+
+    assert item["content"] == "Составь меню на неделю"
+
+
+async def test_every_word_must_match_as_a_prefix(api):
+    await _save(
+        PendingGeneration("Фитнес-клуб", "Тренер", ["Подготовь программу тренировок для новичков"]),
+        PendingGeneration("Фитнес-клуб", "Тренер", ["Подготовь программу питания"]),
+    )
+
+    [item] = (await _search(api, "трениров програм"))["items"]
+
+    assert item["content"] == "Подготовь программу тренировок для новичков"
+
+
+async def test_better_matches_rank_first(api):
+    await _save(
+        PendingGeneration("Кафе", "Повар", ["Опиши десерт дня"]),
+        PendingGeneration("Кафе", "Повар", ["Придумай десерт: десерт к кофе, десерт к чаю и ещё один десерт"]),
+    )
+
+    items = (await _search(api, "десерт"))["items"]
+
+    assert [item["content"] for item in items][0].startswith("Придумай десерт")
+    assert items[0]["rank"] > items[1]["rank"]
+    assert "<mark>десерт</mark>" in items[0]["snippet"]
+
+
+async def test_results_are_paged(api):
+    await _save(*(PendingGeneration("Склад", "Кладовщик", [f"Проверь остатки на полке {n}"]) for n in range(5)))
+
+    first = await _search(api, "остатки", limit=3)
+    rest = await _search(api, "остатки", limit=3, offset=first["next_offset"])
+
+    assert first["next_offset"] == 3
+    assert len(first["items"]) == 3 and len(rest["items"]) == 2
+    assert rest["next_offset"] is None
+    assert {item["prompt_id"] for item in first["items"]}.isdisjoint(item["prompt_id"] for item in rest["items"])
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app.services import retention
+from app.services.rate_limit import AdaptiveLimiter
+from app.services.retention import RetentionTask
+from app.services.shared_state import RedisState, SQLiteState
+from app.services.singleflight import SharedFlight
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+async def state(request, tmp_path):
+    """The same state as two workers would see it, for each backend."""
+    if request.param == "sqlite":
+        state = SQLiteState(str(tmp_path / "shared_state.db"))
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        state = RedisState(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield state
+    await state.close()
+
+
+async def test_values_expire(state):
+    await state.set("k", "v", ttl=0.1)
+    assert await state.get("k") == "v"
+    await asyncio.sleep(0.15)
+    assert await state.get("k") is None
+
+
+async def test_lease_has_one_holder(state):
+    taken = await asyncio.gather(*(state.add("lease", f"worker-{n}", 0.2) for n in range(20)))
+    assert taken.count(True) == 1
+    holder = f"worker-{taken.index(True)}"
+    assert await state.get("lease") == holder
+
+    # Free again once released or expired
+    await state.delete("lease")
+    assert await state.add("lease", "worker-a", 0.1)
+    assert not await state.add("lease", "worker-b", 0.1)
+    await asyncio.sleep(0.15)
+    assert await state.add("lease", "worker-b", 0.1)
+
+
+async def test_token_bucket_is_shared_between_workers(state):
+    workers = [
+        AdaptiveLimiter(rate=1.0, burst=3, max_concurrency=10, shared=state, shared_key="rl:test")
+        for _ in range(2)
+    ]
+    waits = [await state.take_token("rl:test", 1.0, 3) for _ in range(3)]
+    assert waits == [0.0, 0.0, 0.0]
+    assert 0.5 < await state.take_token("rl:test", 1.0, 3) <= 1.0
+
+    # A 429 with Retry-After seen by one worker pauses the other
+    workers[0].observe(429, {"retry-after": "5"})
+    await asyncio.gather(*workers[0]._pauses)
+    assert 4 < await state.take_token("rl:test", workers[1].rate, workers[1].capacity) <= 5
+
+
+async def test_shared_flight_runs_once_across_workers(state):
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {"prompts": ["один", "два"]}
+
+    workers = [SharedFlight(state, poll_interval=0.01) for _ in range(2)]
+    results = await asyncio.gather(*(workers[n % 2].do("key", factory) for n in range(10)))
+
+    assert calls == 1
+    assert {str(result) for result, _ in results} == {str({"prompts": ["один", "два"]})}
+    assert [shared for _, shared in results].count(False) == 1
+
+
+async def test_shared_flight_follower_takes_over_from_failed_leader(state):
+    leader, follower = SharedFlight(state, poll_interval=0.01), SharedFlight(state, poll_interval=0.01)
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("провайдер недоступен")
+
+    async def working():
+        return "готово"
+
+    failed = asyncio.create_task(leader.do("key", failing))
+    await asyncio.sleep(0.01)
+    assert await follower.do("key", working) == ("готово", False)
+    with pytest.raises(RuntimeError):
+        await failed
+
+
+async def test_retention_runs_on_one_worker_per_interval(state, monkeypatch):
+    runs = 0
+
+    async def run_retention():
+        nonlocal runs
+        runs += 1
+
+    monkeypatch.setattr(retention, "get_shared_state", lambda: state)
+    monkeypatch.setattr(retention, "run_retention", run_retention)
+    workers = [RetentionTask(interval=0.2) for _ in range(3)]
+
+    await asyncio.gather(*(worker._run_once() for worker in workers))
+    assert runs == 1
+    await asyncio.sleep(0.25)
+    await workers[1]._run_once()
+    assert runs == 2
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "business": "Цветочный магазин с доставкой",
+    "role": "Флорист",
+    "provider": "groq",
+    "api_key": "gsk-test",
+    "cache": "bypass",
+}
+
+
+class Gate:
+    """A call that runs until released, counting how often it was started."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "готово"
+
+
+async def test_concurrent_calls_share_one_run():
+    flight, gate = SingleFlight(), Gate()
+
+    callers = [asyncio.create_task(flight.do("key", gate)) for _ in range(5)]
+    await asyncio.sleep(0)
+    gate.release.set()
+
+    results = await asyncio.gather(*callers)
+    assert gate.calls == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"готово"}
+    assert flight.in_flight() == 0
+
+
+async def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    callers = [asyncio.create_task(flight.do("key", failing)) for _ in range(3)]
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert [str(result) for result in results] == ["upstream down"] * 3
+    assert flight.in_flight() == 0
+
+
+async def test_call_survives_until_the_last_waiter_leaves():
+    flight, gate = SingleFlight(), Gate()
+    first = asyncio.create_task(flight.do("key", gate))
+    second = asyncio.create_task(flight.do("key", gate))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await asyncio.sleep(0)
+    assert not gate.cancelled
+    assert flight.in_flight() == 1
+
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    await asyncio.sleep(0)
+    assert gate.cancelled
+    assert flight.in_flight() == 0
+
+
+async def test_identical_requests_make_one_upstream_call(api, stub):
+    stub.config.latency_ms = 50
+    stub.config.latency_sigma = 0
+
+    responses = await asyncio.gather(*(api.post("/api/generate", json=REQUEST) for _ in range(4)))
+
+    assert len(stub.requests) == 1
+    assert len({tuple(response.json()["prompts"]) for response in responses}) == 1
+
+
+async def test_different_keys_are_not_coalesced(api, stub):
+    stub.config.latency_ms = 50
+    stub.config.latency_sigma = 0
+
+    await asyncio.gather(*(api.post("/api/generate", json={**REQUEST, "api_key": f"gsk-{n}"}) for n in range(3)))
+
+    assert len(stub.requests) == 3
@@ -0,0 +1,102 @@
+import json
+
+import httpx
+import openai
+import pytest
+from prometheus_client import REGISTRY
+
+from app.schemas.prompt import PROVIDER_MODELS, ProviderEnum
+from app.services import ai_service
+
+pytestmark = pytest.mark.anyio
+
+PROMPTS = [f"{n}. Подробный промпт номер {n} для сотрудника кофейни" for n in range(1, 6)]
+USAGE = {
+    "prompt_tokens": 1500,
+    "completion_tokens": 120,
+    "total_tokens": 1620,
+    "prompt_tokens_details": {"cached_tokens": 1024},
+}
+
+
+def _chunk(delta: dict, finish_reason=None) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-test",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _sse(events: list[dict]) -> bytes:
+    body = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+    return (body + "data: [DONE]\n\n").encode("utf-8")
+
+
+def _stream(tail: str = "") -> list[dict]:
+    """Five prompts, optional text after them, the finish chunk and the usage chunk."""
+    events = [_chunk({"content": line + "\n"}) for line in PROMPTS]
+    if tail:
+        events.append(_chunk({"content": tail}))
+    events.append(_chunk({}, "stop"))
+    events.append({**_chunk({}), "choices": [], "usage": USAGE})
+    return events
+
+
+class _Registry:
+    """Client registry whose clients answer from a canned stream."""
+
+    def __init__(self, events: list[dict]):
+        self.requests: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return httpx.Response(200, content=_sse(events), headers={"content-type": "text/event-stream"})
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def http_client(self, provider: ProviderEnum) -> httpx.AsyncClient:
+        return self.client
+
+    def openai_client(self, api_key: str) -> openai.AsyncOpenAI:
+        return openai.AsyncOpenAI(api_key=api_key, max_retries=0, http_client=self.client)
+
+
+def _sample(name: str, provider: ProviderEnum, model: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, {"provider": provider.value, "model": model, **labels}) or 0.0
+
+
+async def _complete(monkeypatch, provider: ProviderEnum, model: str, events: list[dict]):
+    registry = _Registry(events)
+    monkeypatch.setattr(ai_service, "get_client_registry", lambda: registry)
+    completion = await ai_service._complete_streamed(provider, "sk-test", model, "Кофейня", "Менеджер", "", 1000)
+    return completion, registry
+
+
+@pytest.mark.parametrize("provider", [ProviderEnum.openai, ProviderEnum.groq])
+async def test_usage_sent_last_is_recorded(monkeypatch, provider):
+    model = PROVIDER_MODELS[provider][0]["id"]
+    hits = _sample("prompt_cache_requests_total", provider, model, result="hit")
+    early_stops = _sample("early_stops_total", provider, model)
+
+    completion, registry = await _complete(monkeypatch, provider, model, _stream())
+
+    assert ai_service.parse_prompts(completion.text) == [line[3:] for line in PROMPTS]
+    assert (completion.prompt_tokens, completion.completion_tokens) == (1500, 120)
+    assert completion.cached_tokens == 1024
+    assert _sample("prompt_cache_requests_total", provider, model, result="hit") == hits + 1
+    assert _sample("early_stops_total", provider, model) == early_stops
+    assert json.loads(registry.requests[0].content)["stream_options"] == {"include_usage": True}
+
+
+async def test_model_writing_past_the_prompts_is_cut_off(monkeypatch):
+    model = PROVIDER_MODELS[ProviderEnum.openai][0]["id"]
+    tail = "Ещё текст, который уже не нужен. " * 20
+    early_stops = _sample("early_stops_total", ProviderEnum.openai, model)
+
+    completion, _ = await _complete(monkeypatch, ProviderEnum.openai, model, _stream(tail))
+
+    assert len(ai_service.parse_prompts(completion.text)) == 5
+    assert completion.prompt_tokens is None
+    assert _sample("early_stops_total", ProviderEnum.openai, model) == early_stops + 1
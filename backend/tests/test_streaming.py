@@ -0,0 +1,45 @@
+import json
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers import generate
+from app.services.ai_service import PromptStreamParser
+
+PROMPTS = [
+    "Составь план запуска новой услуги для постоянных клиентов",
+    "Подготовь ответ на жалобу клиента о задержке заказа",
+    "Предложи три идеи акции для тихих будних дней",
+]
+TEXT = "".join(f"{n}. {prompt}\n" for n, prompt in enumerate(PROMPTS, 1))
+
+
+def test_parser_indexes_every_prompt_of_a_chunk():
+    parser = PromptStreamParser()
+
+    assert parser.feed(TEXT[:10]) == []
+    assert parser.feed(TEXT[10:]) == list(enumerate(PROMPTS))
+    assert parser.feed("4. Последний промпт без перевода строки") == []
+    assert parser.close() == [(3, "Последний промпт без перевода строки")]
+
+
+@pytest.mark.anyio
+async def test_stream_events_index_prompts_from_one_chunk(db, monkeypatch):
+    async def one_chunk(**kwargs):
+        yield TEXT
+
+    monkeypatch.setattr(generate, "stream_completion", one_chunk)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/generate/stream",
+            json={"business": "Кофейня у дома", "role": "Менеджер", "provider": "openai", "api_key": "sk-test"},
+            headers={"Cache-Control": "no-store"},
+        )
+
+    events = [
+        json.loads(block.split("data: ", 1)[1])
+        for block in response.text.split("\n\n")
+        if block.startswith("event: prompt")
+    ]
+    assert [(event["index"], event["prompt"]) for event in events] == list(enumerate(PROMPTS))
@@ -0,0 +1,120 @@
+import json
+from uuid import uuid4
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "business": "Йога-студия в спальном районе",
+    "role": "Администратор",
+    "provider": "groq",
+    "api_key": "gsk-test",
+}
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.split("\n\n"):
+        if block.startswith("event: "):
+            head, data = block.split("\n", 1)
+            events.append((head[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+async def test_unknown_template_is_404(api, stub):
+    response = await api.post("/api/generate", json={**REQUEST, "template_id": str(uuid4())})
+
+    assert response.status_code == 404
+    assert stub.requests == []
+
+
+async def test_unknown_template_version_is_404(api, stub):
+    template = (await api.post("/api/templates", json={"name": "Йога", "content": "Ты помогаешь {role}."})).json()
+
+    response = await api.post("/api/generate", json={**REQUEST, "template_id": template["id"], "template_version": 2})
+    stream = await api.post(
+        "/api/generate/stream", json={**REQUEST, "template_id": template["id"], "template_version": 2}
+    )
+
+    assert response.status_code == 404
+    assert _events(stream.text) == [("error", {"status": 404, "detail": "Шаблон не найден"})]
+    assert stub.requests == []
+
+
+async def _create(api, content: str = "Ты помогаешь {role} в компании: {business}.") -> dict:
+    response = await api.post("/api/templates", json={"name": "Йога", "content": content})
+    assert response.status_code == 201
+    return response.json()
+
+
+def _system_prompt(request) -> str:
+    return json.loads(request.content)["messages"][0]["content"]
+
+
+async def test_create_list_and_get(api):
+    created = await _create(api)
+
+    assert created["version"] == 1
+    assert created["placeholders"] == ["business", "role"]
+    assert (await api.get(f"/api/templates/{created['id']}")).json() == created
+    [summary] = (await api.get("/api/templates")).json()
+    assert summary["id"] == created["id"] and "content" not in summary
+
+
+async def test_unknown_placeholder_is_rejected(api):
+    response = await api.post("/api/templates", json={"name": "Опечатка", "content": "Для {buisness}"})
+
+    assert response.status_code == 400
+    assert "{buisness}" in response.json()["detail"]
+
+
+async def test_update_adds_a_version(api):
+    created = await _create(api)
+
+    updated = (await api.put(f"/api/templates/{created['id']}", json={"content": "Новый текст для {role}."})).json()
+
+    assert updated["version"] == 2 and updated["name"] == "Йога"
+    assert (await api.get(f"/api/templates/{created['id']}")).json()["content"] == "Новый текст для {role}."
+    first = (await api.get(f"/api/templates/{created['id']}", params={"version": 1})).json()
+    assert first["content"] == created["content"]
+    versions = (await api.get(f"/api/templates/{created['id']}/versions")).json()
+    assert [version["version"] for version in versions] == [2, 1]
+    assert [summary["version"] for summary in (await api.get("/api/templates")).json()] == [2]
+
+
+async def test_delete_removes_every_version(api):
+    created = await _create(api)
+    await api.put(f"/api/templates/{created['id']}", json={"name": "Йога 2"})
+
+    assert (await api.delete(f"/api/templates/{created['id']}")).status_code == 204
+    assert (await api.get(f"/api/templates/{created['id']}")).status_code == 404
+    assert (await api.get(f"/api/templates/{created['id']}/versions")).status_code == 404
+    assert (await api.delete(f"/api/templates/{created['id']}")).status_code == 404
+    assert (await api.put(f"/api/templates/{created['id']}", json={"name": "Снова"})).status_code == 404
+
+
+async def test_generation_renders_the_latest_or_pinned_version(api, stub):
+    created = await _create(api)
+    request = {**REQUEST, "template_id": created["id"]}
+
+    await api.post("/api/generate", json=request)
+    await api.put(f"/api/templates/{created['id']}", json={"content": "Версия 2 для {role}."})
+    latest = await api.post("/api/generate", json=request)
+    pinned = await api.post("/api/generate", json={**request, "template_version": 1})
+
+    assert _system_prompt(stub.requests[0]) == f"Ты помогаешь Администратор в компании: {REQUEST['business']}."
+    assert _system_prompt(stub.requests[1]) == "Версия 2 для Администратор."
+    # Version 1 was generated before, so the pinned request is a cache hit
+    assert not latest.json()["cached"] and pinned.json()["cached"]
+    assert len(stub.requests) == 2
+
+
+async def test_template_and_system_prompt_are_exclusive(api):
+    created = await _create(api)
+
+    response = await api.post(
+        "/api/generate", json={**REQUEST, "template_id": created["id"], "system_prompt": "Другой текст"}
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import select
+
+from app.database import async_session
+from app.models.prompt import GeneratedPrompt, PromptRequest
+from app.services import persistence
+from app.services.metrics import WRITE_BEHIND_DROPPED
+from app.services.persistence import PendingGeneration, WriteBehindQueue
+
+pytestmark = pytest.mark.anyio
+
+
+async def _drain(items: list[PendingGeneration]) -> WriteBehindQueue:
+    queue = WriteBehindQueue(batch_size=100, flush_interval=0.05, max_size=100, retries=2, retry_delay=0)
+    queue.start()
+    for item in items:
+        await queue.put(item)
+    await queue.stop()
+    return queue
+
+
+async def _stored() -> dict[str, list[str]]:
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(PromptRequest.business_description, GeneratedPrompt.content)
+            .join(GeneratedPrompt, GeneratedPrompt.request_id == PromptRequest.id)
+            .order_by(GeneratedPrompt.created_at, GeneratedPrompt.id)
+        )).all()
+    stored: dict[str, list[str]] = {}
+    for business, content in rows:
+        stored.setdefault(business, []).append(content)
+    return stored
+
+
+def _dropped(table: str) -> float:
+    return WRITE_BEHIND_DROPPED.labels(table)._value.get()
+
+
+async def test_failed_flush_is_retried(db, monkeypatch):
+    failures = [RuntimeError("database is locked")] * 2
+    insert_generations = persistence._insert_generations
+
+    async def flaky(session, batch):
+        if failures:
+            raise failures.pop()
+        await insert_generations(session, batch)
+
+    monkeypatch.setattr(persistence, "_insert_generations", flaky)
+    items = [PendingGeneration(f"Пекарня #{n}", "Пекарь", ["Первый", "Второй"]) for n in range(5)]
+
+    queue = await _drain(items)
+
+    assert await _stored() == {item.business: item.prompts for item in items}
+    assert queue.counters["errors"] == 2
+    assert queue.counters["flushed"] == 5
+    assert queue.counters["dropped"] == 0
+
+
+async def test_bad_result_is_dropped_and_counted_alone(db):
+    good = [PendingGeneration(f"Пекарня #{n}", "Пекарь", ["Первый", "Второй"]) for n in range(3)]
+    bad = PendingGeneration("Сломанная пекарня", "Пекарь", ["Первый", None, "Третий"])
+    requests_before = _dropped("prompt_requests")
+    prompts_before = _dropped("generated_prompts")
+
+    queue = await _drain([good[0], bad, *good[1:]])
+
+    assert await _stored() == {item.business: item.prompts for item in good}
+    assert queue.counters["errors"] == 3
+    assert queue.counters["flushed"] == 3
+    assert queue.counters["dropped"] == 1
+    assert _dropped("prompt_requests") - requests_before == 1
+    assert _dropped("generated_prompts") - prompts_before == 3
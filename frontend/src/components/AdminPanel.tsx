@@ -1,25 +1,9 @@
 import { useState, useEffect } from 'react';
 import { testApiKey } from '../api/client';
+import { DEFAULT_SYSTEM_PROMPT, getCustomSystemPrompt, saveSystemPrompt } from '../systemPrompt';
 
-const SYSTEM_PROMPT_KEY = 'prompt-generator-system-prompt';
 const API_URL_KEY = 'prompt-generator-api-url';
 
-const DEFAULT_PROMPT = `Вы — эксперт по созданию промптов для AI-ассистентов.
-
-Описание бизнеса: {business}
-Роль сотрудника: {role}
-
-Ваша задача — создать 5 полезных промптов для сотрудника с указанной ролью.
-
-Каждый промпт должен:
-1. Быть конкретным и применимым к описанному бизнесу
-2. Начинаться с обращения к AI (например, "Помоги мне...", "Составь...", "Проанализируй...")
-3. Содержать контекст бизнеса и роли
-4. Быть готовым к использованию без дополнительной модификации
-5. Быть достаточно длинным и детальным (минимум 2-3 предложения)
-
-Формат ответа — только список промптов, каждый с новой строки, без нумерации и лишнего текста.`;
-
 const PROVIDERS = [
   { id: 'openai', name: 'OpenAI', url: 'https://platform.openai.com/api-keys' },
   { id: 'anthropic', name: 'Anthropic', url: 'https://console.anthropic.com/' },
@@ -41,7 +25,7 @@ interface AdminPanelProps {
 
 export function AdminPanel({ onBack }: AdminPanelProps) {
   const [tab, setTab] = useState<Tab>('prompt');
-  const [systemPrompt, setSystemPrompt] = useState(DEFAULT_PROMPT);
+  const [systemPrompt, setSystemPrompt] = useState(DEFAULT_SYSTEM_PROMPT);
   const getDefaultApiUrl = () => {
     if (typeof window !== 'undefined' && window.location.hostname !== 'localhost' && window.location.hostname !== '127.0.0.1') {
       return 'https://prompt-generator-backend-production.up.railway.app';
@@ -59,7 +43,7 @@ export function AdminPanel({ onBack }: AdminPanelProps) {
 
   // Load saved data on mount
   useEffect(() => {
-    const savedPrompt = localStorage.getItem(SYSTEM_PROMPT_KEY);
+    const savedPrompt = getCustomSystemPrompt();
     if (savedPrompt) {
       setSystemPrompt(savedPrompt);
     }
@@ -80,14 +64,14 @@ export function AdminPanel({ onBack }: AdminPanelProps) {
   }, []);
 
   const handleSavePrompt = () => {
-    localStorage.setItem(SYSTEM_PROMPT_KEY, systemPrompt);
+    saveSystemPrompt(systemPrompt);
     setSaved(true);
     setTimeout(() => setSaved(false), 2000);
   };
 
   const handleResetPrompt = () => {
-    setSystemPrompt(DEFAULT_PROMPT);
-    localStorage.removeItem(SYSTEM_PROMPT_KEY);
+    setSystemPrompt(DEFAULT_SYSTEM_PROMPT);
+    saveSystemPrompt(DEFAULT_SYSTEM_PROMPT);
     setSaved(true);
     setTimeout(() => setSaved(false), 2000);
   };
@@ -218,7 +202,9 @@ export function AdminPanel({ onBack }: AdminPanelProps) {
                 Системный промпт
               </label>
               <p className="text-xs text-gray-500">
-                Используйте {'{role}'} и {'{business}'} как переменные
+                Без переменных описание бизнеса и роль передаются отдельным сообщением,
+                и провайдер может кэшировать промпт. С {'{role}'} и {'{business}'} они
+                подставляются в текст
               </p>
               <textarea
                 value={systemPrompt}
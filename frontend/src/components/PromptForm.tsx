@@ -1,8 +1,7 @@
 import { useState } from 'react';
 import type { GenerateRequest } from '../types';
 import type { Settings } from './SettingsModal';
-
-const SYSTEM_PROMPT_KEY = 'prompt-generator-system-prompt';
+import { getCustomSystemPrompt } from '../systemPrompt';
 
 interface PromptFormProps {
   onSubmit: (request: GenerateRequest) => void;
@@ -37,8 +36,9 @@ export function PromptForm({ onSubmit, loading, settings, onOpenSettings }: Prom
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault();
     if (settings && isValid) {
-      // Get custom system prompt from localStorage
-      const systemPrompt = localStorage.getItem(SYSTEM_PROMPT_KEY) || '';
+      // Custom system prompt from the admin panel; '' leaves the backend
+      // default, which sends the business and role in the user message
+      const systemPrompt = getCustomSystemPrompt();
 
       onSubmit({
         business: business.trim(),
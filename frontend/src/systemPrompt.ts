@@ -0,0 +1,57 @@
+export const SYSTEM_PROMPT_KEY = 'prompt-generator-system-prompt';
+
+// Same text as the backend's DEFAULT_SYSTEM_PROMPT. It has no {business} or
+// {role} placeholders: the backend sends them in the user message, so the
+// whole system prompt is a static prefix that providers can cache.
+export const DEFAULT_SYSTEM_PROMPT = `Вы — эксперт по созданию промптов для AI-ассистентов.
+
+Пользователь сообщит описание бизнеса и роль сотрудника.
+
+Ваша задача — создать 5 полезных промптов для сотрудника с указанной ролью.
+
+Каждый промпт должен:
+1. Быть конкретным и применимым к описанному бизнесу
+2. Начинаться с обращения к AI (например, "Помоги мне...", "Составь...", "Проанализируй...")
+3. Содержать контекст бизнеса и роли
+4. Быть готовым к использованию без дополнительной модификации
+5. Быть достаточно длинным и детальным (минимум 2-3 предложения)
+
+Формат ответа — только список промптов, каждый с новой строки, без нумерации и лишнего текста.`;
+
+// The previous default, which rendered the business and role into the
+// system prompt; copies of it saved from the admin panel count as the default
+const LEGACY_DEFAULT_SYSTEM_PROMPT = `Вы — эксперт по созданию промптов для AI-ассистентов.
+
+Описание бизнеса: {business}
+Роль сотрудника: {role}
+
+Ваша задача — создать 5 полезных промптов для сотрудника с указанной ролью.
+
+Каждый промпт должен:
+1. Быть конкретным и применимым к описанному бизнесу
+2. Начинаться с обращения к AI (например, "Помоги мне...", "Составь...", "Проанализируй...")
+3. Содержать контекст бизнеса и роли
+4. Быть готовым к использованию без дополнительной модификации
+5. Быть достаточно длинным и детальным (минимум 2-3 предложения)
+
+Формат ответа — только список промптов, каждый с новой строки, без нумерации и лишнего текста.`;
+
+function isDefault(prompt: string): boolean {
+  const text = prompt.trim();
+  return text === DEFAULT_SYSTEM_PROMPT || text === LEGACY_DEFAULT_SYSTEM_PROMPT;
+}
+
+// Custom system prompt saved in the admin panel, or '' for the default
+// (the backend then uses its own, identical copy)
+export function getCustomSystemPrompt(): string {
+  const saved = localStorage.getItem(SYSTEM_PROMPT_KEY) || '';
+  return isDefault(saved) ? '' : saved;
+}
+
+export function saveSystemPrompt(prompt: string): void {
+  if (isDefault(prompt)) {
+    localStorage.removeItem(SYSTEM_PROMPT_KEY);
+  } else {
+    localStorage.setItem(SYSTEM_PROMPT_KEY, prompt);
+  }
+}